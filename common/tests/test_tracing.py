@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+from unittest import TestCase, main
+
+import json
+import os
+import tempfile
+
+from common.tracing import *
+
+class Traced(object):
+    """Class instrumented by the tests"""
+
+    def outer(self):
+        return self.inner() + 1
+
+    def inner(self):
+        return 1
+
+    @property
+    def value(self):
+        return self.inner()
+
+class TracerTests(TestCase):
+    """Test Tracer Class"""
+
+    def setUp(self):
+        self.aggregate = AggregateSink()
+        self.tracer = Tracer([self.aggregate])
+
+    def tearDown(self):
+        self.tracer.close()
+
+    def test_nested_spans(self):
+        """Calls made within a span are its children"""
+        self.tracer.instrument(Traced, ['outer', 'inner', 'value', 'missing'])
+        self.assertEqual(Traced().outer(), 2)
+        self.assertEqual(Traced().value, 1)
+        results = self.aggregate.results
+        self.assertEqual(results['Traced.outer']['calls'], 1)
+        self.assertEqual(results['Traced.inner']['calls'], 2)
+        self.assertEqual(results['Traced.value']['calls'], 1)
+        self.assertTrue(results['Traced.outer']['self_seconds'] <= results['Traced.outer']['seconds'])
+
+    def test_uninstrument(self):
+        """Uninstrumented classes are restored to their original methods"""
+        original = Traced.__dict__['outer']
+        self.tracer.instrument(Traced, ['outer'])
+        self.tracer.instrument(Traced, ['outer'])
+        self.assertTrue(Traced.__dict__['outer'].traced is original)
+        self.tracer.uninstrument()
+        self.assertTrue(Traced.__dict__['outer'] is original)
+        Traced().outer()
+        self.assertEqual(self.aggregate.results, {})
+
+    def test_file_sinks(self):
+        """Spans are written as JSON lines and as Chrome trace events"""
+        handle, lines = tempfile.mkstemp('.jsonl')
+        os.close(handle)
+        handle, trace = tempfile.mkstemp('.json')
+        os.close(handle)
+        try:
+            tracer = Tracer([JSONLinesSink(lines), ChromeTraceSink(trace)])
+            tracer.instrument(Traced, ['outer', 'inner'], 'test')
+            Traced().outer()
+            tracer.close()
+            records = [json.loads(line) for line in open(lines)]
+            self.assertEqual([(r['name'], r['depth']) for r in records], [('Traced.inner', 1), ('Traced.outer', 0)])
+            events = json.load(open(trace))['traceEvents']
+            self.assertEqual([e['ph'] for e in events], ['X', 'X'])
+            self.assertEqual(events[1]['cat'], 'test')
+        finally:
+            os.remove(lines)
+            os.remove(trace)
+
+
+if __name__ == '__main__':
+    main()
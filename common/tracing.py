@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+
+"""
+Tracing
+
+    Opt-in timing spans. A Tracer wraps the methods and properties of the classes it
+    instruments so that every call opens a span, and spans opened while another is
+    open become its children. Finished spans are handed to the tracer's sinks:
+
+        AggregateSink     Calls, total and self seconds per span name, kept in memory
+        JSONLinesSink     One JSON object per span, written as the span finishes
+        ChromeTraceSink   Chrome trace event file which chrome://tracing and
+                          speedscope render as a flame chart
+
+    Instrumentation replaces class attributes in place and uninstrument() puts the
+    originals back, so classes which are not being traced run at full speed.
+
+    Example
+        aggregate = AggregateSink()
+        tracer = Tracer([aggregate, ChromeTraceSink('run.trace.json')])
+        tracer.instrument(Register, ['set', 'get', 'global_index'], 'register')
+        ...
+        tracer.close()
+        print aggregate.format()
+"""
+
+import json
+import thread
+import threading
+
+from timeit import default_timer
+
+from common.base import *
+
+class Span(object):
+    """A timed call"""
+
+    __slots__ = ['name', 'layer', 'start', 'end', 'depth', 'thread', 'child_seconds']
+
+    def __init__(self, name, layer, start, depth, thread):
+        self.name   = name
+        self.layer  = layer
+        self.start  = start
+        self.end    = None
+        self.depth  = depth
+        self.thread = thread
+        self.child_seconds = 0.0
+
+    def __repr__(self):
+        return 'Span(%s, %s, %.6f s)' % (self.name, self.layer, self.seconds)
+
+    @property
+    def seconds(self):
+        """Returns the duration of the span"""
+        return (self.end if self.end != None else default_timer()) - self.start
+
+    @property
+    def self_seconds(self):
+        """Returns the duration of the span less the duration of its children"""
+        return self.seconds - self.child_seconds
+
+    def to_dict(self):
+        return {'name':self.name, 'layer':self.layer, 'start':self.start, 'seconds':self.seconds,
+                'self_seconds':self.self_seconds, 'depth':self.depth, 'thread':self.thread}
+
+
+class Tracer(object):
+    """
+    Opens nested spans around instrumented calls and hands the finished spans to its sinks
+    """
+
+    def __init__(self, sinks = None):
+        self.sinks   = list(sinks) if sinks != None else []
+        self.origin  = default_timer()
+        self._local  = threading.local()
+        self._originals = []
+
+
+    # Spans -----------------------------
+
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def begin(self, name, layer = None):
+        """Opens a span and returns it"""
+        stack = self._stack()
+        span = Span(name, layer, default_timer(), len(stack), thread.get_ident())
+        stack.append(span)
+        return span
+
+    def end(self, span):
+        """Closes the span, which must be the most recently opened span of the thread"""
+        span.end = default_timer()
+        stack = self._stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_seconds += span.seconds
+        for sink in self.sinks:
+            sink.emit(span, self)
+
+    def wrap(self, function, name, layer = None):
+        """Returns a function which runs the function provided within a span"""
+        tracer = self
+        def traced(*args, **keyw):
+            span = tracer.begin(name, layer)
+            try:
+                return function(*args, **keyw)
+            finally:
+                tracer.end(span)
+        traced.__name__ = function.__name__
+        traced.__doc__  = function.__doc__
+        traced.traced   = function
+        return traced
+
+
+    # Instrumentation -----------------------------
+
+
+    def instrument(self, cls, names, layer = None):
+        """
+        Wraps the methods and properties named which the class itself defines, spans are
+        named class.attribute. Names the class does not define are skipped, so that a list
+        can be shared by a class hierarchy.
+        """
+        for name in names:
+            if not name in cls.__dict__:
+                continue
+            original = cls.__dict__[name]
+            label = '%s.%s' % (cls.__name__, name)
+            if isinstance(original, property):
+                fget = self.wrap(original.fget, label, layer) if original.fget != None else None
+                replacement = property(fget, original.fset, original.fdel, original.__doc__)
+            elif isinstance(original, (staticmethod, classmethod)):
+                continue
+            elif callable(original) and not hasattr(original, 'traced'):
+                replacement = self.wrap(original, label, layer)
+            else:
+                continue
+            self._originals.append((cls, name, original))
+            setattr(cls, name, replacement)
+
+    def instrument_hierarchy(self, base, names, layer = None):
+        """Instruments the base class and every subclass of it that has been imported"""
+        classes = [base]
+        for cls in classes:
+            classes.extend([c for c in cls.__subclasses__() if c not in classes])
+        for cls in classes:
+            self.instrument(cls, names, layer)
+
+    def uninstrument(self):
+        """Restores every attribute the tracer replaced"""
+        while self._originals:
+            cls, name, original = self._originals.pop()
+            setattr(cls, name, original)
+
+    def close(self):
+        """Restores the instrumented classes and closes the sinks"""
+        self.uninstrument()
+        for sink in self.sinks:
+            sink.close()
+
+
+# Sinks -----------------------------
+
+
+class AggregateSink(object):
+    """Totals the calls and seconds of every span name"""
+
+    def __init__(self):
+        self.results = {}
+
+    def emit(self, span, tracer):
+        entry = self.results.get(span.name)
+        if entry == None:
+            entry = self.results[span.name] = {'layer':span.layer, 'calls':0, 'seconds':0.0, 'self_seconds':0.0}
+        entry['calls'] += 1
+        entry['self_seconds'] += span.self_seconds
+        # Recursive calls are only counted once towards the total
+        if span.depth == 0 or not self._nested(span, tracer):
+            entry['seconds'] += span.seconds
+
+    def _nested(self, span, tracer):
+        for parent in tracer._stack():
+            if parent.name == span.name:
+                return True
+        return False
+
+    def close(self):
+        pass
+
+    def format(self, limit = None):
+        """Returns the totals as a table, the most self time first"""
+        rows = self.results.items()
+        rows.sort(key = lambda row: row[1]['self_seconds'], reverse = True)
+        lines = ['%-50s %-10s %10s %12s %12s' % ('SPAN', 'LAYER', 'CALLS', 'SECONDS', 'SELF')]
+        for name, entry in rows[:limit]:
+            lines.append('%-50s %-10s %10s %12.6f %12.6f' % (name, entry['layer'], entry['calls'], entry['seconds'], entry['self_seconds']))
+        return '\n'.join(lines)
+
+
+class JSONLinesSink(object):
+    """Writes every span to a JSON lines file as it finishes"""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._file = open(filepath, 'w')
+        self._lock = threading.Lock()
+
+    def emit(self, span, tracer):
+        record = span.to_dict()
+        record['start'] -= tracer.origin
+        self._lock.acquire()
+        try:
+            self._file.write(json.dumps(record, sort_keys = True) + '\n')
+        finally:
+            self._lock.release()
+
+    def close(self):
+        if self._file != None:
+            self._file.close()
+            self._file = None
+
+
+class ChromeTraceSink(object):
+    """Collects the spans as Chrome trace complete events and writes them when closed"""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.events = []
+
+    def emit(self, span, tracer):
+        self.events.append({
+            'name' : span.name,
+            'cat'  : span.layer or 'default',
+            'ph'   : 'X',
+            'ts'   : (span.start - tracer.origin) * 1e6,
+            'dur'  : span.seconds * 1e6,
+            'pid'  : os.getpid(),
+            'tid'  : span.thread
+            })
+
+    def close(self):
+        f = open(self.filepath, 'w')
+        try:
+            json.dump({'traceEvents':self.events, 'displayTimeUnit':'ms'}, f)
+        finally:
+            f.close()
+
+
+if __name__=='__main__' :
+    pass
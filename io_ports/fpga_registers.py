@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""
+FPGA Registers
+
+    The register map of the FPGA serial interface and the fields which route
+    it to each target, shared by the FPGA connection adapters, which drive
+    it, and the port simulator and recorder, which emulate and decode it.
+"""
+
+# FPGA Serial Interface Register Offset Addresses
+FPGA_ID    = 0x00 # Offset 0 : Contains two 4 bit fields. The upper identifies the device, the lower contains the revision level
+GL_CSR     = 0x02 # Offset 2 : Global control and status register. Setting bit 0 to 1 aborts any pending FPGA operation and resets the FPGA 
+CFG        = 0x03 # Offset 3 : Bit 0 of CFG is the Serial Interface Bus Enable bit which controls activation of the the SCR
+CLK_SL     = 0x09 # Offset 9 : Clock Select - Sets the clock source on the SCR target specified
+SI_CSR     = 0x30 # Offset 48 : Accepts OpCodes to trigger FPGA actions
+SI_MCTL    = 0x31 # Offset 49 : Manual mode register that accepts bit banging to create SCR clock
+SI_CFG_0   = 0x32 # Offset 50 : Bit indexes 4-5 select clock frequency for the SI for top? Indexes 6-7 for bottom?
+SI_CFG_1   = 0x33 # Offset 51 : Accepts reset and SCR mode bit controls
+SI_ADDR_0  = 0x34 # Offset 52 : Holds bits 0-7 of the address used to access SI_RAM_0 or SI_RAM_1 
+SI_ADDR_1  = 0x35 # Offset 53 : Holds bit 8 of the address used to access SI_RAM_0 or SI_RAM_1  
+SI_DATA    = 0x36 # Offset 54 : Holds the lower byte of the data being read or written to SI_RAM_0 or SI_RAM_1
+SI_CNT_0   = 0x37 # Offset 55 : Holds lower 8 bits of count specifying number of bits to be R/W
+SI_CNT_1   = 0x38 # Offset 56 : Holds upper 4 bits of count specifying number of bits to be R/W
+
+# Sub-Offset Addresses
+SI_CSR_ERR = 0x01 # bit 0 from Offset 48 : FPGA sets to 1 when OpCode was invalid
+SI_CSR_ST  = 0x02 # bit 1 from Offset 48 : User sets to 1 when submitting an OpCode 
+
+# Opcode values for SI_CSR bit indexes 4-7 (Entire byte should be 0100 + opcode)
+OPCODE_READ_SERDES    = 0x10 # 0001 Read SerDes SCR into RAM_1
+OPCODE_WRITE_SERDES   = 0x20 # 0010 Write RAM_0 to SerDes SCR
+OPCODE_READ_SI_RAM0   = 0x40 # 0100 Read SI_RAM_0 and increment Address
+OPCODE_WRITE_SI_RAM0  = 0x50 # 0101 Write SI_RAM_0 and increment Address
+OPCODE_READ_SI_RAM1   = 0x60 # 0110 Read SI_RAM_1 and increment Address
+OPCODE_WRITE_SI_RAM1  = 0x70 # 0111 Write SI_RAM_1 and increment Address
+
+# Control register fields, in the order they are applied, which route the serial interface
+# to each target as [(register index, bitmask), ...]
+TARGET_FIELDS = {
+    'top'    : [(SI_CFG_1, "x1xxxxxx"), (SI_CFG_0, "1xxxxxxx")],
+    'bottom' : [(SI_CFG_1, "xxxxx1xx"), (SI_CFG_0, "0xxxxxxx")]
+    }
+
+# CLK_SL field which selects the clock source of each target, BB being replaced by the source bits
+TARGET_CLOCK_FIELDS = {
+    'top'    : "xxxxBBxx",
+    'bottom' : "xxxxxxBB"
+    }
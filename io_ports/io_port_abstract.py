@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""
+Abstract register socket
+
+    Register sockets expose the FPGA's 64 byte wide register file to the
+    connection adapters. Every socket implements single register reads and
+    writes, and may override the block methods when the protocol allows
+    the control overhead of a transfer to be paid once per block instead
+    of once per byte.
+
+    Block transfers stream bytes through one register. An optional trigger
+    (register index, value) is written after every byte written and before
+    every byte read, which is how the FPGA's auto-incrementing RAM opcodes
+    are clocked through SI_DATA.
+
+    Batches pipeline a list of transactions through transfer(), so that a
+    socket can send them all before collecting any response:
+        (TRANSFER_READ, index)
+        (TRANSFER_WRITE, index, data)
+        (TRANSFER_READ_BLOCK, index, count, trigger)
+        (TRANSFER_WRITE_BLOCK, index, data, trigger)
+"""
+
+from common.base import *
+
+# Batch transaction kinds
+TRANSFER_READ        = 'r'
+TRANSFER_WRITE       = 'w'
+TRANSFER_READ_BLOCK  = 'rb'
+TRANSFER_WRITE_BLOCK = 'wb'
+
+class AbstractSocket(AppBase):
+    """
+    Uniform register I/O API used by the FPGA connection adapters
+
+    read         PC <- Register
+    write        PC -> Register
+    read_block   PC <- Register x count
+    write_block  PC -> Register x len(data)
+    transfer     PC <-> Registers x len(transactions)
+    """
+
+    entity_name = 'abstract_socket'
+    entity_atts = []
+
+    def __init__(self):
+        # Prepare Parent
+        super(AbstractSocket, self).__init__()
+
+
+    # Connection Management -----------------------------------
+
+
+    @staticmethod
+    def detect():
+        """Interogates the PC to determine if the socket can be established"""
+        raise NotImplementedError()
+
+
+    # Protocol Read / Write Methods --------------------------------
+
+
+    def read(self, index):
+        """
+        Returns the byte held in the FPGA register at index
+        """
+        raise NotImplementedError()
+
+    def write(self, index, data):
+        """
+        Writes the byte provided into the FPGA register at index
+        """
+        raise NotImplementedError()
+
+    def read_block(self, index, count, trigger = None):
+        """
+        Reads the FPGA register at index count times and returns the bytes as a list.
+        If a trigger (index, value) is provided, it is written before every read.
+        """
+        data = []
+        for i in xrange(count):
+            if trigger != None:
+                self.write(trigger[0], trigger[1])
+            data.append(self.read(index))
+        return data
+
+    def write_block(self, index, data, trigger = None):
+        """
+        Writes every byte in data to the FPGA register at index. If a
+        trigger (index, value) is provided, it is written after every byte.
+        """
+        for byte in data:
+            self.write(index, byte)
+            if trigger != None:
+                self.write(trigger[0], trigger[1])
+
+    def transfer(self, transactions):
+        """
+        Performs the batch of transactions in order and returns a list holding the 
+        result of every read transaction, a byte for reads and a list for block reads
+        """
+        results = []
+        for transaction in transactions:
+            kind = transaction[0]
+            if kind == TRANSFER_READ:
+                results.append(self.read(transaction[1]))
+            elif kind == TRANSFER_WRITE:
+                self.write(transaction[1], transaction[2])
+            elif kind == TRANSFER_READ_BLOCK:
+                results.append(self.read_block(*transaction[1:]))
+            elif kind == TRANSFER_WRITE_BLOCK:
+                self.write_block(*transaction[1:])
+            else:
+                raise ValueError('Unrecognized transaction kind: %s' % kind)
+        return results
+
+
+if __name__=='__main__' :
+    pass
@@ -3,6 +3,7 @@
 import parallel
 
 from common.base import *
+from io_ports.io_port_abstract import AbstractSocket
 
 """
 ParallelFPGAAdapter
@@ -54,6 +55,8 @@ FROM PARALLEL < SEE PYPARALLEL for Acknowledgements >
 HIGH             = 1
 LOW              = 0
 
+STROBE           = 0x01
+AUTO_FEED        = 0x02
 INIT             = 0x04
 SELECT_IN        = 0x08
 
@@ -73,7 +76,7 @@ class Parallel(parallel.Parallel):
         return self.pyparallel.inp(self.statusRegAdr)
 
 
-class ParallelSocket(AppBase):
+class ParallelSocket(AbstractSocket):
     """
     FPGA via Parallel Interface
     """
@@ -82,21 +85,24 @@ class ParallelSocket(AppBase):
     entity_atts = []
 
     def __init__(self, port = None):
+        """
+        port : LPT port number or device name of the board, defaults to the first LPT port
+        """
         # Prepare Parent
         super(ParallelSocket, self).__init__()
         
         # TODO: May need to push __port assignement down into connect method
-        self.__port = Parallel()
+        self.__port = Parallel() if port == None else Parallel(port)
 
 
     # Connection Management -----------------------------------
     
 
     @staticmethod
-    def detect():
+    def detect(port = None):
         """Interogates the PC to determine if a parallel port can be established"""
         try:
-            Parallel()
+            Parallel() if port == None else Parallel(port)
         except:
             return False
         else:
@@ -117,7 +123,48 @@ class ParallelSocket(AppBase):
         """
         # Point to the correct register
         self.__port.setData(index)
-        
+        return self.__read_cycle()
+    
+    def write(self, index, data):
+        """
+        Write method which write data at index into the FPGA register via a parallel interface
+        """
+        self.__write_cycle(index, data)
+
+    def read_block(self, index, count, trigger = None):
+        """
+        Reads the FPGA register at index count times. The register pointer is only placed on
+        the data bus once, unless a trigger (index, value) has to be written before every read.
+        """
+        data = []
+        if trigger == None:
+            self.__port.setData(index)
+        for i in xrange(count):
+            if trigger != None:
+                self.__write_cycle(trigger[0], trigger[1])
+                self.__port.setData(index)
+            data.append(self.__read_cycle())
+        return data
+
+    def write_block(self, index, data, trigger = None):
+        """
+        Writes every byte in data to the FPGA register at index, each with a full write
+        cycle. Every cycle leaves the control register idle, so it is only reset before
+        the first one. If a trigger (index, value) is provided, it is written after every byte.
+        """
+        for byte in data:
+            self.__write_cycle(index, byte)
+            if trigger != None:
+                self.__write_cycle(trigger[0], trigger[1])
+
+
+    # Bus Cycles --------------------------------
+
+
+    def __read_cycle(self):
+        """
+        Assembles a byte from the status register nibbles of the register already on the data bus
+        """
         # Set Select-in and INIT (inverted)
         self.__port.setCtrlReg(SELECT_IN)
         
@@ -144,31 +191,32 @@ class ParallelSocket(AppBase):
         #    print 'read: %s = %s' % (index, data)
         
         return data    
-    
-    def write(self, index, data):
+
+    def __write_cycle(self, index, data):
         """
-        Write method which write data at index into the FPGA register via a parallel interface
+        Latches the register address and then the data into the FPGA
         """
         #if index in [48,54]:
         #    print 'write: %s = %s' % (index, data)
-        # Make sure control is in the low state
-        # New function to speed up runtime - set everything
-        self.__port.setCtrlReg(0)
+        # Make sure control is in the low state, which it already is after a previous write
+        if getattr(self.__port, 'ctrlReg', None) != 0:
+            self.__port.setCtrlReg(0)
         
         # Set Register Address on Data Bus
         self.__port.setData(index)
         
         # Set Auto Feed to LOW to capture address
-        self.__port.setAutoFeed(LOW)
+        self.__port.setCtrlReg(AUTO_FEED)
         
         # Set Data on Data Bus
         self.__port.setData(data)
         
         # Set Strobe Low
-        self.__port.setDataStrobe(LOW)
+        self.__port.setCtrlReg(AUTO_FEED | STROBE)
         
-        self.__port.setAutoFeed(HIGH)
-        self.__port.setDataStrobe(HIGH)
+        # Set Auto Feed and then Strobe HIGH
+        self.__port.setCtrlReg(STROBE)
+        self.__port.setCtrlReg(0)
 
     def dump(self, compare_to = None):
         """
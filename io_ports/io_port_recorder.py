@@ -0,0 +1,458 @@
+#!/usr/bin/env python
+
+"""
+RecordingSocket
+
+    Wraps any socket (SerialSocket, ParallelSocket, VisaSocket or a
+    SimulatedFPGASocket) and records every read and write, with a timestamp,
+    to a compact binary log. Logs can be decoded into high level FPGA
+    operations, replayed against another socket, and summarized per Package
+    API call to catch regressions in port transaction counts.
+
+    Log Format
+        Header   'LMPT' followed by an unsigned short version number
+        Record   <d B B H> seconds since recording began, kind, register index and
+                 payload length, followed by the payload. Register transactions
+                 carry the byte as a one byte payload, VISA transactions carry
+                 the command or response string, markers carry their label.
+
+    Example
+        recorder = RecordingSocket(SerialSocket(), 'bench.log')
+        dut.connect(FPGASerialAdapter(recorder))
+        recorder.watch(dut)
+        ...
+        recorder.close()
+        print format_report(report(load('bench.log')))
+"""
+
+import struct
+import time
+
+from common.base import *
+from io_ports.io_port_abstract import *
+from io_ports.fpga_registers import GL_CSR, CFG, CLK_SL, SI_CSR, SI_MCTL, SI_CFG_0, SI_CFG_1, SI_ADDR_0, SI_ADDR_1, SI_DATA, SI_CNT_0, SI_CNT_1
+from io_ports.fpga_registers import SI_CSR_ST
+from io_ports.fpga_registers import OPCODE_READ_SERDES, OPCODE_WRITE_SERDES, OPCODE_READ_SI_RAM0, OPCODE_WRITE_SI_RAM0, OPCODE_READ_SI_RAM1, OPCODE_WRITE_SI_RAM1
+
+LOG_MAGIC   = 'LMPT'
+LOG_VERSION = 1
+LOG_HEADER  = struct.Struct('<4sH')
+LOG_RECORD  = struct.Struct('<dBBH')
+
+# Record kinds
+RECORD_READ  = 0x01 # PC <- Port
+RECORD_WRITE = 0x02 # PC -> Port
+RECORD_QUERY = 0x03 # PC -> Port, a VISA query whose response is the following read
+RECORD_BEGIN = 0x10 # A marked call began
+RECORD_END   = 0x11 # The most recently begun call ended
+RECORD_MARK  = 0x12 # A point of interest
+
+# Index recorded for transactions with string payloads (VISA)
+STRING_INDEX = 0xff
+
+# Package API calls wrapped by RecordingSocket.watch
+WATCHED_CALLS = ['reset', 'prepare', 'check', 'clear', 'commit', 'set', 'refresh', 'inspect', 'get']
+
+class PortRecord(object):
+    """A single recorded port transaction or marker"""
+
+    __slots__ = ['time', 'kind', 'index', 'data']
+
+    def __init__(self, time, kind, index, data):
+        self.time  = time
+        self.kind  = kind
+        self.index = index
+        self.data  = data
+
+    def __repr__(self):
+        return 'PortRecord(%.6f, 0x%02x, %s, %r)' % (self.time, self.kind, self.index, self.data)
+
+    def __eq__(self, other):
+        return (self.kind, self.index, self.data) == (other.kind, other.index, other.data)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def pack(self):
+        """Returns the binary representation of the record"""
+        if isinstance(self.data, basestring):
+            payload = self.data
+        else:
+            payload = chr(self.data & 0xff)
+        return LOG_RECORD.pack(self.time, self.kind, self.index, len(payload)) + payload
+
+
+class PortOperation(object):
+    """A high level FPGA operation decoded from port records"""
+
+    __slots__ = ['name', 'time', 'details', 'transactions']
+
+    def __init__(self, name, time, details = None, transactions = 1):
+        self.name         = name
+        self.time         = time
+        self.details      = details if details != None else {}
+        self.transactions = transactions
+
+    def __repr__(self):
+        return 'PortOperation(%s, %s, %s transactions)' % (self.name, self.details, self.transactions)
+
+
+class RecordingSocket(AbstractSocket):
+    """
+    Socket wrapper which records every transaction of the socket it wraps
+    """
+
+    entity_name = 'recording_socket'
+    entity_atts = []
+
+    def __init__(self, port, log = None):
+        """
+        port : The socket to record
+        log  : Optional filepath the binary log is streamed to
+        """
+        # Prepare Parent
+        super(RecordingSocket, self).__init__()
+
+        self._port    = port
+        self._start   = time.time()
+        self._depth   = 0
+        self._file    = None
+        self.records  = []
+        if log != None:
+            self._file = open(log, 'wb')
+            self._file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION))
+
+    def __getattr__(self, name):
+        """Exposes the remaining attributes of the recorded socket"""
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._port, name)
+
+    @property
+    def port(self):
+        """Returns the socket being recorded"""
+        return self._port
+
+
+    # Recording Management -----------------------------------
+
+
+    def _record(self, kind, index, data):
+        record = PortRecord(time.time() - self._start, kind, index, data)
+        self.records.append(record)
+        if self._file != None:
+            self._file.write(record.pack())
+
+    def mark(self, label):
+        """Records a point of interest in the log"""
+        self._record(RECORD_MARK, 0, label)
+
+    def begin(self, label):
+        """Records the beginning of a call, transactions until end() are attributed to it"""
+        self._record(RECORD_BEGIN, 0, label)
+
+    def end(self):
+        """Records the end of the most recently begun call"""
+        self._record(RECORD_END, 0, '')
+
+    def watch(self, package):
+        """
+        Wraps the API calls of the package and its SCRs so that every outermost
+        call is marked in the log, for example 'top.set'
+        """
+        for target in [package] + list(package):
+            prefix = getattr(target, 'label', 'package')
+            for name in WATCHED_CALLS:
+                setattr(target, name, self._watched(getattr(target, name), '%s.%s' % (prefix, name)))
+
+    def _watched(self, method, label):
+        def call(*args, **keyw):
+            self._depth += 1
+            if self._depth == 1:
+                self.begin(label)
+            try:
+                return method(*args, **keyw)
+            finally:
+                if self._depth == 1:
+                    self.end()
+                self._depth -= 1
+        call.__doc__ = method.__doc__
+        return call
+
+    def close(self):
+        """Closes the log file"""
+        if self._file != None:
+            self._file.close()
+            self._file = None
+
+
+    # Protocol Read / Write Methods --------------------------------
+
+
+    def read(self, index):
+        """
+        Reads from the recorded socket, index is a register or a VISA query
+        """
+        data = self._port.read(index)
+        if isinstance(index, basestring):
+            self._record(RECORD_QUERY, STRING_INDEX, index)
+            self._record(RECORD_READ, STRING_INDEX, data)
+        else:
+            self._record(RECORD_READ, index, data)
+        return data
+
+    def write(self, index, data = None):
+        """
+        Writes to the recorded socket, index is a register or a VISA command
+        """
+        if isinstance(index, basestring):
+            self._port.write(index)
+            self._record(RECORD_WRITE, STRING_INDEX, index)
+        else:
+            self._port.write(index, data)
+            self._record(RECORD_WRITE, index, data)
+
+    def read_block(self, index, count, trigger = None):
+        """
+        Reads a block through the recorded socket and records its transactions
+        """
+        data = self._port.read_block(index, count, trigger)
+        for byte in data:
+            if trigger != None:
+                self._record(RECORD_WRITE, trigger[0], trigger[1])
+            self._record(RECORD_READ, index, byte)
+        return data
+
+    def write_block(self, index, data, trigger = None):
+        """
+        Writes a block through the recorded socket and records its transactions
+        """
+        self._port.write_block(index, data, trigger)
+        for byte in data:
+            self._record(RECORD_WRITE, index, byte)
+            if trigger != None:
+                self._record(RECORD_WRITE, trigger[0], trigger[1])
+
+    def transfer(self, transactions):
+        """
+        Transfers a batch through the recorded socket and records its transactions
+        """
+        results = self._port.transfer(transactions)
+        reads = iter(results)
+        for transaction in transactions:
+            kind, index = transaction[0], transaction[1]
+            if kind == TRANSFER_READ:
+                self._record(RECORD_READ, index, reads.next())
+            elif kind == TRANSFER_WRITE:
+                self._record(RECORD_WRITE, index, transaction[2])
+            elif kind == TRANSFER_READ_BLOCK:
+                trigger = transaction[3]
+                for byte in reads.next():
+                    if trigger != None:
+                        self._record(RECORD_WRITE, trigger[0], trigger[1])
+                    self._record(RECORD_READ, index, byte)
+            elif kind == TRANSFER_WRITE_BLOCK:
+                trigger = transaction[3]
+                for byte in transaction[2]:
+                    self._record(RECORD_WRITE, index, byte)
+                    if trigger != None:
+                        self._record(RECORD_WRITE, trigger[0], trigger[1])
+        return results
+
+
+# Log Management -----------------------------------
+
+
+def load(log):
+    """Returns the list of PortRecords held in the binary log at the filepath provided"""
+    f = open(log, 'rb')
+    try:
+        content = f.read()
+    finally:
+        f.close()
+    magic, version = LOG_HEADER.unpack_from(content, 0)
+    if magic != LOG_MAGIC or version != LOG_VERSION:
+        raise ValueError('%s is not a version %s port log' % (log, LOG_VERSION))
+    records = []
+    offset = LOG_HEADER.size
+    while offset < len(content):
+        t, kind, index, length = LOG_RECORD.unpack_from(content, offset)
+        offset += LOG_RECORD.size
+        payload = content[offset:offset+length]
+        offset += length
+        if index != STRING_INDEX and kind in (RECORD_READ, RECORD_WRITE):
+            payload = ord(payload)
+        records.append(PortRecord(t, kind, index, payload))
+    return records
+
+def decode(records):
+    """
+    Decodes register transactions into a list of PortOperations:
+        target_switch    SI_CFG_0 or SI_CFG_1 written
+        configure        CFG, CLK_SL, SI_MCTL or SI_CNT written
+        clear_errors     GL_CSR written
+        ram_write        Consecutive bytes written to RAM_0 or RAM_1
+        ram_read         Consecutive bytes read from RAM_0 or RAM_1
+        serdes_commit    RAM_0 shifted into the SCR
+        serdes_readback  SCR captured into RAM_1
+        poll             SI_CSR read while waiting for an opcode to finish
+    Address, data and VISA transactions are folded into the operation they serve.
+    """
+    operations = []
+    registers = {SI_ADDR_0:0, SI_ADDR_1:0, SI_DATA:0, SI_CNT_0:0, SI_CNT_1:0}
+    pending = 0
+    pending_read = None
+    for record in records:
+        if record.kind != RECORD_READ and record.kind != RECORD_WRITE and record.kind != RECORD_QUERY:
+            continue
+        pending += 1
+        if record.index == STRING_INDEX:
+            operations.append(PortOperation('visa', record.time, {'kind':record.kind, 'data':record.data}, pending))
+            pending = 0
+            continue
+        if record.kind == RECORD_READ:
+            if record.index == SI_CSR:
+                _append_operation(operations, 'poll', record.time, {}, pending)
+                pending = 0
+            elif record.index == SI_DATA and pending_read != None:
+                name, ram, address = pending_read
+                _append_operation(operations, name, record.time, {'ram':ram, 'address':address, 'data':[record.data]}, pending)
+                pending = 0
+                pending_read = None
+            continue
+
+        data = record.data
+        if record.index in registers:
+            registers[record.index] = data
+        elif record.index == SI_CFG_0 or record.index == SI_CFG_1:
+            operations.append(PortOperation('target_switch', record.time, {'register':record.index, 'value':data}, pending))
+            pending = 0
+        elif record.index == GL_CSR:
+            operations.append(PortOperation('clear_errors', record.time, {}, pending))
+            pending = 0
+        elif record.index in (CFG, CLK_SL, SI_MCTL):
+            operations.append(PortOperation('configure', record.time, {'register':record.index, 'value':data}, pending))
+            pending = 0
+        elif record.index == SI_CSR and data & SI_CSR_ST:
+            opcode = data & 0xf0
+            address = registers[SI_ADDR_0] | ((registers[SI_ADDR_1] & 0x01) << 8)
+            bit_count = registers[SI_CNT_0] | ((registers[SI_CNT_1] & 0x0f) << 8)
+            byte_count = (bit_count + 7) / 8
+            if opcode == OPCODE_WRITE_SI_RAM0 or opcode == OPCODE_WRITE_SI_RAM1:
+                ram = 0 if opcode == OPCODE_WRITE_SI_RAM0 else 1
+                _append_operation(operations, 'ram_write', record.time, {'ram':ram, 'address':address, 'data':[registers[SI_DATA]]}, pending)
+                pending = 0
+                address += 1
+            elif opcode == OPCODE_READ_SI_RAM0 or opcode == OPCODE_READ_SI_RAM1:
+                pending_read = ('ram_read', 0 if opcode == OPCODE_READ_SI_RAM0 else 1, address)
+                address += 1
+            elif opcode == OPCODE_WRITE_SERDES:
+                operations.append(PortOperation('serdes_commit', record.time, {'address':address, 'bits':bit_count}, pending))
+                pending = 0
+                address += byte_count
+            elif opcode == OPCODE_READ_SERDES:
+                operations.append(PortOperation('serdes_readback', record.time, {'address':address, 'bits':bit_count}, pending))
+                pending = 0
+                address += byte_count
+            registers[SI_ADDR_0] = address & 0xff
+            registers[SI_ADDR_1] = (address >> 8) & 0x01
+    if pending > 0:
+        operations.append(PortOperation('other', records[-1].time, {}, pending))
+    return operations
+
+def _append_operation(operations, name, t, details, transactions):
+    """Appends the operation, merging it into the previous one when it continues a RAM block or a poll"""
+    if operations:
+        last = operations[-1]
+        if last.name == name:
+            if name == 'poll':
+                last.transactions += transactions
+                last.details['count'] = last.details.get('count', 1) + 1
+                return
+            if last.details.get('ram') == details.get('ram') and last.details['address'] + len(last.details['data']) == details['address']:
+                last.details['data'].extend(details['data'])
+                last.transactions += transactions
+                return
+    operations.append(PortOperation(name, t, details, transactions))
+
+def replay(records, port, timing = 'compressed'):
+    """
+    Replays the recorded transactions against the port and returns a list of
+    (record, value) tuples for every read which returned a different value.
+
+    timing : 'compressed' replays as fast as possible, 'original' waits out the
+             recorded gaps between transactions, a number scales the recorded gaps
+    """
+    if timing == 'compressed':
+        scale = 0
+    elif timing == 'original':
+        scale = 1
+    else:
+        scale = float(timing)
+    mismatches = []
+    start = time.time()
+    first = records[0].time if records else 0
+    query = None
+    for record in records:
+        if scale > 0:
+            delay = (record.time - first) * scale - (time.time() - start)
+            if delay > 0:
+                time.sleep(delay)
+        if record.kind == RECORD_QUERY:
+            query = record.data
+        elif record.kind == RECORD_WRITE:
+            if record.index == STRING_INDEX:
+                port.write(record.data)
+            else:
+                port.write(record.index, record.data)
+        elif record.kind == RECORD_READ:
+            if record.index == STRING_INDEX:
+                value = port.read(query)
+                query = None
+            else:
+                value = port.read(record.index)
+            if value != record.data:
+                mismatches.append((record, value))
+    return mismatches
+
+def report(records):
+    """
+    Aggregates the transactions of the log per marked call. Returns a dictionary
+    of label : {'calls', 'reads', 'writes', 'seconds'}. Transactions outside of
+    any marked call are attributed to None.
+    """
+    results = {}
+    stack = []
+    for record in records:
+        if record.kind == RECORD_BEGIN:
+            stack.append((record.data, record.time))
+            entry = results.setdefault(record.data, {'calls':0, 'reads':0, 'writes':0, 'seconds':0.0})
+            entry['calls'] += 1
+        elif record.kind == RECORD_END:
+            label, began = stack.pop()
+            results[label]['seconds'] += record.time - began
+        elif record.kind == RECORD_READ or record.kind == RECORD_WRITE or record.kind == RECORD_QUERY:
+            label = stack[-1][0] if stack else None
+            entry = results.setdefault(label, {'calls':0, 'reads':0, 'writes':0, 'seconds':0.0})
+            if record.kind == RECORD_READ:
+                entry['reads'] += 1
+            else:
+                entry['writes'] += 1
+    return results
+
+def format_report(results):
+    """Returns the report as a table, heaviest call first"""
+    lines = ['%-24s %8s %10s %10s %12s %10s' % ('CALL', 'CALLS', 'READS', 'WRITES', 'PER CALL', 'SECONDS')]
+    rows = results.items()
+    rows.sort(key = lambda row: row[1]['reads'] + row[1]['writes'], reverse = True)
+    for label, entry in rows:
+        transactions = entry['reads'] + entry['writes']
+        per_call = float(transactions) / entry['calls'] if entry['calls'] else transactions
+        lines.append('%-24s %8s %10s %10s %12.1f %10.4f' % (label, entry['calls'], entry['reads'], entry['writes'], per_call, entry['seconds']))
+    return '\n'.join(lines)
+
+
+if __name__=='__main__' :
+    import sys
+    if len(sys.argv) > 1:
+        print format_report(report(load(sys.argv[1])))
@@ -19,8 +19,9 @@ R_CMD7 = 0xD7
 import serial
 
 from common.base import *
+from io_ports.io_port_abstract import *
 
-class SerialSocket(AppBase):
+class SerialSocket(AbstractSocket):
     """
     FPGA via Serial Interface
     """
@@ -28,35 +29,41 @@ class SerialSocket(AppBase):
     entity_name = 'serial_socket'
     entity_atts = []
 
-    def __new__(cls, *p, **k):
-        """Forces StationManger to act as Singleton"""
-        if not '_single_instance' in cls.__dict__:
-            cls._single_instance = object.__new__(cls)
-            
-            # Prepare Parent
-            #super(SerialSocket, self).__init__()
-            
-            cls.__port = serial.Serial(port = 0, baudrate = 19200, parity = 'O', timeout=1)
+    # One socket per serial port, shared by every adapter addressing that port
+    _instances = {}
+
+    def __new__(cls, port = None, *p, **k):
+        """Returns the socket open on the port provided, opening the port if it has not been used"""
+        if port == None:
+            port = 0
+        if not port in cls._instances:
+            instance = object.__new__(cls)
+            instance.__port = serial.Serial(port = port, baudrate = 19200, parity = 'O', timeout=1)
+            cls._instances[port] = instance
         else:
-            if not cls._single_instance.is_open:
-                cls._single_instance.open()
-        return cls._single_instance
+            instance = cls._instances[port]
+            if not instance.is_open:
+                instance.open()
+        return instance
 
-   #def __init__(self, port = None):
-   #     # Prepare Parent
-   #     super(SerialSocket, self).__init__()
-   #     # TODO: May need to push __port assignement down into connect method
-   #     self.__port = serial.Serial(port = 0, baudrate = 19200, parity = 'O', timeout=1)
+    def __init__(self, port = None):
+        """
+        port : Serial port number or device name of the board, such as 0 or '/dev/ttyUSB1'.
+               Defaults to the first serial port.
+        """
+        # Prepare Parent
+        super(SerialSocket, self).__init__()
 
 
     # Connection Management -----------------------------------
 
     # CANT USE THIS DETECT METHOD BECAUSE IT CAUSES FILE LOCKS ON THE OPEN PORT
     @staticmethod
-    def detect():
+    def detect(port = None):
         """Interogates the PC to determine if a serial connection can be established"""
+        s = None
         try:
-            s = serial.Serial(port = 0, baudrate = 19200, parity = 'O', timeout=1)
+            s = serial.Serial(port = port if port != None else 0, baudrate = 19200, parity = 'O', timeout=1)
         except Exception, e:
             log = logging.getLogger('root')
             log.exception(e)
@@ -64,7 +71,8 @@ class SerialSocket(AppBase):
         else:
             return True
         finally:
-            s.close()
+            if s != None:
+                s.close()
             
     def open(self):
         """Closes the serial port."""
@@ -83,14 +91,14 @@ class SerialSocket(AppBase):
     def state(self):
         """Returns the properties associated with the serial port."""
         return {
-            'port'     : self.self.__port.port,      #port name/number as set by the user
-            'baudrate' : self.self.__port.baudrate,  #current baudrate setting
-            'bytesize' : self.self.__port.bytesize,  #bytesize in bits
-            'parity'   : self.self.__port.parity,    #parity setting
-            'stopbits' : self.self.__port.stopbits,  #stop bit with (1,2)
-            'timeout'  : self.self.__port.timeout,   #timeout setting
-            'xonxoff'  : self.self.__port.xonxoff,   #if Xon/Xoff flow control is enabled
-            'rtscts'   : self.self.__port.rtscts     #if hardware flow control is enabled
+            'port'     : self.__port.port,      #port name/number as set by the user
+            'baudrate' : self.__port.baudrate,  #current baudrate setting
+            'bytesize' : self.__port.bytesize,  #bytesize in bits
+            'parity'   : self.__port.parity,    #parity setting
+            'stopbits' : self.__port.stopbits,  #stop bit with (1,2)
+            'timeout'  : self.__port.timeout,   #timeout setting
+            'xonxoff'  : self.__port.xonxoff,   #if Xon/Xoff flow control is enabled
+            'rtscts'   : self.__port.rtscts     #if hardware flow control is enabled
             }
     
     # Protocol Read / Write Methods --------------------------------
@@ -100,11 +108,7 @@ class SerialSocket(AppBase):
         """
         Read method which returns data at index from the FPGA register via a serial interface
         """
-        # Read Opcode
-        isNotFirstCmd = False
-        self.__ser_wr_trans(RG_RD, isNotFirstCmd)
-        # Read Address
-        self.__ser_wr_trans(index)
+        self.__port.write(self.__read_frame(index))
         rdata = self.__port.read()
         if rdata == '':
             raise ValueError('Serial i/O error - ord() expects a character, but string of length 0 is present.')
@@ -115,33 +119,108 @@ class SerialSocket(AppBase):
         """
         Write method which write data at index into the FPGA register via a serial interface
         """
+        self.__port.write(self.__write_frame(index, data))
+
+    def read_block(self, index, count, trigger = None):
+        """
+        Reads the FPGA register at index count times. Every read request (and trigger write)
+        is sent as a single serial write and the responses are collected with a single read.
+        """
+        frame = self.__read_frame(index)
+        if trigger != None:
+            frame = self.__write_frame(trigger[0], trigger[1]) + frame
+        self.__port.write(frame * count)
+        rdata = self.__port.read(count)
+        if len(rdata) != count:
+            raise ValueError('Serial i/O error - expected %s bytes, but %s were returned.' % (count, len(rdata)))
+        return [ord(c) for c in rdata]
+
+    def write_block(self, index, data, trigger = None):
+        """
+        Writes every byte in data to the FPGA register at index as a single serial write.
+        If a trigger (index, value) is provided, it is written after every byte.
+        """
+        tail = ''
+        if trigger != None:
+            tail = self.__write_frame(trigger[0], trigger[1])
+        frames = [self.__write_frame(index, byte) + tail for byte in data]
+        self.__port.write(''.join(frames))
+
+    def transfer(self, transactions):
+        """
+        Sends every transaction in the batch as a single serial write, then collects
+        the responses to all of the reads with a single serial read
+        """
+        frames = []
+        counts = []
+        for transaction in transactions:
+            kind = transaction[0]
+            if kind == TRANSFER_READ:
+                frames.append(self.__read_frame(transaction[1]))
+                counts.append(None)
+            elif kind == TRANSFER_WRITE:
+                frames.append(self.__write_frame(transaction[1], transaction[2]))
+            elif kind == TRANSFER_READ_BLOCK:
+                index, count, trigger = transaction[1:]
+                frame = self.__read_frame(index)
+                if trigger != None:
+                    frame = self.__write_frame(trigger[0], trigger[1]) + frame
+                frames.append(frame * count)
+                counts.append(count)
+            elif kind == TRANSFER_WRITE_BLOCK:
+                index, data, trigger = transaction[1:]
+                tail = ''
+                if trigger != None:
+                    tail = self.__write_frame(trigger[0], trigger[1])
+                frames.extend([self.__write_frame(index, byte) + tail for byte in data])
+            else:
+                raise ValueError('Unrecognized transaction kind: %s' % kind)
+        self.__port.write(''.join(frames))
+
+        # Collect and split up the responses
+        expected = sum([1 if count == None else count for count in counts])
+        rdata = self.__port.read(expected) if expected else ''
+        if len(rdata) != expected:
+            raise ValueError('Serial i/O error - expected %s bytes, but %s were returned.' % (expected, len(rdata)))
+        results = []
+        offset = 0
+        for count in counts:
+            if count == None:
+                results.append(ord(rdata[offset]))
+                offset += 1
+            else:
+                results.append([ord(c) for c in rdata[offset:offset+count]])
+                offset += count
+        return results
+
+
+    # Serial Framing --------------------------------
+
+
+    def __read_frame(self, index):
+        """Read Opcode followed by the Read Address"""
         isNotFirstCmd = False
-        # Write Opcode
-        self.__ser_wr_trans(RG_WR, isNotFirstCmd)
-        isNotFirstCmd = True
-        # Write Address
-        self.__ser_wr_trans(index, isNotFirstCmd)
-        # Write Data
-        self.__ser_wr_trans(data, isNotFirstCmd)
+        return self.__ser_str(RG_RD, isNotFirstCmd) + self.__ser_str(index)
 
+    def __write_frame(self, index, data):
+        """Write Opcode followed by the Write Address and the Write Data"""
+        isNotFirstCmd = False
+        frame = self.__ser_str(RG_WR, isNotFirstCmd)
+        isNotFirstCmd = True
+        return frame + self.__ser_str(index, isNotFirstCmd) + self.__ser_str(data, isNotFirstCmd)
 
     def __data_to_ser_str(self, data):
         return chr(int(data))
     
-    def __ser_wr_trans(self, transaction, isNotFirstCmd = True):
-        dat_str = self.__data_to_ser_str(transaction)
-        if isNotFirstCmd :
-            self.__send_dle(transaction)
-        self.__port.write(dat_str)         
-            
-    def __send_dle(self, trans_val):
-        """ 
+    def __ser_str(self, transaction, isNotFirstCmd = True):
+        """
         if the Address or Data is between DLE and R_CMD7 then 
         a DLE Command must be sent across the Serial Interface
         """
-        if (trans_val >= DLE and trans_val <= R_CMD7):
-            dle_str = chr(int(DLE)) 
-            self.__port.write(dle_str)
+        dat_str = self.__data_to_ser_str(transaction)
+        if isNotFirstCmd and (transaction >= DLE and transaction <= R_CMD7):
+            dat_str = chr(int(DLE)) + dat_str
+        return dat_str
 
     def dump(self, compare_to = None):
         """
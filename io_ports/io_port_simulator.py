@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+
+"""
+SimulatedFPGASocket
+
+    Emulates the FPGA serial interface register file and the DUT scan chains
+    behind it, so that the FPGA connection adapters can be exercised and
+    benchmarked without a test board.
+
+    Register File
+        GL_CSR     Bit 0 aborts pending operations and clears SI_CSR errors (self clearing)
+        SI_CSR     Opcode register, executes when SI_CSR_ST is written as 1
+        SI_CFG_0   Bit 7 selects which scan chain the SERDES opcodes act on (see targets)
+        SI_ADDR_x  9 bit RAM address, auto-incremented by every RAM and SERDES opcode
+        SI_DATA    Byte moved into or out of RAM by the RAM opcodes
+        SI_CNT_x   Number of bits shifted by the SERDES opcodes
+
+    Scan Chains
+        One chain is built for every SCR in the package. Bit i of a chain is
+        stored in RAM byte i / 8 at bit i % 8, so the least significant bit of
+        every RAM byte is shifted first. This mirrors the bit order used by the
+        adapters. Input bits are captured as they were last shifted in, output
+        bits are captured from the values driven with drive().
+
+    Busy Shifts
+        By default every opcode completes at once. With busy_reads the SERDES
+        opcodes keep SI_CSR_ST set for that many reads of SI_CSR, and the shift
+        or capture only takes place once they finish, so RAM written in the
+        meantime is what gets shifted. A SERDES opcode submitted while another
+        is still busy is dropped and flags SI_CSR_ERR.
+"""
+
+from common.base import *
+from io_ports.io_port_abstract import *
+from io_ports.fpga_registers import FPGA_ID, GL_CSR, SI_CSR, SI_CFG_0, SI_ADDR_0, SI_ADDR_1, SI_DATA, SI_CNT_0, SI_CNT_1
+from io_ports.fpga_registers import SI_CSR_ERR, SI_CSR_ST
+from io_ports.fpga_registers import OPCODE_READ_SERDES, OPCODE_WRITE_SERDES, OPCODE_READ_SI_RAM0, OPCODE_WRITE_SI_RAM0, OPCODE_READ_SI_RAM1, OPCODE_WRITE_SI_RAM1
+from io_ports.fpga_registers import TARGET_FIELDS
+
+SIMULATOR_FPGA_ID = 0x11
+SIMULATOR_RAM_SIZE = 512
+
+# SI_CFG_0 bit masks which select each target's scan chain, taken from the routing of the FPGA
+SIMULATOR_TARGETS = dict([(label, bitmask) for label, fields in TARGET_FIELDS.items() for reg_index, bitmask in fields if reg_index == SI_CFG_0])
+
+class SimulatedFPGASocket(AbstractSocket):
+    """
+    FPGA via a simulated register file
+    """
+
+    entity_name = 'simulated_fpga_socket'
+    entity_atts = []
+
+    def __init__(self, package = None, fpga_id = SIMULATOR_FPGA_ID, targets = None, busy_reads = 0):
+        # Prepare Parent
+        super(SimulatedFPGASocket, self).__init__()
+
+        self._fpga_id = fpga_id
+        self._targets = targets if targets != None else SIMULATOR_TARGETS
+
+        # Reads of SI_CSR for which a SERDES opcode stays busy, see Busy Shifts
+        self.busy_reads = busy_reads
+
+        # Scan chains and the direction of each of their bits
+        self._chains     = {}
+        self._directions = {}
+        self._outputs    = {}
+        self._labels     = []
+
+        # Whether or not a batch is being transferred, which counts as a single call
+        self._batched = False
+
+        self.power_on()
+        if package != None:
+            self.load(package)
+
+
+    # Simulation Management -----------------------------------
+
+
+    @staticmethod
+    def detect():
+        """The simulator is always available"""
+        return True
+
+    def power_on(self):
+        """Returns the register file, the RAMs and the transaction counters to their power on state"""
+        self.registers = [0 for i in range(64)]
+        self.registers[FPGA_ID] = self._fpga_id
+        self.ram = [[0 for i in range(SIMULATOR_RAM_SIZE)], [0 for i in range(SIMULATOR_RAM_SIZE)]]
+        # Busy SERDES opcode as [reads left, opcode, target, address]
+        self._busy = None
+        self.reset_counters()
+
+    def load(self, package):
+        """Builds a scan chain initialized to its default value for every SCR in the package"""
+        for scr in package:
+            self._chains[scr.label]     = list(scr.default)
+            self._directions[scr.label] = scr.io_map
+            self._outputs[scr.label]    = {}
+            if scr.label not in self._labels:
+                self._labels.append(scr.label)
+
+    def drive(self, target, global_index, bits):
+        """Drives the output bits of the target's scan chain, beginning at global_index, with the bits provided"""
+        for i, bit in enumerate(list(bits)):
+            self._outputs[target][global_index + i] = bit
+
+    def chain(self, target):
+        """Returns the bits currently held in the target's scan chain as a string"""
+        return ''.join(self._chains[target])
+
+    @property
+    def target(self):
+        """Returns the label of the scan chain selected by SI_CFG_0"""
+        if len(self._labels) == 1:
+            return self._labels[0]
+        for label in self._labels:
+            if label in self._targets and self._matches(self.registers[SI_CFG_0], self._targets[label]):
+                return label
+        return None
+
+    def _matches(self, byte, bitmask):
+        """Whether or not the byte holds the bits identified by the bitmask"""
+        bitmask = bitmask.lower()
+        mask = bin_to_int(bitmask.replace('0','1').replace('x','0'))
+        value = bin_to_int(bitmask.replace('x','0'))
+        return (byte & mask) == value
+
+
+    # Transaction Counters -----------------------------------
+
+
+    def reset_counters(self):
+        """Zeros the transaction counters"""
+        self.reads   = 0
+        self.writes  = 0
+        self.calls   = 0
+        self.opcodes = {}
+
+    @property
+    def transactions(self):
+        """Returns the number of register reads and writes performed"""
+        return self.reads + self.writes
+
+    @property
+    def counters(self):
+        """Returns a dictionary of the transaction counters"""
+        return {'reads':self.reads, 'writes':self.writes, 'calls':self.calls, 'opcodes':dict(self.opcodes)}
+
+
+    # Protocol Read / Write Methods --------------------------------
+
+
+    def read(self, index):
+        """
+        Returns the byte held in the simulated register at index
+        """
+        self._call()
+        return self._read(index)
+
+    def write(self, index, data):
+        """
+        Writes the byte provided into the simulated register at index
+        """
+        self._call()
+        self._write(index, data)
+
+    def read_block(self, index, count, trigger = None):
+        """
+        Reads the simulated register at index count times, writing the trigger before every read
+        """
+        self._call()
+        data = []
+        for i in xrange(count):
+            if trigger != None:
+                self._write(trigger[0], trigger[1])
+            data.append(self._read(index))
+        return data
+
+    def write_block(self, index, data, trigger = None):
+        """
+        Writes every byte in data to the simulated register at index, writing the trigger after every byte
+        """
+        self._call()
+        for byte in data:
+            self._write(index, byte)
+            if trigger != None:
+                self._write(trigger[0], trigger[1])
+
+    def transfer(self, transactions):
+        """
+        Performs the batch of transactions against the simulated registers as a single call
+        """
+        self._call()
+        self._batched = True
+        try:
+            return super(SimulatedFPGASocket, self).transfer(transactions)
+        finally:
+            self._batched = False
+
+    def _call(self):
+        if not self._batched:
+            self.calls += 1
+
+    def _read(self, index):
+        self.reads += 1
+        if index == SI_CSR and self._busy != None:
+            if self._busy[0] > 0:
+                self._busy[0] -= 1
+            else:
+                self._finish()
+        return self.registers[index]
+
+    def _write(self, index, data):
+        self.writes += 1
+        data = int(data) & 0xff
+        if index == FPGA_ID:
+            # Read only
+            return
+        elif index == GL_CSR:
+            # Abort and clear errors, the bit clears itself
+            if data & 0x01:
+                self.registers[SI_CSR] = 0
+                self._busy = None
+            self.registers[GL_CSR] = data & 0xfe
+        elif index == SI_CSR:
+            if data & SI_CSR_ST:
+                self._execute(data & 0xf0)
+            else:
+                self.registers[SI_CSR] = (data & SI_CSR_ERR) | (self.registers[SI_CSR] & SI_CSR_ST)
+        else:
+            self.registers[index] = data
+
+
+    # FPGA Opcode Emulation --------------------------------
+
+
+    def _execute(self, opcode):
+        """Executes the opcode and leaves SI_CSR with the SI_CSR_ST bit cleared, unless a SERDES opcode is busy"""
+        self.opcodes[opcode] = self.opcodes.get(opcode, 0) + 1
+        status = 0
+        address = self._address()
+        if opcode == OPCODE_WRITE_SI_RAM0:
+            self.ram[0][address] = self.registers[SI_DATA]
+            self._set_address(address + 1)
+        elif opcode == OPCODE_READ_SI_RAM0:
+            self.registers[SI_DATA] = self.ram[0][address]
+            self._set_address(address + 1)
+        elif opcode == OPCODE_WRITE_SI_RAM1:
+            self.ram[1][address] = self.registers[SI_DATA]
+            self._set_address(address + 1)
+        elif opcode == OPCODE_READ_SI_RAM1:
+            self.registers[SI_DATA] = self.ram[1][address]
+            self._set_address(address + 1)
+        elif opcode == OPCODE_WRITE_SERDES or opcode == OPCODE_READ_SERDES:
+            target = self.target
+            if self._busy != None:
+                # Dropped, the previous SERDES opcode has not finished
+                self.opcodes[opcode] -= 1
+                self.registers[SI_CSR] |= SI_CSR_ERR
+                return
+            elif target == None:
+                status = SI_CSR_ERR
+            else:
+                self._set_address(address + self._num_bytes(self._bit_count()))
+                if self.busy_reads > 0:
+                    self._busy = [self.busy_reads, opcode, target, address]
+                    self.registers[SI_CSR] = SI_CSR_ST
+                    return
+                self._serdes(opcode, target, address)
+        else:
+            status = SI_CSR_ERR
+        if self._busy != None:
+            # RAM opcodes run while a SERDES opcode is still busy
+            status |= SI_CSR_ST | (self.registers[SI_CSR] & SI_CSR_ERR)
+        self.registers[SI_CSR] = status
+
+    def _serdes(self, opcode, target, address):
+        if opcode == OPCODE_WRITE_SERDES:
+            self._shift_in(target, address)
+        else:
+            self._capture(target, address)
+
+    def _finish(self):
+        """Completes the busy SERDES opcode, clearing SI_CSR_ST"""
+        reads, opcode, target, address = self._busy
+        self._busy = None
+        self._serdes(opcode, target, address)
+        self.registers[SI_CSR] &= SI_CSR_ERR
+
+    def _shift_in(self, target, address):
+        """Shifts SI_CNT bits from RAM_0 into the scan chain"""
+        bits = self._ram_bits(0, address, self._bit_count())
+        chain = self._chains[target]
+        width = len(chain)
+        if len(bits) >= width:
+            self._chains[target] = bits[len(bits)-width:]
+        else:
+            self._chains[target] = chain[len(bits):] + bits
+
+    def _capture(self, target, address):
+        """Captures the scan chain and shifts SI_CNT bits of it out into RAM_1"""
+        captured = []
+        for i, bit in enumerate(self._chains[target]):
+            if self._directions[target][i] == 'O':
+                bit = self._outputs[target].get(i, bit)
+            captured.append(bit)
+        bit_count = self._bit_count()
+        bits = captured[:bit_count] + (['0'] * (bit_count - len(captured)))
+        for byte_offset in xrange(self._num_bytes(bit_count)):
+            byte_bits = bits[byte_offset*8:byte_offset*8+8]
+            byte_bits = byte_bits + (['0'] * (8-len(byte_bits)))
+            self.ram[1][(address + byte_offset) % SIMULATOR_RAM_SIZE] = bin_to_int(byte_bits[::-1])
+
+    def _ram_bits(self, ram, address, bit_count):
+        """Returns bit_count bits from the RAM beginning at address, least significant bit first"""
+        bits = []
+        for byte_offset in xrange(self._num_bytes(bit_count)):
+            byte = self.ram[ram][(address + byte_offset) % SIMULATOR_RAM_SIZE]
+            bits.extend(list(int_to_bin(byte, 8)[::-1]))
+        return bits[:bit_count]
+
+    def _address(self):
+        return (self.registers[SI_ADDR_0] | ((self.registers[SI_ADDR_1] & 0x01) << 8)) % SIMULATOR_RAM_SIZE
+
+    def _set_address(self, address):
+        address = address % SIMULATOR_RAM_SIZE
+        self.registers[SI_ADDR_0] = address & 0xff
+        self.registers[SI_ADDR_1] = (address >> 8) & 0x01
+
+    def _bit_count(self):
+        return self.registers[SI_CNT_0] | ((self.registers[SI_CNT_1] & 0x0f) << 8)
+
+    def _num_bytes(self, bit_count):
+        byte_count, remainder = divmod(bit_count, 8)
+        if remainder > 0:
+            byte_count += 1
+        return byte_count
+
+
+if __name__=='__main__' :
+    pass
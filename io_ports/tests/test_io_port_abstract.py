@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Tests of the AbstractSocket class"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+from io_ports.io_port_abstract import *
+
+class RegisterFileSocket(AbstractSocket):
+    """Minimal socket which logs every transaction against a plain register file"""
+
+    def __init__(self):
+        super(RegisterFileSocket, self).__init__()
+        self.registers = [0 for i in range(64)]
+        self.transactions = []
+
+    def read(self, index):
+        self.transactions.append(('r', index))
+        return self.registers[index]
+
+    def write(self, index, data):
+        self.transactions.append(('w', index, data))
+        self.registers[index] = data
+
+
+class AbstractSocketTests(TestCase):
+    """Tests of the AbstractSocket class"""
+
+    def test_unimplemented_protocol(self):
+        """Single register I/O must be provided by the socket"""
+        socket = AbstractSocket()
+        self.assertRaises(NotImplementedError, socket.read, 0)
+        self.assertRaises(NotImplementedError, socket.write, 0, 0)
+
+    def test_write_block(self):
+        """Block writes fall back to single writes followed by the trigger"""
+        socket = RegisterFileSocket()
+        socket.write_block(54, [1, 2], (48, 0x53))
+        self.assertEqual(socket.transactions, [('w', 54, 1), ('w', 48, 0x53), ('w', 54, 2), ('w', 48, 0x53)])
+
+    def test_read_block(self):
+        """Block reads fall back to the trigger followed by single reads"""
+        socket = RegisterFileSocket()
+        socket.registers[54] = 7
+        self.assertEqual(socket.read_block(54, 2), [7, 7])
+        self.assertEqual(socket.transactions, [('r', 54), ('r', 54)])
+        
+        socket.transactions = []
+        socket.read_block(54, 1, (48, 0x43))
+        self.assertEqual(socket.transactions, [('w', 48, 0x43), ('r', 54)])
+
+
+    def test_transfer(self):
+        """Batches fall back to the single and block methods and return every read"""
+        socket = RegisterFileSocket()
+        socket.registers[54] = 7
+        results = socket.transfer([
+            (TRANSFER_WRITE, 52, 1),
+            (TRANSFER_READ, 52),
+            (TRANSFER_READ_BLOCK, 54, 2, None),
+            (TRANSFER_WRITE_BLOCK, 54, [3], (48, 0x53))
+            ])
+        self.assertEqual(results, [1, [7, 7]])
+        self.assertEqual(socket.transactions, [('w', 52, 1), ('r', 52), ('r', 54), ('r', 54), ('w', 54, 3), ('w', 48, 0x53)])
+        self.assertRaises(ValueError, socket.transfer, [('x', 0)])
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,58 @@ from unittest import TestCase, main
 import yaml
 
 from io_ports.io_port_parallel import *
+import io_ports.io_port_parallel
+
+class FakeParallel(object):
+    """Parallel port which records every value driven onto the data and control registers"""
+
+    def __init__(self, port = None):
+        self.transitions = []
+
+    def setData(self, data):
+        self.transitions.append(('data', data))
+
+    def setCtrlReg(self, value):
+        self.ctrlReg = value
+        self.transitions.append(('ctrl', value))
+
+    def getRegData(self):
+        return 0x00
+
+def write_cycle(index, data):
+    """Returns the pin transitions of a single write cycle, see ParallelSocket"""
+    return [('data', index), ('ctrl', AUTO_FEED), ('data', data), ('ctrl', AUTO_FEED | STROBE), ('ctrl', STROBE), ('ctrl', 0)]
+
+class ParallelSocketCycleTests(TestCase):
+    """Tests the bus cycles of the ParallelSocket class against a fake parallel port"""
+
+    def setUp(self):
+        self.parallel = io_ports.io_port_parallel.Parallel
+        io_ports.io_port_parallel.Parallel = FakeParallel
+        self.socket = ParallelSocket()
+        self.port = self.socket._ParallelSocket__port
+
+    def tearDown(self):
+        io_ports.io_port_parallel.Parallel = self.parallel
+
+    def test_write_block(self):
+        """Every byte and trigger is latched with its own write cycle, after a single control reset"""
+        self.socket.write_block(0x36, [0x5A, 0xA5], (0x30, 0x52))
+        expected = [('ctrl', 0)]
+        for byte in [0x5A, 0xA5]:
+            expected += write_cycle(0x36, byte) + write_cycle(0x30, 0x52)
+        self.assertEqual(self.port.transitions, expected)
+
+    def test_read_block(self):
+        """The register pointer is placed on the data bus once for a block without a trigger"""
+        self.socket.read_block(0x36, 2)
+        self.assertEqual([t for t in self.port.transitions if t[0] == 'data'], [('data', 0x36)])
+        self.assertEqual([t for t in self.port.transitions if t[0] == 'ctrl'], [('ctrl', SELECT_IN), ('ctrl', INIT)] * 2)
+
+        # A write cycle after a read first returns the control register to its idle state
+        self.port.transitions = []
+        self.socket.write(0x30, 0x52)
+        self.assertEqual(self.port.transitions, [('ctrl', 0)] + write_cycle(0x30, 0x52))
 
 class ParallelSocketTests(TestCase):
     """Tests of the ParallelSocket class"""
@@ -76,7 +128,37 @@ class ParallelSocketTests(TestCase):
         #for i in xrange(4):
         #    r = fpga.read(i)
         #    print r
-      
+
+
+    def test_read_write_block(self):
+        """Stream bytes into SI_RAM_0 and back out through SI_DATA"""
+        
+        SI_CSR    = 0x30
+        SI_ADDR_0 = 0x34
+        SI_ADDR_1 = 0x35
+        SI_DATA   = 0x36
+        SI_ST     = 0x02
+        SI_ERR    = 0x01
+        
+        OPCODE_READ_SI_RAM0  = 0x40
+        OPCODE_WRITE_SI_RAM0 = 0x50
+        
+        data = [0x00, 0x5A, 0xA5, 0xD1, 0xFF]
+        
+        # Create Socket
+        fpga = ParallelSocket()
+        
+        # Write the block at RAM address 0
+        fpga.write(SI_ADDR_0, 0)
+        fpga.write(SI_ADDR_1, 0)
+        fpga.write_block(SI_DATA, data, (SI_CSR, OPCODE_WRITE_SI_RAM0 | SI_ST | SI_ERR))
+        
+        # Read the block back from RAM address 0
+        fpga.write(SI_ADDR_0, 0)
+        fpga.write(SI_ADDR_1, 0)
+        r = fpga.read_block(SI_DATA, len(data), (SI_CSR, OPCODE_READ_SI_RAM0 | SI_ST | SI_ERR))
+        self.assertEqual(r, data)
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""Tests of the RecordingSocket class and the port log tools"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+import os
+import tempfile
+
+from io_ports.io_port_recorder import *
+from io_ports.io_port_simulator import SimulatedFPGASocket
+from product.connection_adapters.tests.helpers import mixed_width_package
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+
+class RecordingSocketTests(TestCase):
+    """Tests of the RecordingSocket class"""
+
+    def setUp(self):
+        handle, self.log = tempfile.mkstemp('.log')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.log)
+
+    def test_log_round_trip(self):
+        """Transactions and markers survive the binary log"""
+        recorder = RecordingSocket(SimulatedFPGASocket(), self.log)
+        recorder.mark('start')
+        recorder.write(SI_ADDR_0, 3)
+        self.assertEqual(recorder.read(SI_ADDR_0), 3)
+        recorder.close()
+        self.assertEqual(load(self.log), recorder.records)
+        self.assertEqual([r.kind for r in recorder.records], [RECORD_MARK, RECORD_WRITE, RECORD_READ])
+
+    def test_decode(self):
+        """Register transactions decode into RAM and SERDES operations"""
+        recorder = RecordingSocket(SimulatedFPGASocket())
+        recorder.write(SI_ADDR_0, 0)
+        recorder.write_block(SI_DATA, [5, 6], (SI_CSR, OPCODE_WRITE_SI_RAM0 | SI_CSR_ST))
+        recorder.read(SI_CSR)
+        recorder.read(SI_CSR)
+        operations = decode(recorder.records)
+        self.assertEqual([o.name for o in operations], ['ram_write', 'poll'])
+        self.assertEqual(operations[0].details, {'ram':0, 'address':0, 'data':[5, 6]})
+        self.assertEqual(operations[0].transactions, 5)
+        self.assertEqual(operations[1].details, {'count':2})
+
+    def test_replay_and_report(self):
+        """A recorded package session replays cleanly and is reported per call"""
+        dut = mixed_width_package()
+        recorder = RecordingSocket(SimulatedFPGASocket(dut))
+        dut.connect(FPGASerialAdapter(recorder))
+        recorder.watch(dut)
+
+        scr = dut[0]
+        register = [r for r in scr[0].registers if r.direction == 'I'][0]
+        scr.set(register.label, 1)
+        scr.get(register.label)
+
+        results = report(recorder.records)
+        self.assertEqual(results['%s.set' % scr.label]['calls'], 1)
+        self.assertTrue(results['%s.get' % scr.label]['reads'] > 0)
+        self.assertTrue('serdes_commit' in [o.name for o in decode(recorder.records)])
+
+        simulator = SimulatedFPGASocket(dut)
+        self.assertEqual(replay(recorder.records, simulator), [])
+        self.assertEqual(simulator.chain(scr.label), scr.sent)
+
+
+if __name__ == '__main__':
+    main()
@@ -75,7 +75,66 @@ class SerialSocketTests(TestCase):
         #for i in xrange(4):
         #    r = fpga.read(i)
         #    print r
-      
+
+
+    def test_read_write_block(self):
+        """Stream bytes into SI_RAM_0 and back out through SI_DATA"""
+        
+        SI_CSR    = 0x30
+        SI_ADDR_0 = 0x34
+        SI_ADDR_1 = 0x35
+        SI_DATA   = 0x36
+        SI_ST     = 0x02
+        SI_ERR    = 0x01
+        
+        OPCODE_READ_SI_RAM0  = 0x40
+        OPCODE_WRITE_SI_RAM0 = 0x50
+        
+        data = [0x00, 0x5A, 0xA5, 0xD1, 0xFF]
+        
+        # Create Socket
+        fpga = SerialSocket()
+        
+        # Write the block at RAM address 0
+        fpga.write(SI_ADDR_0, 0)
+        fpga.write(SI_ADDR_1, 0)
+        fpga.write_block(SI_DATA, data, (SI_CSR, OPCODE_WRITE_SI_RAM0 | SI_ST | SI_ERR))
+        
+        # Read the block back from RAM address 0
+        fpga.write(SI_ADDR_0, 0)
+        fpga.write(SI_ADDR_1, 0)
+        r = fpga.read_block(SI_DATA, len(data), (SI_CSR, OPCODE_READ_SI_RAM0 | SI_ST | SI_ERR))
+        self.assertEqual(r, data)
+
+    def test_transfer(self):
+        """Write a block into SI_RAM_0 and read it back within a single batch"""
+        
+        SI_CSR    = 0x30
+        SI_ADDR_0 = 0x34
+        SI_ADDR_1 = 0x35
+        SI_DATA   = 0x36
+        SI_ST     = 0x02
+        SI_ERR    = 0x01
+        
+        OPCODE_READ_SI_RAM0  = 0x40
+        OPCODE_WRITE_SI_RAM0 = 0x50
+        
+        data = [0xD0, 0x12, 0xD7]
+        
+        # Create Socket
+        fpga = SerialSocket()
+        
+        results = fpga.transfer([
+            (TRANSFER_WRITE, SI_ADDR_0, 0),
+            (TRANSFER_WRITE, SI_ADDR_1, 0),
+            (TRANSFER_WRITE_BLOCK, SI_DATA, data, (SI_CSR, OPCODE_WRITE_SI_RAM0 | SI_ST | SI_ERR)),
+            (TRANSFER_WRITE, SI_ADDR_0, 0),
+            (TRANSFER_READ_BLOCK, SI_DATA, len(data), (SI_CSR, OPCODE_READ_SI_RAM0 | SI_ST | SI_ERR)),
+            (TRANSFER_READ, SI_CSR)
+            ])
+        self.assertEqual(results[0], data)
+        self.assertEqual(results[1] & SI_ST, 0)
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""Tests of the SimulatedFPGASocket class"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+from io_ports.io_port_simulator import *
+from product.connection_adapters.tests.helpers import mixed_width_package
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+
+class SimulatedFPGASocketTests(TestCase):
+    """Tests of the SimulatedFPGASocket class"""
+
+    def test_register_file(self):
+        """The FPGA id is read only and RAM opcodes auto-increment the address"""
+        socket = SimulatedFPGASocket()
+        self.assertEqual(socket.read(FPGA_ID), SIMULATOR_FPGA_ID)
+        socket.write(FPGA_ID, 0)
+        self.assertEqual(socket.read(FPGA_ID), SIMULATOR_FPGA_ID)
+
+        socket.write(SI_ADDR_0, 0xff)
+        socket.write_block(SI_DATA, [1, 2], (SI_CSR, OPCODE_WRITE_SI_RAM0 | SI_CSR_ST))
+        self.assertEqual(socket.ram[0][0xff:0x101], [1, 2])
+        self.assertEqual((socket.read(SI_ADDR_0), socket.read(SI_ADDR_1)), (0x01, 0x01))
+
+        socket.write(SI_ADDR_0, 0xff)
+        socket.write(SI_ADDR_1, 0)
+        self.assertEqual(socket.read_block(SI_DATA, 2, (SI_CSR, OPCODE_READ_SI_RAM0 | SI_CSR_ST)), [1, 2])
+        self.assertEqual(socket.opcodes, {OPCODE_WRITE_SI_RAM0:2, OPCODE_READ_SI_RAM0:2})
+
+    def test_targets(self):
+        """Scan chains are selected by the SI_CFG_0 routing the FPGA adapters apply"""
+        self.assertEqual(SIMULATOR_TARGETS, {'top':'1xxxxxxx', 'bottom':'0xxxxxxx'})
+
+    def test_invalid_opcode(self):
+        """Unknown opcodes flag an error which is cleared through GL_CSR"""
+        socket = SimulatedFPGASocket()
+        socket.write(SI_CSR, 0x80 | SI_CSR_ST)
+        self.assertEqual(socket.read(SI_CSR), SI_CSR_ERR)
+        socket.write(GL_CSR, 0x01)
+        self.assertEqual((socket.read(SI_CSR), socket.read(GL_CSR)), (0, 0))
+
+    def test_counters(self):
+        """Every register access is counted"""
+        socket = SimulatedFPGASocket()
+        socket.read(FPGA_ID)
+        socket.write_block(SI_DATA, [0, 0, 0])
+        self.assertEqual(socket.counters, {'reads':1, 'writes':3, 'calls':2, 'opcodes':{}})
+        socket.reset_counters()
+        self.assertEqual(socket.transactions, 0)
+
+    def test_package_round_trip(self):
+        """The FPGA adapter can set and get the registers of a simulated package"""
+        dut = mixed_width_package()
+        socket = SimulatedFPGASocket(dut)
+        dut.connect(FPGASerialAdapter(socket))
+        self.assertTrue(dut.connected)
+
+        scr = dut[0]
+        register = [r for r in scr[0].registers if r.direction == 'I'][0]
+        scr.set(register.label, 1)
+        self.assertEqual(socket.chain(scr.label), scr.sent)
+        self.assertEqual(scr.get(register.label)[scr[0].label], 1)
+        self.assertTrue(socket.opcodes[OPCODE_WRITE_SERDES] > 0)
+
+
+if __name__ == '__main__':
+    main()
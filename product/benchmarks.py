@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks
+
+    Measures the time and memory it takes to build a Package from a DES file, the
+    memory a connected package retains per object type, the calls per second of
+    the register I/O API at register, block, SCR and package scope on the
+    MockAdapter, and the throughput of SCR delta translation.
+
+    Every run is appended to a JSON lines history file, one run per line tagged with
+    the commit it was measured on, and two runs can be compared to flag regressions.
+
+    Usage
+        python product/benchmarks.py [-d DES_FILE] [-f HISTORY_FILE] [-n NUMBER] [--memory]
+        python product/benchmarks.py --compare [-f HISTORY_FILE] [-t THRESHOLD] [BASE_COMMIT [COMMIT]]
+"""
+
+import datetime
+import gc
+import json
+import platform
+import subprocess
+import sys
+import timeit
+
+from optparse import OptionParser
+
+from common.base import *
+from product.package import Package
+from product.connection_adapters.mock_adapter import MockAdapter
+
+DEFAULT_DES     = exepath('tests/mocks/DES_65nm_Fuji.txt')
+DEFAULT_HISTORY = exepath('../benchmark_history.jsonl')
+
+# Slow down which is flagged as a regression
+DEFAULT_THRESHOLD = 0.10
+
+# Metrics which are worse when they grow
+COMPARED_METRICS = ['seconds', 'bytes']
+
+# Register I/O calls measured at every scope
+IO_CALLS = ['set', 'prepare', 'commit', 'inspect', 'get']
+
+
+# Measurement -----------------------------
+
+
+def time_call(function, number, repeat = 3):
+    """Returns the best seconds per call of function over repeat runs of number calls"""
+    return min(timeit.repeat(function, repeat = repeat, number = number)) / number
+
+def measure_memory(function):
+    """
+    Returns (result, bytes, objects) for the call of function, where bytes and objects
+    approximate the size and count of the garbage collected objects it left alive
+    """
+    gc.collect()
+    before = set([id(o) for o in gc.get_objects()])
+    result = function()
+    gc.collect()
+    created = [o for o in gc.get_objects() if id(o) not in before and o is not before]
+    return result, sum([sys.getsizeof(o) for o in created]), len(created)
+
+def throughput(seconds):
+    """Returns a result record for the seconds per call provided"""
+    return {'seconds':seconds, 'ops_per_sec':1.0 / seconds if seconds > 0 else None}
+
+
+# Benchmarks -----------------------------
+
+
+def benchmark_construction(des_file, number = 5):
+    """Measures Package.from_txt_file"""
+    package, size, objects = measure_memory(lambda: Package.from_txt_file(des_file))
+    results = throughput(time_call(lambda: Package.from_txt_file(des_file), number, 1))
+    results['bytes']   = size
+    results['objects'] = objects
+    return {'package.from_txt_file':results}
+
+def benchmark_io(des_file, number = 200):
+    """Measures the register I/O calls at register, block, SCR and package scope on the MockAdapter"""
+    dut = Package.from_txt_file(des_file)
+    dut.connect(MockAdapter())
+    scr   = dut[0]
+    block = scr.lanes[min(scr.lanes.keys())]
+    label = [r.label for r in block.registers if r.direction == 'I'][0]
+    register = block[label]
+
+    # Calls for each scope, taking the register label and a value where the API needs them
+    scopes = {
+        'register' : {'set':lambda: register.set(1), 'prepare':lambda: register.prepare(1), 'commit':register.commit, 'inspect':register.inspect, 'get':register.get},
+        'block'    : {'set':lambda: block.set(label, 1), 'prepare':lambda: block.prepare(label, 1), 'commit':block.commit, 'inspect':lambda: block.inspect(label), 'get':lambda: block.get(label)},
+        'scr'      : {'set':lambda: scr.set(label, 1), 'prepare':lambda: scr.prepare(label, 1), 'commit':scr.commit, 'inspect':lambda: scr.inspect(label), 'get':lambda: scr.get(label)},
+        'package'  : {'set':lambda: dut.set(label, 1), 'prepare':lambda: dut.prepare(label, 1), 'commit':dut.commit, 'inspect':lambda: dut.inspect(label), 'get':lambda: dut.get(label)}
+        }
+    results = {}
+    for scope in scopes:
+        for call in IO_CALLS:
+            results['%s.%s' % (scope, call)] = throughput(time_call(scopes[scope][call], number))
+    return results
+
+def benchmark_delta(des_file, number = 200):
+    """Measures SerialControlRegister.translate_register_string_delta"""
+    scr = Package.from_txt_file(des_file)[0]
+    a = scr.default
+    # Flip every 16th bit
+    b = ''.join([('1' if bit == '0' else '0') if i % 16 == 0 else bit for i, bit in enumerate(a)])
+    return {'scr.translate_register_string_delta':throughput(time_call(lambda: scr.translate_register_string_delta(a, b), number))}
+
+def benchmark_memory(des_file):
+    """Measures the memory retained by a connected package, in total and per object type"""
+    dut = Package.from_txt_file(des_file)
+    dut.connect(MockAdapter())
+    report = dut.memory_report()
+    results = {'memory.total':dict(report['total'])}
+    for name, entry in report['types'].items() + report['overheads'].items():
+        results['memory.%s' % name] = dict(entry)
+    return results
+
+def run_benchmarks(des_file = DEFAULT_DES, number = 200, memory_only = False):
+    """Runs every benchmark and returns a dictionary of benchmark:result pairs"""
+    results = benchmark_memory(des_file)
+    if memory_only:
+        return results
+    results.update(benchmark_construction(des_file, max(1, number / 40)))
+    results.update(benchmark_io(des_file, number))
+    results.update(benchmark_delta(des_file, number))
+    return results
+
+
+# History -----------------------------
+
+
+def current_commit():
+    """Returns the abbreviated hash of the checked out commit, or None outside of a git work tree"""
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', '--short', 'HEAD'], stdout = subprocess.PIPE, stderr = subprocess.PIPE, cwd = exepath('..'))
+        out = process.communicate()[0].strip()
+        return out if process.returncode == 0 and out else None
+    except OSError:
+        return None
+
+def record(results, history = DEFAULT_HISTORY, commit = None, **details):
+    """Appends a run to the history file and returns it"""
+    run = {
+        'commit'  : commit if commit != None else current_commit(),
+        'time'    : datetime.datetime.now().isoformat(),
+        'python'  : platform.python_version(),
+        'results' : results
+        }
+    run.update(details)
+    f = open(history, 'a')
+    try:
+        f.write(json.dumps(run, sort_keys = True) + '\n')
+    finally:
+        f.close()
+    return run
+
+def load_history(history = DEFAULT_HISTORY):
+    """Returns the runs recorded in the history file, oldest first"""
+    if not os.path.exists(history):
+        return []
+    f = open(history)
+    try:
+        return [json.loads(line) for line in f if line.strip()]
+    finally:
+        f.close()
+
+
+# Comparison -----------------------------
+
+
+def find_run(runs, commit):
+    """Returns the most recent run of the commit provided"""
+    for run in reversed(runs):
+        if run.get('commit') != None and run['commit'].startswith(commit):
+            return run
+    raise LookupError('No benchmark run recorded for commit %s' % commit)
+
+def compare(base, head):
+    """
+    Compares the results of two runs and returns a list of (benchmark, metric, base, head, change)
+    for every metric of a benchmark present in both runs, where change is the relative growth
+    """
+    rows = []
+    for name in sorted(set(base['results'].keys()) & set(head['results'].keys())):
+        for metric in COMPARED_METRICS:
+            a = base['results'][name].get(metric)
+            b = head['results'][name].get(metric)
+            if a and b != None:
+                rows.append((name, metric, a, b, (b - a) / float(a)))
+    return rows
+
+def regressions(rows, threshold = DEFAULT_THRESHOLD):
+    """Returns the comparison rows which grew by more than the threshold"""
+    return [row for row in rows if row[4] > threshold]
+
+def format_comparison(base, head, rows, threshold = DEFAULT_THRESHOLD):
+    """Returns the comparison as a text table"""
+    lines = ['%s -> %s' % (base.get('commit'), head.get('commit')), '%-45s %-8s %12s %12s %8s' % ('BENCHMARK', 'METRIC', 'BASE', 'HEAD', 'CHANGE')]
+    for name, metric, a, b, change in rows:
+        flag = '  REGRESSION' if change > threshold else ''
+        lines.append('%-45s %-8s %12.6g %12.6g %+7.1f%%%s' % (name, metric, a, b, change * 100, flag))
+    return '\n'.join(lines)
+
+
+# Command Line -----------------------------
+
+
+def main(argv = None):
+    """Runs or compares the benchmarks, returning 1 if a comparison found regressions"""
+    parser = OptionParser(usage = '%prog [options] [BASE_COMMIT [COMMIT]]')
+    parser.add_option('-d', '--des', default = DEFAULT_DES, help = 'DES file to benchmark with')
+    parser.add_option('-f', '--history', default = DEFAULT_HISTORY, help = 'JSON lines history file')
+    parser.add_option('-n', '--number', type = 'int', default = 200, help = 'Calls per measurement')
+    parser.add_option('-m', '--memory', action = 'store_true', default = False, help = 'Only measure the memory retained per object type')
+    parser.add_option('-c', '--compare', action = 'store_true', default = False, help = 'Compare two recorded runs instead of running')
+    parser.add_option('-t', '--threshold', type = 'float', default = DEFAULT_THRESHOLD, help = 'Relative growth flagged as a regression')
+    options, args = parser.parse_args(argv)
+
+    if options.compare:
+        runs = load_history(options.history)
+        if len(args) == 0 and len(runs) < 2:
+            parser.error('At least two runs are needed for a comparison')
+        base = find_run(runs, args[0]) if len(args) > 0 else runs[-2]
+        head = find_run(runs, args[1]) if len(args) > 1 else runs[-1]
+        rows = compare(base, head)
+        print format_comparison(base, head, rows, options.threshold)
+        return 1 if regressions(rows, options.threshold) else 0
+
+    results = run_benchmarks(options.des, options.number, options.memory)
+    run = record(results, options.history, des = os.path.basename(options.des), number = options.number)
+    for name in sorted(results):
+        if 'seconds' in results[name]:
+            print '%-45s %12.6g s %12.1f/s' % (name, results[name]['seconds'], results[name]['ops_per_sec'] or 0)
+        else:
+            print '%-45s %12s B %12s objects' % (name, results[name]['bytes'], results[name]['objects'])
+    print 'Recorded %s in %s' % (run['commit'], options.history)
+    return 0
+
+
+if __name__=='__main__' :
+    sys.exit(main())
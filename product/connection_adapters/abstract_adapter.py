@@ -15,6 +15,8 @@ Abstract Connection Adapter class
         the state of the SCRs and to provide a clock ????
 """
 
+import time
+
 from common.base import *
 
 class AbstractAdapter(AppBase):
@@ -30,6 +32,10 @@ class AbstractAdapter(AppBase):
     inspect  PC <- Gate Out
     get      PC <- Gate <- DUT
     
+    exchange PC -> Gate -> DUT -> Gate -> PC
+    
+    Adapters may keep a readback cache, see set_readback_window, so that refresh and get
+    reuse the last capture of an SCR until it is older than the window or the SCR is written.
     """
 
     entity_name = 'abstract_adapter'
@@ -43,6 +49,12 @@ class AbstractAdapter(AppBase):
         self._connected    = False
         self._scr_sessions = {}       
 
+        # Readback cache, disabled until a window is set
+        self._readback_window = None
+        self._captures        = {}
+        self.readback_hits    = 0
+        self.readback_misses  = 0
+
     def __str__(self):
         """Returns a dictionary containing information about this package."""
         return '%s (%s)' % (self._type, self.state)
@@ -91,6 +103,65 @@ class AbstractAdapter(AppBase):
         return self._connected
 
 
+    # Readback Cache -----------------------------------
+
+
+    def set_readback_window(self, seconds = None):
+        """
+        Lets refresh and get reuse the last capture of an SCR for the number of seconds provided,
+        or until the SCR is next written. float('inf') keeps captures until the next write, and
+        None disables the cache. refresh(force = True) always captures.
+        """
+        self._readback_window = seconds
+        self._captures = {}
+
+    @property
+    def readback_window(self):
+        """Returns the number of seconds a capture is reused for, or None if the cache is disabled"""
+        return self._readback_window
+
+    @property
+    def readback_counters(self):
+        """Returns the readback cache hits and misses as {'hits', 'misses'}"""
+        return {'hits':self.readback_hits, 'misses':self.readback_misses}
+
+    def reset_readback_counters(self):
+        """Zeroes the readback cache hits and misses"""
+        self.readback_hits   = 0
+        self.readback_misses = 0
+
+    def _record_capture(self, target):
+        """Notes that the target's SCR has just been captured"""
+        if self._readback_window != None:
+            self._captures[target] = (time.time(), set())
+
+    def _note_retrieved(self, target, units):
+        """Adds the units provided to those retrieved from the target's capture"""
+        capture = self._captures.get(target)
+        if capture != None:
+            capture[1].update(units)
+
+    def _forget_capture(self, target = None):
+        """Drops the capture of the target, or of every target, after a write"""
+        if target == None:
+            self._captures = {}
+        else:
+            self._captures.pop(target, None)
+
+    def _capture(self, target):
+        """
+        Returns the set of the units, bytes for example, already retrieved from the target's
+        last capture if it is within the window, otherwise None
+        """
+        capture = self._captures.get(target)
+        if capture == None:
+            return None
+        if time.time() - capture[0] > self._readback_window:
+            del self._captures[target]
+            return None
+        return capture[1]
+
+
     # Configuration Delegation Hooks ---------------------------------
 
 
@@ -152,12 +223,25 @@ class AbstractAdapter(AppBase):
     # Output Management
 
 
-    def refresh(self, target):
+    def refresh(self, target, output_only = False, force = False):
         """
         Populates the gate's output buffer with data from the device        
             Gate Output <- DUT
+        
+        output_only = True : Also retrieves the readback interest, by default the bytes 
+        which hold output registers, from the gate's output buffer
+            PC <- Gate Output <- DUT
+
+        force = True : Captures the SCR even if the readback cache holds a fresh capture
         """
         raise NotImplementedError()
+
+    def set_readback_interest(self, target, global_extents = None):
+        """
+        Sets the list of extents retrieved by refresh(output_only = True). None restores the
+        output registers. Adapters which always retrieve the whole SCR may ignore the interest.
+        """
+        pass
     
     
     def inspect(self, target, global_extents):
@@ -168,12 +252,58 @@ class AbstractAdapter(AppBase):
         raise NotImplementedError()
     
 
-    def get(self, target, global_extents):
+    def get(self, target, global_extents, force = False):
         """
         Immediately returns the data at the index specified from the device (equivalent to a refresh + inspect)
             PC <- Gate <- DUT
         """
         raise NotImplementedError()
+
+
+    # Combined Input / Output Management
+
+
+    def exchange(self, target, global_index, value, global_extents):
+        """
+        Immediately sets the data at the index specified in the device and then returns the 
+        data within the extents specified from the device (equivalent to a set + get)
+            PC -> Gate -> DUT -> Gate -> PC
+
+        global_extents may be a single (start, end) pair or a list of them, in which case only
+        the data within each of the extents is returned
+        """
+        self.set(target, global_index, value)
+        extents = self._extents_list(global_extents)
+        self.get(target, extents[0])
+        for extent in extents[1:]:
+            self.inspect(target, extent)
+
+    def _extents_list(self, global_extents):
+        """Returns the extents provided, a (start, end) pair or a list of them, as a list"""
+        if global_extents and isinstance(global_extents[0], (tuple, list)):
+            return list(global_extents)
+        return [global_extents]
+
+    def compile_stream(self, steps):
+        """
+        Returns the steps of a stream prepared for this kind of adapter, which stream accepts in
+        place of the steps and which may be kept to stream the same values again
+        """
+        return [list(step) for step in steps]
+
+    def stream(self, steps, callback = None):
+        """
+        Sets a precomputed sequence of SCR values, calling back after every step, and returns
+        the list of callback results. Each step is a list of (target, value) pairs where value
+        holds every bit of the target's SCR. callback is called with the index of the step.
+            PC -> Gate -> DUT, callback, PC -> Gate -> DUT, callback, ...
+        """
+        results = []
+        for index, step in enumerate(steps):
+            for target, value in step:
+                self.set(target, 0, value)
+            results.append(callback(index) if callback != None else None)
+        return results
  
 
 
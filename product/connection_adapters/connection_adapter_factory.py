@@ -2,53 +2,261 @@
 
 """
 ConnectionAdapterFactory
+
+    Adapters are registered by type along with the module that implements them, and
+    a module is only imported once its adapter type is requested or probed, so that
+    pyserial and pyparallel are not loaded by PCs which never use them.
+
+    Detection probes every registered adapter type concurrently, waits no longer
+    than detection_timeout seconds for them, and returns the first adapter type in
+    priority order which was found. Probe results are cached per process for
+    detection_ttl seconds, so that reconnecting does not reopen the hardware.
+
+    Only adapter types registered as accepting a port are given the port of a
+    request; the others are probed and created as if no port had been provided.
+
+    Example
+        ConnectionAdapterFactory.register('visa fpga', 'lab.visa_fpga_adapter', 'VisaFPGAAdapter', 0, accepts_port = True)
+        adapter = ConnectionAdapterFactory.request()          # Detect
+        adapter = ConnectionAdapterFactory.request('serial fpga', port = 1)
+        ConnectionAdapterFactory.timings                      # {'serial fpga':1.002, 'mock':0.0, ...}
 """
 
-from product.connection_adapters.fpga_serial_adapter import *
-from product.connection_adapters.fpga_parallel_adapter import *
-from product.connection_adapters.usb_adapter import *
-from product.connection_adapters.mock_adapter import *
+import sys
+import threading
+import time
+
+from common.base import *
+
+# Adapter types in detection priority order as (type, module, class name, accepts port)
+ADAPTER_TYPES = [
+    ('parallel fpga', 'product.connection_adapters.fpga_parallel_adapter', 'FPGAParallelAdapter', True),
+    ('serial fpga',   'product.connection_adapters.fpga_serial_adapter',   'FPGASerialAdapter',   True),
+    ('usb',           'product.connection_adapters.usb_adapter',           'USBAdapter',          False),
+    ('mock',          'product.connection_adapters.mock_adapter',          'MockAdapter',         False)
+    ]
 
 class ConnectionAdapterFactory(object):
     """
-    Factory class which returns an instance of a connection adapter. The factory class 
+    Factory class which returns an instance of a connection adapter. The factory class
     method request can detect available adapters or return an explicitly requested adapter type.
     """
 
+    # Seconds a probe result is trusted for
+    detection_ttl = 60.0
+
+    # Seconds to wait for the probes of a detection
+    detection_timeout = 2.0
+
+    # Seconds the most recent probe of each adapter type took
+    timings = {}
+
+    _registry = list(ADAPTER_TYPES)
+    _classes  = {}
+    _detected = {}
+    _errors   = {}
+    _lock     = threading.Lock()
+
     def __init__(self):
         raise Exception('Factory classes cannot be instantiated')
 
+
+    # Adapter Registry -----------------------------
+
+
+    @staticmethod
+    def register(type, module, class_name, priority = None, accepts_port = False):
+        """
+        Registers the adapter class named in the module provided under the adapter type.
+        Priority is the adapter's position in the detection order, defaulting to last.
+        accepts_port : Whether the class's detect and constructor take the port of a request
+        """
+        type = type.lower()
+        ConnectionAdapterFactory.unregister(type)
+        entry = (type, module, class_name, accepts_port)
+        if priority == None:
+            ConnectionAdapterFactory._registry.append(entry)
+        else:
+            ConnectionAdapterFactory._registry.insert(priority, entry)
+
+    @staticmethod
+    def unregister(type):
+        """Removes the adapter type from the registry"""
+        type = type.lower()
+        ConnectionAdapterFactory._registry = [e for e in ConnectionAdapterFactory._registry if e[0] != type]
+        ConnectionAdapterFactory._classes.pop(type, None)
+        ConnectionAdapterFactory.clear_cache(type)
+
     @staticmethod
-    def request(type = None):
-        """Sniffs out connection and returns an instance of the bridge for the protocol in use"""
+    def types():
+        """Returns the registered adapter types in detection priority order"""
+        return [e[0] for e in ConnectionAdapterFactory._registry]
+
+    @staticmethod
+    def adapter_class(type):
+        """Imports the module of the adapter type if necessary and returns its adapter class"""
+        type = type.lower()
+        if not type in ConnectionAdapterFactory._classes:
+            entries = [e for e in ConnectionAdapterFactory._registry if e[0] == type]
+            if not entries:
+                raise LookupError('Unrecognized adapter type %s.' % type)
+            type, module, class_name, accepts_port = entries[0]
+            ConnectionAdapterFactory._classes[type] = getattr(__import__(module, fromlist = [class_name]), class_name)
+        return ConnectionAdapterFactory._classes[type]
+
+    @staticmethod
+    def accepts_port(type):
+        """Returns whether the adapter type is given the port of a request"""
+        type = type.lower()
+        entries = [e for e in ConnectionAdapterFactory._registry if e[0] == type]
+        if not entries:
+            raise LookupError('Unrecognized adapter type %s.' % type)
+        return entries[0][3]
+
+    @staticmethod
+    def _port(type, port):
+        """Returns the port to give the adapter type, None for unrecognized types and types which do not accept one"""
+        entries = [e for e in ConnectionAdapterFactory._registry if e[0] == type.lower()]
+        return port if entries and entries[0][3] else None
+
+
+    # Detection -----------------------------
+
+
+    @staticmethod
+    def detect(type, port = None):
+        """Returns whether or not the adapter type is available, probing the hardware if the cached result has expired"""
+        return ConnectionAdapterFactory.detect_all([type], port)[type.lower()]
+
+    @staticmethod
+    def detect_all(types = None, port = None):
+        """
+        Probes the adapter types provided, or every registered type, concurrently and returns
+        a dictionary of type:available pairs. Probes still running after detection_timeout
+        seconds are reported as unavailable and their results are not cached. Errors other
+        than the hardware not being found, such as a detect method with the wrong signature,
+        are raised.
+        """
+        if types == None:
+            types = ConnectionAdapterFactory.types()
+        types = [t.lower() for t in types]
+        ports = dict([(t, ConnectionAdapterFactory._port(t, port)) for t in types])
+        results = {}
+        probes  = []
+        now = time.time()
+        ConnectionAdapterFactory._lock.acquire()
+        try:
+            for type in types:
+                cached = ConnectionAdapterFactory._detected.get((type, ports[type]))
+                if cached != None and now - cached[1] < ConnectionAdapterFactory.detection_ttl:
+                    results[type] = cached[0]
+        finally:
+            ConnectionAdapterFactory._lock.release()
+
+        # Probe the remaining types on their own threads
+        for type in types:
+            if not type in results:
+                probe = threading.Thread(target = ConnectionAdapterFactory._probe, args = (type, ports[type]), name = 'probe %s' % type)
+                probe.setDaemon(True)
+                probe.start()
+                probes.append((type, probe))
+        deadline = now + ConnectionAdapterFactory.detection_timeout
+        for type, probe in probes:
+            probe.join(max(0, deadline - time.time()))
+
+        ConnectionAdapterFactory._lock.acquire()
+        try:
+            errors = []
+            for type, probe in probes:
+                cached = ConnectionAdapterFactory._detected.get((type, ports[type]))
+                error  = ConnectionAdapterFactory._errors.pop((type, ports[type]), None)
+                if error != None:
+                    errors.append(error)
+                elif probe.isAlive() or cached == None:
+                    logging.getLogger('root').warning('Detection of the %s adapter timed out after %s s' % (type, ConnectionAdapterFactory.detection_timeout))
+                    results[type] = False
+                else:
+                    results[type] = cached[0]
+        finally:
+            ConnectionAdapterFactory._lock.release()
+        if errors:
+            raise errors[0][0], errors[0][1], errors[0][2]
+        return results
+
+    @staticmethod
+    def _probe(type, port):
+        """
+        Runs the detect method of the adapter type and caches the result. A module which
+        cannot be imported, or a detect which fails, means the adapter is unavailable, while
+        a TypeError is kept to be raised by detect_all.
+        """
+        start = time.time()
+        try:
+            adapter_class = ConnectionAdapterFactory.adapter_class(type)
+            found = adapter_class.detect(port) if port != None else adapter_class.detect()
+        except TypeError:
+            ConnectionAdapterFactory._lock.acquire()
+            try:
+                ConnectionAdapterFactory._errors[(type, port)] = sys.exc_info()
+            finally:
+                ConnectionAdapterFactory._lock.release()
+            return
+        except Exception:
+            found = False
+        finished = time.time()
+        ConnectionAdapterFactory._lock.acquire()
+        try:
+            ConnectionAdapterFactory.timings[type] = finished - start
+            ConnectionAdapterFactory._detected[(type, port)] = (bool(found), finished)
+        finally:
+            ConnectionAdapterFactory._lock.release()
+
+    @staticmethod
+    def clear_cache(type = None):
+        """Forgets the cached probe results of the adapter type, or of every type if None"""
+        ConnectionAdapterFactory._lock.acquire()
+        try:
+            for key in ConnectionAdapterFactory._detected.keys():
+                if type == None or key[0] == type.lower():
+                    del ConnectionAdapterFactory._detected[key]
+        finally:
+            ConnectionAdapterFactory._lock.release()
+
+
+    # Adapter Requests -----------------------------
+
+
+    @staticmethod
+    def request(type = None, port = None):
+        """
+        Sniffs out connection and returns an instance of the bridge for the protocol in use.
+        port : Optional address of the serial or parallel port the FPGA board is attached to,
+               ignored by adapter types which do not accept a port
+        """
         if type == None:
             # Try to detect
-            if (FPGAParallelAdapter.detect()):
-                return FPGAParallelAdapter()
-            elif (FPGASerialAdapter.detect()):
-                return FPGASerialAdapter()
-            elif (USBAdapter.detect()):
-                return USBAdapter()
-            elif MockAdapter.detect():
-                return MockAdapter()
-            else:
-                raise LookupError('Could not detect a PC to Device adapter protocol.')
+            found = ConnectionAdapterFactory.detect_all(None, port)
+            for type in ConnectionAdapterFactory.types():
+                if found.get(type):
+                    return ConnectionAdapterFactory._create(type, port)
+            raise LookupError('Could not detect a PC to Device adapter protocol.')
         else:
             # Try to load the request connection
             type = type.lower()
-            if type == 'mock' and MockAdapter.detect():
-                return MockAdapter()
-            elif type == 'parallel fpga' and FPGAParallelAdapter.detect():
-                return FPGAParallelAdapter()
-            elif type == 'serial fpga' and FPGASerialAdapter.detect():
-                return FPGASerialAdapter()
-            elif type == 'usb' and USBAdapter.detect():
-                return USBAdapter()
+            if type in ConnectionAdapterFactory.types() and ConnectionAdapterFactory.detect(type, port):
+                return ConnectionAdapterFactory._create(type, port)
             else:
                 raise LookupError('Could not detect a %s adapter protocol.' % type)
 
+    @staticmethod
+    def _create(type, port):
+        """Returns a new adapter of the type provided"""
+        adapter_class = ConnectionAdapterFactory.adapter_class(type)
+        port = ConnectionAdapterFactory._port(type, port)
+        return adapter_class(port) if port != None else adapter_class()
+
 
 if __name__=='__main__' :
     #f = ConnectionAdapterFactory.request()
     #print f.type
-    pass
\ No newline at end of file
+    pass
@@ -1,35 +1,36 @@
 #!/usr/bin/env python
 
+import atexit
+
 from common.base import *
 
-from product.connection_adapters.abstract_adapter import AbstractAdapter
-
-# FPGA Serial Interface Register Offset Addresses
-FPGA_ID    = 0x00 # Offset 0 : Contains two 4 bit fields. The upper identifies the device, the lower contains the revision level
-GL_CSR     = 0x02 # Offset 2 : Global control and status register. Setting bit 0 to 1 aborts any pending FPGA operation and resets the FPGA 
-CFG        = 0x03 # Offset 3 : Bit 0 of CFG is the Serial Interface Bus Enable bit which controls activation of the the SCR
-CLK_SL     = 0x09 # Offset 9 : Clock Select - Sets the clock source on the SCR target specified
-SI_CSR     = 0x30 # Offset 48 : Accepts OpCodes to trigger FPGA actions
-SI_MCTL    = 0x31 # Offset 49 : Manual mode register that accepts bit banging to create SCR clock
-SI_CFG_0   = 0x32 # Offset 50 : Bit indexes 4-5 select clock frequency for the SI for top? Indexes 6-7 for bottom?
-SI_CFG_1   = 0x33 # Offset 51 : Accepts reset and SCR mode bit controls
-SI_ADDR_0  = 0x34 # Offset 52 : Holds bits 0-7 of the address used to access SI_RAM_0 or SI_RAM_1 
-SI_ADDR_1  = 0x35 # Offset 53 : Holds bit 8 of the address used to access SI_RAM_0 or SI_RAM_1  
-SI_DATA    = 0x36 # Offset 54 : Holds the lower byte of the data being read or written to SI_RAM_0 or SI_RAM_1
-SI_CNT_0   = 0x37 # Offset 55 : Holds lower 8 bits of count specifying number of bits to be R/W
-SI_CNT_1   = 0x38 # Offset 56 : Holds upper 4 bits of count specifying number of bits to be R/W
-
-# Sub-Offset Addresses
-SI_CSR_ERR = 0x01 # bit 0 from Offset 48 : FPGA sets to 1 when OpCode was invalid
-SI_CSR_ST  = 0x02 # bit 1 from Offset 48 : User sets to 1 when submitting an OpCode 
-
-# Opcode values for SI_CSR bit indexes 4-7 (Entire byte should be 0100 + opcode)
-OPCODE_READ_SERDES    = 0x10 # 0001 Read SerDes SCR into RAM_1
-OPCODE_WRITE_SERDES   = 0x20 # 0010 Write RAM_0 to SerDes SCR
-OPCODE_READ_SI_RAM0   = 0x40 # 0100 Read SI_RAM_0 and increment Address
-OPCODE_WRITE_SI_RAM0  = 0x50 # 0101 Write SI_RAM_0 and increment Address
-OPCODE_READ_SI_RAM1   = 0x60 # 0110 Read SI_RAM_1 and increment Address
-OPCODE_WRITE_SI_RAM1  = 0x70 # 0111 Write SI_RAM_1 and increment Address
+from product.connection_adapters.abstract_adapter import AbstractAdapter, SerialControlRegisterSession
+from io_ports.io_port_abstract import TRANSFER_READ, TRANSFER_WRITE, TRANSFER_READ_BLOCK, TRANSFER_WRITE_BLOCK
+from io_ports.fpga_registers import *
+
+# Control registers which only change when written by the PC, and so can be shadowed
+SHADOWED_REGISTERS = [CFG, CLK_SL, SI_CFG_0, SI_CFG_1, SI_CNT_0, SI_CNT_1]
+
+# Adapter whose session state is saved when Python exits, by state file
+_STATE_SAVERS = {}
+
+def _save_states():
+    """Saves the session state of the adapter last connected through every state file"""
+    for adapter in _STATE_SAVERS.values():
+        try:
+            adapter.save_state()
+        except Exception, e:
+            logging.getLogger('root').exception(e)
+
+atexit.register(_save_states)
+
+class StreamPlan(list):
+    """
+    The RAM_0 writes of every step of a stream, see FPGAAdapter.compile_stream, as a list of
+    steps where each step is a list of (target, value, bytes, [(start byte, bytes), ...])
+    """
+    pass
+
 
 class FPGAAdapter(AbstractAdapter):
     """
@@ -41,13 +42,28 @@ class FPGAAdapter(AbstractAdapter):
     entity_name = 'fpga_adapter'
     entity_atts = []
 
-    def __init__(self):
+    # Clock source applied to every target at connect, None leaves the clocks untouched
+    clock_source = None
+
+    # Number of times SI_CSR is read after a SERDES opcode within a batch, giving the shift time to finish
+    serdes_settle_reads = 1
+
+    # Whether or not SI_RAM_0 keeps its contents across SERDES commits and target switches,
+    # which lets stream() send only the bytes that differ from the previous step
+    retains_input_ram = True
+
+    def __init__(self, state_dir = None):
+        """
+        state_dir : Optional directory in which the session state is persisted so that 
+                    a later connect to the same board can resume it (see save_state)
+        """
         # Prepare Parent
         super(FPGAAdapter, self).__init__()
 
         # Set abstract properties
         self._type = 'FPGA'
         self._port = None
+        self._address = None
         
         # Which SCR was targeted last
         self._cur_target    = None
@@ -55,10 +71,148 @@ class FPGAAdapter(AbstractAdapter):
         self._input_buffer  = None
         self._output_buffer = None
         
-        # Which RAM address did I talk to last
-        self._cur_byte_index_target = 0
+        # Which RAM address did I talk to last, None until it is known
+        self._cur_byte_index_target = None
         self._byte_counts = {}
 
+        # Number of writes made to SI_RAM_0, so that stream() can tell when RAM_0 was written behind its back
+        self._input_ram_writes = 0
+
+        # Configuration of each target and the last known value of the control registers
+        self._target_configs = {}
+        self._register_shadow = {}
+
+        # Session persistence
+        self.state_dir = state_dir
+        self._fpga_id = None
+
+
+    # Session Persistence --------------------------
+
+
+    @property
+    def address(self):
+        """Returns the address of the port the board is attached to, or None if it is not known"""
+        return self._address
+
+    @property
+    def state_file(self):
+        """
+        Returns the path of the state file for the connected board, named after the port address
+        and the board ID, or None if state is not persisted
+        """
+        if self.state_dir == None or self._fpga_id == None:
+            return None
+        if self._address == None:
+            name = '%s_%02x.yaml' % (self.entity_name, self._fpga_id)
+        else:
+            name = '%s_%s_%02x.yaml' % (self.entity_name, re.sub('[^0-9A-Za-z]+', '_', str(self._address)).strip('_'), self._fpga_id)
+        return os.path.join(self.state_dir, name)
+
+    def _persist(self):
+        """
+        Reads the board ID and arranges for the session state to be saved when Python exits.
+        Only the adapter connected last through a state file saves it.
+        """
+        if self.state_dir != None:
+            self._fpga_id = self._port.read(FPGA_ID)
+            _STATE_SAVERS[self.state_file] = self
+
+    def disconnect(self):
+        """
+        Drops the sessions, so that the next connect initializes or resumes the board, after saving
+        the session state unless another adapter has since connected through the same state file
+        """
+        if _STATE_SAVERS.get(self.state_file) is self:
+            self.save_state()
+            del _STATE_SAVERS[self.state_file]
+        self._connected    = False
+        self._scr_sessions = {}
+        self._cur_target   = None
+        self._cur_byte_index_target = None
+
+    def save_state(self):
+        """
+        Writes the sent value of every SCR session, the control register shadow and the 
+        target RAM_0 was last written for to the state file of the board
+        """
+        if not self._connected or self.state_file == None or not os.path.isdir(self.state_dir):
+            return
+        state = {
+            'fpga_id'    : self._fpga_id,
+            'cur_target' : self._cur_target,
+            'shadow'     : dict(self._register_shadow),
+            'sessions'   : {}
+            }
+        for label, session in self._scr_sessions.items():
+            sent = ''.join(session.sent) if session.sent[0] != None else None
+            state['sessions'][label] = {'default':''.join(session.default), 'sent':sent}
+        f = open(self.state_file, 'w')
+        try:
+            f.write(yaml.safe_dump(state, default_flow_style = False))
+        finally:
+            f.close()
+
+    def _load_state(self):
+        """Returns the saved state of the board, or None if there isn't one"""
+        if self.state_file == None or not os.path.isfile(self.state_file):
+            return None
+        f = open(self.state_file)
+        try:
+            return yaml.safe_load(f.read())
+        except yaml.YAMLError, e:
+            self.log.warn('Ignoring unreadable state file %s: %s' % (self.state_file, e))
+            return None
+        finally:
+            f.close()
+
+    def _resume(self, package):
+        """
+        Resumes the saved session of the board instead of initializing the FPGA. The session is 
+        only resumed when the package matches the saved SCRs, the shadowed control registers still
+        hold their saved values and RAM_0 still holds the value last sent to the saved target.
+        Returns True if the session was resumed.
+        """
+        self._persist()
+        state = self._load_state()
+        if state == None or state.get('fpga_id') != self._fpga_id:
+            return False
+
+        # The package must be the one which was saved
+        sessions = state['sessions']
+        if sorted(sessions.keys()) != sorted([scr.label for scr in package]):
+            return False
+        for scr in package:
+            if sessions[scr.label]['default'] != scr.default:
+                return False
+
+        # The control registers must not have been reset
+        for reg_index, byte in state['shadow'].items():
+            if self._port.read(reg_index) != byte:
+                return False
+
+        # RAM_0 must still hold what was last sent
+        target = state['cur_target']
+        if target == None or sessions[target]['sent'] == None:
+            return False
+        sent = list(sessions[target]['sent'])
+        byte_count = self._num_bytes(len(sent))
+        if self._read_ram(OPCODE_READ_SI_RAM0, 0, byte_count) != [self._bits_to_byte(sent, i) for i in range(byte_count)]:
+            return False
+
+        # Resume
+        self._register_shadow = dict(state['shadow'])
+        for scr in package:
+            session = SerialControlRegisterSession(scr)
+            if sessions[scr.label]['sent'] != None:
+                session.sent = list(sessions[scr.label]['sent'])
+            self._scr_sessions[scr.label] = session
+        self._configure_targets(package)
+        self._cur_target    = target
+        self._input_buffer  = sent
+        self._output_buffer = list(self._scr_sessions[target].default)
+        return True
+
 
     # FPGA Management --------------------------
   
@@ -67,10 +221,51 @@ class FPGAAdapter(AbstractAdapter):
         """
         Clear any protocol or internal gate errors and prepares the gate for a command
         """
-        self._update_register(2, 'xxxxxxx1')
+        self._update_register(GL_CSR, 'xxxxxxx1')
+        # The reset may have changed the control registers, so forget what they held
+        self._register_shadow = {}
+        self._cur_byte_index_target = None
+
+    def _configure_targets(self, package):
+        """
+        Builds the configuration of every SCR in the package and applies the clock source of each
+        
+            scr_length   : Number of bits shifted by the SERDES opcodes (SI_CNT_0, SI_CNT_1)
+            byte_count   : Number of RAM bytes which hold the SCR
+            clock_source : Clock source of the target (CLK_SL), see set_clock_source
+            clock_field  : CLK_SL bitmask of the target's clock source, see TARGET_CLOCK_FIELDS
+            fields       : Control register bitmasks which route the serial interface to the target
+            output_bytes : RAM_1 bytes which hold at least one output register bit
+            readback     : RAM_1 bytes retrieved on target switches and output only refreshes
+
+        Targets which are not listed in TARGET_FIELDS are reached without changing the routing,
+        and those not listed in TARGET_CLOCK_FIELDS keep their clock source.
+        """
+        for scr in package:
+            output_bytes = sorted(set([i / 8 for i, direction in enumerate(scr.io_map) if direction == 'O']))
+            self._target_configs[scr.label] = {
+                'scr_length'   : scr.width,
+                'byte_count'   : self._num_bytes(scr.width),
+                'clock_source' : self.clock_source,
+                'clock_field'  : TARGET_CLOCK_FIELDS.get(scr.label),
+                'fields'       : TARGET_FIELDS.get(scr.label, []),
+                'output_bytes' : output_bytes,
+                'readback'     : output_bytes
+                }
+            self._byte_counts[scr.label] = self._target_configs[scr.label]['byte_count']
+            if self.clock_source != None and self._target_configs[scr.label]['clock_field'] != None:
+                self.set_clock_source(scr.label, self.clock_source)
+
+    def _apply_target_configuration(self, target):
+        """
+        Routes the serial interface to the target. Only the control register fields 
+        which differ from the current configuration are written.
+        """
+        config = self._target_configs[target]
+        for reg_index, bitmask in config['fields']:
+            self._update_register(reg_index, bitmask)
+        self._set_scr_length(config['scr_length'])
 
-    # TODO: What about when orientation SCRS are different lengths? They aren't in this part, 
-    # but in order to make the Adapter API uniform we have to make the SCR length setup internal to the Adapter
     def _set_scr_length(self, bit_count):
         """
         SI_CNT_0 = 0x37 # Offset 55 : Holds LOWER 8 bits of count specifying number of bits to be R/W
@@ -109,24 +304,23 @@ class FPGAAdapter(AbstractAdapter):
             #self.log.debug('Same target as last, no updates performed.')
             pass
         else:
-            # New target, so update the local buffers
+            # New target, so route the serial interface to it
             #self.log.debug('Switching targets and updating buffers.')
-            # FIXME: These are part sensative. NEED TO CHANGE
-            if target == 'top':
-                self._top_scr_on()
-                self._manual_top()
-            elif target == 'bottom':
-                self._bot_scr_on()
-                self._manual_bot()
+            self._apply_target_configuration(target)
                        
             # Update current target
             self._cur_target = target
 
+            # Size the local buffers to the target
+            session = self._scr_sessions[target]
+            self._input_buffer  = list(session.sent) if session.sent[0] != None else list(session.default)
+            self._output_buffer = list(session.default)
+
             # Update the adapter buffers
             self._populate_output_buffer()
 
-            # Update the local buffer so that it reflects the current target's state
-            self._read_output_buffer()
+            # Update the local buffer so that it reflects the target's outputs
+            self._read_output_bytes(self._target_configs[target]['readback'])
             
 
     # Global Package API Hooks --------------------------------
@@ -242,17 +436,43 @@ class FPGAAdapter(AbstractAdapter):
     # Output Management
 
 
-    def refresh(self, target):
+    def refresh(self, target, output_only = False, force = False):
         """
         Populates the gate's output buffer with data from the device        
             Gate Output <- DUT
+
+        output_only = True : Also retrieves only the RAM_1 bytes of the readback interest,
+        by default the bytes which hold output registers
+            PC <- Gate Output <- DUT
+
+        force = True : Captures the SCR even if the readback cache holds a fresh capture
         """
         #self.log.debug('Gate.refresh %s' % target)
+        if self._read_from_capture(target, self._target_configs[target]['readback'] if output_only else [], force):
+            return
         # Get the data no matter what
         if self._cur_target == target:
             self._populate_output_buffer()
+            if output_only:
+                self._read_output_bytes(self._target_configs[target]['readback'])
         else:
+            # Switching targets retrieves the readback interest
             self._set_target(target)
+
+    def set_readback_interest(self, target, global_extents = None):
+        """
+        Sets the list of extents whose RAM_1 bytes are retrieved by refresh(output_only = True) 
+        and target switches. None restores the bytes which hold output registers.
+        """
+        config = self._target_configs[target]
+        if global_extents == None:
+            config['readback'] = config['output_bytes']
+        else:
+            byte_indexes = set()
+            for s,e in global_extents:
+                start_byte, end_byte = divmod(s, 8)[0], self._num_bytes(e)
+                byte_indexes.update(range(start_byte, end_byte))
+            config['readback'] = sorted(byte_indexes)
     
     def inspect(self, target, global_extents):
         """
@@ -261,25 +481,239 @@ class FPGAAdapter(AbstractAdapter):
         """
         #self.log.debug('Gate.inspect %s' % target)
         s,e = global_extents        
-        if self._cur_target == target:
-            self._read_output_buffer(s, e)
-        else:
-            self._set_target(target)
+        start_byte, end_byte = self._byte_range(s, e)
+        if self._read_from_capture(target, range(start_byte, end_byte), count = False):
+            return
+        self._set_target(target)
+        self._read_output_buffer(s, e)
 
         
-    def get(self, target, global_extents):
+    def get(self, target, global_extents, force = False):
         """
         Immediately returns the data at the index specified from the device (equivalent to a refresh + inspect)
             PC <- Gate <- DUT
         """    
-        # Get the data no matter what
         s,e = global_extents
+        start_byte, end_byte = self._byte_range(s, e)
+        if self._read_from_capture(target, range(start_byte, end_byte), force):
+            return
+        # Get the data no matter what
         #self.log.debug('Gate.get %s (%s - %s)' % (target, s, e))   
         if self._cur_target == target:
             self._populate_output_buffer()
-            self._read_output_buffer(s, e)
         else:
             self._set_target(target)
+        self._read_output_buffer(s, e)
+
+
+    # Combined Input / Output Management
+
+
+    def exchange(self, target, global_index, value, global_extents):
+        """
+        Immediately sets the data at the index specified in the device and then returns the 
+        data within the extents specified from the device (equivalent to a set + get)
+            PC -> Gate -> DUT -> Gate -> PC
+
+        The RAM_0 write, the SERDES commit, the SERDES capture and a RAM_1 read of only the 
+        runs of bytes covering the extents, which may be a list of extents, are sent to the
+        port as a single pipelined batch. The status of every opcode is read back within the
+        batch (see serdes_settle_reads), and if the FPGA was still busy the exchange is
+        repeated one step at a time.
+        """
+        # Set the target
+        self._set_target(target)
+        # Begin with last sent values or the defaults if the buffer has never been commited
+        if self._scr_sessions[target].sent[0] != None:
+            send = list(self._scr_sessions[target].sent)
+        else:
+            send = list(self._scr_sessions[target].default)
+        # Add in the set value
+        data_width = len(value)
+        send[global_index : global_index + data_width] = value
+
+        byte_indexes = set()
+        for s,e in self._extents_list(global_extents):
+            start_byte, end_byte = self._byte_range(s, e)
+            byte_indexes.update(range(start_byte, end_byte))
+        byte_runs = self._byte_runs(sorted(byte_indexes))
+        byte_count = self._byte_counts[target]
+        batch = []
+
+        # Write RAM_0
+        updated_byte_indexs = self._modified_byte_indexes(self._input_buffer, send)
+        for run_start, run_end in self._byte_runs(updated_byte_indexs):
+            data = [self._bits_to_byte(send, byte_index) for byte_index in range(run_start, run_end)]
+            self._batch_byte_index_target(batch, run_start)
+            batch.append((TRANSFER_WRITE_BLOCK, SI_DATA, data, (SI_CSR, OPCODE_WRITE_SI_RAM0 | SI_CSR_ST | SI_CSR_ERR)))
+            self._cur_byte_index_target += len(data)
+            self._input_ram_writes += 1
+        # Commit RAM_0 to the SCR and capture the SCR into RAM_1
+        for opcode in [OPCODE_WRITE_SERDES, OPCODE_READ_SERDES]:
+            self._batch_byte_index_target(batch, 0)
+            batch.append((TRANSFER_WRITE, SI_CSR, opcode | SI_CSR_ST | SI_CSR_ERR))
+            batch.extend([(TRANSFER_READ, SI_CSR)] * self.serdes_settle_reads)
+            self._cur_byte_index_target += byte_count
+        # Read only the runs of RAM_1 bytes which cover the extents
+        for start_byte, end_byte in byte_runs:
+            self._batch_byte_index_target(batch, start_byte)
+            batch.append((TRANSFER_READ_BLOCK, SI_DATA, end_byte - start_byte, (SI_CSR, OPCODE_READ_SI_RAM1 | SI_CSR_ST | SI_CSR_ERR)))
+            self._cur_byte_index_target += end_byte - start_byte
+        batch.append((TRANSFER_READ, SI_CSR))
+
+        self._forget_capture(target)
+        try:
+            results = self._port.transfer(batch)
+        except:
+            # The FPGA address is unknown
+            self._cur_byte_index_target = None
+            raise
+        # The last status read after each opcode must show it completed without error
+        settle = self.serdes_settle_reads
+        statuses = [results[settle-1], results[2*settle-1], results[-1]]
+        blocks = results[2*settle:-1]
+        if [status for status in statuses if status & (SI_CSR_ST | SI_CSR_ERR)]:
+            self.log.warn('FPGA busy during exchange on %s, repeating it one step at a time' % target)
+            self._wait_for_opcode()
+            self._cur_byte_index_target = None
+            AbstractAdapter.exchange(self, target, global_index, value, global_extents)
+            return
+
+        # Update the buffers and the session
+        self._input_buffer = send
+        self._scr_sessions[target].sent = send[:]
+        retrieved = self._scr_sessions[target].retrieved
+        for (start_byte, end_byte), data in zip(byte_runs, blocks):
+            for byte_index, byte in enumerate(data):
+                bs,be = self._byte_bit_extents(start_byte + byte_index)
+                self._output_buffer[bs:be] = self._byte_to_bits(byte, be-bs)
+                retrieved[bs:be] = self._output_buffer[bs:be]
+        self._record_capture(target)
+        self._note_retrieved(target, sorted(byte_indexes))
+
+    def _read_from_capture(self, target, byte_indexes, force = False, count = True):
+        """
+        Serves a read of the bytes provided from the readback cache, reading any of them not yet
+        retrieved from RAM_1 when it still holds the target's capture. Returns False if the
+        SCR must be captured.
+        """
+        if force or self._readback_window == None:
+            return False
+        captured = self._capture(target)
+        if captured != None:
+            missing = [byte_index for byte_index in byte_indexes if byte_index not in captured]
+            if not missing or self._cur_target == target:
+                self.readback_hits += 1
+                if missing:
+                    self._read_output_bytes(missing)
+                return True
+        if count:
+            self.readback_misses += 1
+        return False
+
+    def compile_stream(self, steps):
+        """
+        Works out the RAM_0 writes of every step of a stream before any are sent and returns them
+        as a StreamPlan, which stream accepts in place of the steps. RAM_0 is shared by the
+        targets, so each value is compared with the bytes the previous value left in RAM_0 and
+        only the runs of bytes which differ are kept (see retains_input_ram). The first value is
+        written in full. A plan only depends on the values, so it can be kept and streamed to
+        any FPGA adapter.
+        """
+        plan = StreamPlan()
+        ram = None
+        for step in steps:
+            writes = []
+            for target, value in step:
+                value = list(value)
+                data = [self._bits_to_byte(value, byte_index) for byte_index in range(self._num_bytes(len(value)))]
+                if ram == None or not self.retains_input_ram:
+                    changed = range(len(data))
+                    ram = []
+                else:
+                    changed = [i for i, byte in enumerate(data) if i >= len(ram) or ram[i] != byte]
+                ram[:len(data)] = data
+                writes.append((target, value, data, [(s, data[s:e]) for s,e in self._byte_runs(changed)]))
+            plan.append(writes)
+        return plan
+
+    def stream(self, steps, callback = None):
+        """
+        Sets a precomputed sequence of SCR values, calling back after every step, see AbstractAdapter
+
+        Only the RAM_0 bytes which change from one value to the next are written, see
+        compile_stream. Any value following a callback which wrote RAM_0 itself is written in
+        full. Without a callback, the RAM_0 writes and SERDES commit of every value are sent
+        to the port as a single pipelined batch, see _stream_batched.
+        """
+        plan = steps if isinstance(steps, StreamPlan) else self.compile_stream(steps)
+        if callback == None:
+            self._stream_batched([write for writes in plan for write in writes])
+            return [None for writes in plan]
+
+        results = []
+        expected_writes = None
+        for index, writes in enumerate(plan):
+            for target, value, data, runs in writes:
+                expected_writes = self._stream_write(target, value, data, runs, expected_writes)
+            results.append(callback(index))
+        return results
+
+    def _stream_write(self, target, value, data, runs, expected_writes):
+        """Writes one value of a stream and commits it, returning the RAM_0 write count to expect next"""
+        self._set_target(target)
+        if self._input_ram_writes != expected_writes:
+            runs = [(0, data)]
+        for start_byte, run in runs:
+            self._write_ram(OPCODE_WRITE_SI_RAM0, start_byte, run)
+        self._input_buffer = value
+        self._commit_input_buffer()
+        return self._input_ram_writes
+
+    def _stream_batched(self, writes):
+        """
+        Sends the writes of a stream, [(target, value, data, runs), ...], as one batch per write
+        holding its RAM_0 writes, its SERDES commit and the status reads which follow it. A batch
+        ends at its commit so that the next write's RAM_0 bytes are only sent once the commit
+        has been seen to finish, as RAM_0 is shifted while the commit is busy. If the status
+        shows the FPGA still busy it is polled until the commit finishes, and if it shows an
+        error the write is repeated one step at a time.
+        """
+        expected_writes = None
+        settle = self.serdes_settle_reads
+        for target, value, data, runs in writes:
+            self._set_target(target)
+            if self._input_ram_writes != expected_writes:
+                runs = [(0, data)]
+            batch = []
+            for start_byte, run in runs:
+                self._batch_byte_index_target(batch, start_byte)
+                batch.append((TRANSFER_WRITE_BLOCK, SI_DATA, run, (SI_CSR, OPCODE_WRITE_SI_RAM0 | SI_CSR_ST | SI_CSR_ERR)))
+                self._cur_byte_index_target += len(run)
+                self._input_ram_writes += 1
+            self._batch_byte_index_target(batch, 0)
+            batch.append((TRANSFER_WRITE, SI_CSR, OPCODE_WRITE_SERDES | SI_CSR_ST | SI_CSR_ERR))
+            batch.extend([(TRANSFER_READ, SI_CSR)] * settle)
+            self._cur_byte_index_target += self._byte_counts[target]
+
+            self._forget_capture(target)
+            try:
+                status = self._port.transfer(batch)[-1]
+            except:
+                # The FPGA address is unknown
+                self._cur_byte_index_target = None
+                raise
+            if status & SI_CSR_ERR:
+                self.log.warn('FPGA error during stream on %s, repeating the write one step at a time' % target)
+                self._wait_for_opcode()
+                self._cur_byte_index_target = None
+                expected_writes = self._stream_write(target, value, data, runs, None)
+                continue
+            if status & SI_CSR_ST:
+                self._wait_for_opcode()
+            self._input_buffer = value
+            self._scr_sessions[target].sent = value[:]
+            expected_writes = self._input_ram_writes
 
 
     # Non-Register API Hooks --------------------------------
@@ -289,15 +723,11 @@ class FPGAAdapter(AbstractAdapter):
         """
         Sets the clock source on the SCR target specified:
         
-        target : top or bottom
+        target : Label of a target the FPGA recognizes, see TARGET_CLOCK_FIELDS
         source :    sma      = Take clock source from SMA connector
                     internal = Take clock source from internal clock
                     stop     = No clock source
         """
-        targets = {
-            'top'    : "xxxxBBxx",
-            'bottom' : "xxxxxxBB"
-            }        
         source_bits = {
             'sma'      : '11',
             'internal' : '01',
@@ -310,11 +740,17 @@ class FPGAAdapter(AbstractAdapter):
             raise ValueError('Could not set clock, an unrecognized clock source was specified: %s' % source)
         
         target = target.lower()
-        if target not in targets.keys():
+        if target in self._target_configs:
+            clock_field = self._target_configs[target]['clock_field']
+        else:
+            clock_field = TARGET_CLOCK_FIELDS.get(target)
+        if clock_field == None:
             raise ValueError('Could not set clock, an unrecognized target was specified: %s' % target)
         
-        mask = targets[target].replace('BB', source_bits[source])
+        mask = clock_field.replace('BB', source_bits[source])
         self._update_register(CLK_SL, mask)
+        if target in self._target_configs:
+            self._target_configs[target]['clock_source'] = source
        
 
     # Serial Interface Configuration Zero (SI_CFG_0) : 50    
@@ -351,22 +787,6 @@ class FPGAAdapter(AbstractAdapter):
     def _scr_disable(self):
         self._update_register(CFG, "xxxxxxx0")
 
-    def _manual_top(self):
-        self._update_register(SI_CFG_0, "1xxxxxxx")
-        
-    def _manual_bot(self):
-        self._update_register(SI_CFG_0, "0xxxxxxx")
-        
-    def _top_scr_on(self):
-        self._update_register(SI_CFG_1, "x1xxxxxx")
-    def _top_scr_off(self):
-        self._update_register(SI_CFG_1, "x0xxxxxx")
-
-    def _bot_scr_on(self):
-        self._update_register(SI_CFG_1, "xxxxx1xx")
-    def _bot_scr_off(self):
-        self._update_register(SI_CFG_1, "xxxxx0xx")
-
 
     # Unique to Serial Board
     def _scr_si_cfg_1_reset(self):
@@ -396,6 +816,16 @@ class FPGAAdapter(AbstractAdapter):
             self._cur_byte_index_target = byte_index
 
 
+    def _batch_byte_index_target(self, batch, byte_index):
+        """
+        Appends the writes which set the FPGA RAM address to byte_index to the batch, see _set_byte_index_target
+        """
+        if self._cur_byte_index_target != byte_index:
+            batch.append((TRANSFER_WRITE, SI_ADDR_0, byte_index & 0xff))
+            batch.append((TRANSFER_WRITE, SI_ADDR_1, (byte_index >> 8) & 0xff))
+            self._cur_byte_index_target = byte_index
+
+
     # FPGA OpCode Transmission and Error Handling --------------------------
 
 
@@ -431,28 +861,80 @@ class FPGAAdapter(AbstractAdapter):
                
         self._port.write(SI_CSR, (opcode | SI_CSR_ST | SI_CSR_ERR))
         # Make sure an error isn't thrown
+        self._wait_for_opcode()
+        
+        # Update the _cur_byte_index_target by one to adjust for the FPGAs auto incrementer
+        if opcode == OPCODE_READ_SERDES or opcode == OPCODE_WRITE_SERDES:
+            self._cur_byte_index_target += self._byte_counts[self._cur_target]
+        else:
+            self._cur_byte_index_target += 1
+
+    def _wait_for_opcode(self):
+        """
+        Polls SI_CSR until the FPGA clears the SI_CSR_ST bit of the last opcode submitted
+        """
         timeOut = 0
         while self._port.read(SI_CSR) & SI_CSR_ST:
             timeOut += 1
             if timeOut == 200 :
                 self.log.error("ERROR::SI_ST bit in SI_CSR not set to zero")
                 sys.exit(0)
+
+
+    # RAM Block Transfers
+
+    def _write_ram(self, opcode, start_byte, data):
+        """
+        Streams the bytes in data into SI_RAM_0 or SI_RAM_1 beginning at start_byte. 
         
-        # Update the _cur_byte_index_target by one to adjust for the FPGAs auto incrementer
-        if opcode == OPCODE_READ_SERDES or opcode == OPCODE_WRITE_SERDES:
-            self._cur_byte_index_target += self._byte_counts[self._cur_target]
-        else:
-            self._cur_byte_index_target += 1
+        Each byte is written to SI_DATA and clocked into RAM by the opcode, which 
+        auto-increments the address. The RAM opcodes complete within a single FPGA 
+        clock, long before the port can deliver the next byte, so SI_CSR is only polled 
+        once after the whole block has been sent. The poll only reports the last opcode, 
+        so a board whose RAM opcodes took longer would lose bytes without SI_CSR_ERR 
+        being seen, and would need every byte polled.
+        """
+        if not data:
+            return
+        self._set_byte_index_target(start_byte)
+        self._port.write_block(SI_DATA, data, (SI_CSR, opcode | SI_CSR_ST | SI_CSR_ERR))
+        self._cur_byte_index_target += len(data)
+        if opcode == OPCODE_WRITE_SI_RAM0:
+            self._input_ram_writes += 1
+        self._wait_for_opcode()
+
+    def _read_ram(self, opcode, start_byte, count):
+        """
+        Streams count bytes out of SI_RAM_0 or SI_RAM_1 beginning at start_byte. 
+        
+        Each opcode moves the byte at the current address into SI_DATA and 
+        auto-increments the address. See _write_ram for the SI_CSR polling.
+        """
+        if count <= 0:
+            return []
+        self._set_byte_index_target(start_byte)
+        data = self._port.read_block(SI_DATA, count, (SI_CSR, opcode | SI_CSR_ST | SI_CSR_ERR))
+        self._cur_byte_index_target += count
+        self._wait_for_opcode()
+        return data
 
     # Byte manipulation helpers
     
     def _update_register(self, reg_index, bitmask):
         """
         Updates the bit sequence of the register specified by first retrieving 
-        it's current value, and then flipping the bits identified in the bit mask
+        it's current value, and then flipping the bits identified in the bit mask.
+        Shadowed control registers are only read once and only written when they change.
         """
-        byte = self._port.read(reg_index)
-        byte = self._mask_byte(byte, bitmask)
+        if reg_index in self._register_shadow:
+            current = self._register_shadow[reg_index]
+        else:
+            current = self._port.read(reg_index)
+        byte = self._mask_byte(current, bitmask)
+        if reg_index in SHADOWED_REGISTERS:
+            if reg_index in self._register_shadow and byte == current:
+                return
+            self._register_shadow[reg_index] = byte
         self._port.write(reg_index, byte)
 
     def _mask_byte(self, byte, bitmask):
@@ -475,61 +957,22 @@ class FPGAAdapter(AbstractAdapter):
         """
         Retrieve data from FPGA input buffer (RAM_0)
         """
-        byte_count = self._byte_counts[self._cur_target]
-        if start_bit_index==0 and end_bit_index == None:
-            # Loop over all bytes requested
-            start_byte = 0
-            end_byte   = byte_count
-        else:
-            # Loop over the bytes requested
-            start_byte, remainder = divmod(start_bit_index, 8)
-            end_byte, remainder   = divmod(end_bit_index, 8)
-            if remainder > 0:
-                end_byte += 1
-               
-        for byte_index in range(start_byte, end_byte):
-            # Move the collection window to the byte index
-            self._set_byte_index_target(byte_index)
-            # Populate the SI_DATA register with the byte at the byte_index in the input buffer
-            self._send_opcode(OPCODE_READ_SI_RAM0)
-            # Get the byte from the I/O
-            byte = self._port.read(SI_DATA)
-            # Make sure we end early on the last byte            
-            s = byte_index * 8
-            if byte_index < byte_count-1:
-                e = s + 8                
-            else:
-                e = len(self._scr_sessions[self._cur_target].default)                
-            # Transform the integer to a binary sequence
-            bit_string = int_to_bin(byte, 8)
-            # Reverse the bit string so that Pythons byte casting will work
-            bit_string = bit_string[::-1][0:e-s]
+        start_byte, end_byte = self._byte_range(start_bit_index, end_bit_index)
+        data = self._read_ram(OPCODE_READ_SI_RAM0, start_byte, end_byte - start_byte)
+        for byte_index, byte in enumerate(data):
+            s,e = self._byte_bit_extents(start_byte + byte_index)
             # Populate the input buffer
-            self._input_buffer[s:e] = list(bit_string)
-        
-            #self.log.debug('RI: %s (%s..%s) = %s = %s' % (byte_index, s, e, ''.join(bit_string), byte))
+            self._input_buffer[s:e] = self._byte_to_bits(byte, e-s)
+            #self.log.debug('RI: %s (%s..%s) = %s' % (start_byte + byte_index, s, e, byte))
            
     def _read_input_buffer_byte(self, byte_index):
         """
         Retrieve a single byte from the FPGAs input buffer (RAM_0)
         """
-        # Move the collection window to the byte index
-        self._set_byte_index_target(byte_index)
-        # Populate the SI_DATA register with the byte at the byte_index in the input buffer
-        self._send_opcode(OPCODE_READ_SI_RAM0)
-        # Get the byte from the I/O
-        byte = self._port.read(SI_DATA)
-        # Make sure we end early on the last byte
-        s = byte_index * 8
-        if byte_index < self._byte_counts[self._cur_target]-1:
-            e = s + 8
-        else:
-            e = len(self._scr_sessions[self._cur_target].default)
-        # Transform the integer to a binary sequence
-        bit_string = int_to_bin(byte, 8)
-        # Reverse the bit string so that Pythons byte casting will work
-        bit_string = bit_string[::-1][0:e-s]
-        # Populate the output buffer
+        byte = self._read_ram(OPCODE_READ_SI_RAM0, byte_index, 1)[0]
+        s,e = self._byte_bit_extents(byte_index)
+        bit_string = ''.join(self._byte_to_bits(byte, e-s))
+        # Populate the input buffer
         self._input_buffer[s:e] = list(bit_string)
         return bit_string
 
@@ -539,30 +982,11 @@ class FPGAAdapter(AbstractAdapter):
         Send an array of bits from the PC to FPGA input buffer (RAM_0)
         """
         # Only update what needs to change
-        bit_array_length = len(bit_array)   
         updated_byte_indexs = self._modified_byte_indexes(self._input_buffer, bit_array)       
-        for byte_index in updated_byte_indexs:
-            # Make sure we end early on the last byte
-            s = byte_index * 8
-            if s+8 < bit_array_length:
-                e = s + 8
-                bits = bit_array[s:e]
-            else:
-                e = bit_array_length
-                bits = bit_array[s:e] + (['0'] * (8-(e-s)))
-            # Reverse the bit string so that Pythons byte casting will work
-            bits = bits[::-1]
-            # Transform the bit array to an integer
-            byte = bin_to_int(bits)
-            
-            #self.log.debug('WI: %s (%s..%s) = %s = %s' % (byte_index, s, e, ''.join(bits), byte))
-
-            # Move the target window to the byte index
-            self._set_byte_index_target(byte_index)
-            # Send the byte across the I/O
-            self._port.write(SI_DATA, byte)
-            # Write the the byte to the input buffer at the byte_index
-            self._send_opcode(OPCODE_WRITE_SI_RAM0)
+        for start_byte, end_byte in self._byte_runs(updated_byte_indexs):
+            data = [self._bits_to_byte(bit_array, byte_index) for byte_index in range(start_byte, end_byte)]
+            #self.log.debug('WI: %s..%s = %s' % (start_byte, end_byte, data))
+            self._write_ram(OPCODE_WRITE_SI_RAM0, start_byte, data)
 
         # Update the output buffer
         self._input_buffer = bit_array[:]
@@ -573,6 +997,7 @@ class FPGAAdapter(AbstractAdapter):
         """
         self._send_opcode(OPCODE_WRITE_SERDES)
         self._scr_sessions[self._cur_target].sent = self._input_buffer[:]
+        self._forget_capture(self._cur_target)
 
 
     # Output Buffer Read / Write / Populate
@@ -583,72 +1008,41 @@ class FPGAAdapter(AbstractAdapter):
         Triggers a retrieval of the SerDes SCR into the FPGA's output buffer (RAM_1)
         """
         self._send_opcode(OPCODE_READ_SERDES)
+        self._record_capture(self._cur_target)
 
 
     def _read_output_buffer(self, start_bit_index=0, end_bit_index = None):
         """
         Retrieves every byte from the FPGA's output buffer (RAM_1)
         """
-        byte_count = self._byte_counts[self._cur_target]
-        if start_bit_index==0 and end_bit_index == None:
-            # Loop over all bytes requested
-            start_byte = 0
-            end_byte   = byte_count
-        else:
-            # Loop over the bytes requested
-            start_byte, remainder = divmod(start_bit_index, 8)
-            end_byte, remainder   = divmod(end_bit_index, 8)
-            if remainder > 0:
-                end_byte += 1
-
-        for byte_index in range(start_byte, end_byte):
-            # Move the collection window to the byte index
-            self._set_byte_index_target(byte_index)
-            # Populate the SI_DATA register with the byte at the byte_index in the input buffer
-            self._send_opcode(OPCODE_READ_SI_RAM1)
-            # Get the byte from the I/O
-            byte = self._port.read(SI_DATA)
-            # Make sure we end early on the last byte            
-            s = byte_index * 8
-            if byte_index < byte_count-1:
-                e = s + 8
-            else:
-                e = len(self._scr_sessions[self._cur_target].default)  
-
-            # Transform the integer to a binary sequence
-            bit_string = int_to_bin(byte, 8)                     
-            # Reverse the bit string so that Pythons byte casting will work
-            bit_string = bit_string[::-1][0:e-s]
-
-            #self.log.debug('RO: %s (%s..%s) = %s = %s' % (byte_index, s, e, bit_string, byte))
-            
+        start_byte, end_byte = self._byte_range(start_bit_index, end_bit_index)
+        data = self._read_ram(OPCODE_READ_SI_RAM1, start_byte, end_byte - start_byte)
+        self._note_retrieved(self._cur_target, range(start_byte, end_byte))
+        retrieved = self._scr_sessions[self._cur_target].retrieved
+        for byte_index, byte in enumerate(data):
+            s,e = self._byte_bit_extents(start_byte + byte_index)
+            #self.log.debug('RO: %s (%s..%s) = %s' % (start_byte + byte_index, s, e, byte))
             # Populate the output buffer
-            self._output_buffer[s:e] = list(bit_string)
+            self._output_buffer[s:e] = self._byte_to_bits(byte, e-s)
+            # Update the session to reflect the retrieved data
+            retrieved[s:e] = self._output_buffer[s:e]
 
-        # Update the session to reflect the retrieved data
-        self._scr_sessions[self._cur_target].retrieved = self._output_buffer[:]
+    def _read_output_bytes(self, byte_indexes):
+        """
+        Retrieves only the bytes identified from the FPGA's output buffer (RAM_1)
+        """
+        for start_byte, end_byte in self._byte_runs(byte_indexes):
+            self._read_output_buffer(start_byte * 8, min(end_byte * 8, len(self._output_buffer)))
 
 
     def _read_output_buffer_byte(self, byte_index):
         """
         Retrieve a single byte from the FPGAs output buffer (RAM_1)
         """
-        # Move the collection window to the byte index
-        self._set_byte_index_target(byte_index)
-        # Populate the SI_DATA register with the byte at the byte_index in the input buffer
-        self._send_opcode(OPCODE_READ_SI_RAM1)
-        # Get the byte from the I/O
-        byte = self._port.read(SI_DATA)
-        # Make sure we end early on the last byte
-        s = byte_index * 8
-        if byte_index < self._byte_counts[self._cur_target]-1:
-            e = s + 8
-        else:
-            e = len(self._scr_sessions[self._cur_target].default)
-        # Transform the integer to a binary sequence
-        bit_string = int_to_bin(byte, 8)
-        # Reverse the bit string so that Pythons byte casting will work
-        bit_string = bit_string[::-1][0:e-s]
+        byte = self._read_ram(OPCODE_READ_SI_RAM1, byte_index, 1)[0]
+        self._note_retrieved(self._cur_target, [byte_index])
+        s,e = self._byte_bit_extents(byte_index)
+        bit_string = ''.join(self._byte_to_bits(byte, e-s))
         # Populate the output buffer
         self._output_buffer[s:e] = list(bit_string)
         # Update the session to reflect the retrieved data
@@ -660,30 +1054,69 @@ class FPGAAdapter(AbstractAdapter):
         """
         Send an array of bits from PC to FPGA output buffer (RAM_1)
         """
-        # Loop over every byte
         byte_count = self._num_bytes(len(bit_array))
-        bit_array_length = len(bit_array)
-        for byte_index in range(byte_count):
-            # Make sure we end early on the last byte            
-            s = byte_index * 8
-            if s+8 < bit_array_length:
-                e = s + 8
-                bits = bit_array[s:e]
-            else:
-                e = bit_array_length
-                bits = bit_array[s:e] + (['0'] * (8-(e-s)))
-            # Clip the bits and reverse the bit string so that Pythons byte casting will work
-            bits = bits[s:e][::-1]
-            # Transform the bit array to an integer
-            byte = bin_to_int(bits)
-            # Move the collection window to the byte index
-            self._set_byte_index_target(byte_index)
-            # Send the byte across the I/O
-            self._port.write(SI_DATA, byte)        
-            # Submit all of the writes
-            self._send_opcode(OPCODE_WRITE_SI_RAM1)
-            
+        data = [self._bits_to_byte(bit_array, byte_index) for byte_index in range(byte_count)]
+        self._write_ram(OPCODE_WRITE_SI_RAM1, 0, data)
         self._output_buffer = bit_array
+        self._forget_capture(self._cur_target)
+
+
+    # Byte / Bit Translation Helpers
+
+    def _byte_range(self, start_bit_index=0, end_bit_index = None):
+        """
+        Returns the (start_byte, end_byte) range that covers the bit indexes provided, 
+        or every byte of the current target if no end is provided
+        """
+        if start_bit_index==0 and end_bit_index == None:
+            # Loop over all bytes requested
+            return (0, self._byte_counts[self._cur_target])
+        # Loop over the bytes requested
+        start_byte, remainder = divmod(start_bit_index, 8)
+        end_byte, remainder   = divmod(end_bit_index, 8)
+        if remainder > 0:
+            end_byte += 1
+        return (start_byte, end_byte)
+
+    def _byte_bit_extents(self, byte_index):
+        """
+        Returns the bit extents covered by the byte index, ending early on the last byte
+        """
+        s = byte_index * 8
+        if byte_index < self._byte_counts[self._cur_target]-1:
+            e = s + 8
+        else:
+            e = len(self._scr_sessions[self._cur_target].default)
+        return (s, e)
+
+    def _byte_to_bits(self, byte, bit_count = 8):
+        """
+        Transforms a byte into a list of bit_count bits. The bit string is 
+        reversed so that Pythons byte casting will work
+        """
+        return list(int_to_bin(byte, 8)[::-1][0:bit_count])
+
+    def _bits_to_byte(self, bit_array, byte_index):
+        """
+        Transforms the 8 bits at byte_index into an integer, padding the last byte with zeros
+        """
+        s = byte_index * 8
+        bits = list(bit_array[s:s+8])
+        bits = bits + (['0'] * (8-len(bits)))
+        # Reverse the bit string so that Pythons byte casting will work
+        return bin_to_int(bits[::-1])
+
+    def _byte_runs(self, byte_indexes):
+        """
+        Groups a sorted collection of byte indexes into contiguous (start_byte, end_byte) runs
+        """
+        runs = []
+        for byte_index in byte_indexes:
+            if runs and runs[-1][1] == byte_index:
+                runs[-1][1] = byte_index + 1
+            else:
+                runs.append([byte_index, byte_index + 1])
+        return [tuple(run) for run in runs]
 
 
     # Buffer Efficiency Helpers -------------------------------------------
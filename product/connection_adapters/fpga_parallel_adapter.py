@@ -16,26 +16,35 @@ class FPGAParallelAdapter(FPGAAdapter):
     entity_name = 'fpga_parallel_adapter'
     entity_atts = []
 
-    def __init__(self):
+    # Clock source applied to every target at connect
+    clock_source = 'sma'
+
+    def __init__(self, port = None, state_dir = None):
+        """
+        port      : Register socket used to reach the FPGA, or the address of the port a new
+                    ParallelSocket is opened on. Defaults to the first port.
+        state_dir : Optional directory in which the session state is persisted (see FPGAAdapter)
+        """
         # Prepare Parent
-        super(FPGAParallelAdapter, self).__init__()
+        super(FPGAParallelAdapter, self).__init__(state_dir)
         
         # Set abstract properties
         self._type = 'Parallel FPGA'
-        self._port = ParallelSocket()
+        self._port = port if isinstance(port, AbstractSocket) else ParallelSocket(port)
+        self._address = getattr(port, 'address', None) if isinstance(port, AbstractSocket) else port
         
 
     # Connection Management --------------------------
 
 
     @staticmethod
-    def detect():
+    def detect(port = None):
         """Trys to connect to the Parallel FPGA and returns True or False if it is able to connect."""
-        if not ParallelSocket.detect():
+        if not ParallelSocket.detect(port):
             return False
         else:
             try:
-                p = ParallelSocket()
+                p = ParallelSocket(port)
                 d = p.read(0)
             except:
                 return False
@@ -62,16 +71,15 @@ class FPGAParallelAdapter(FPGAAdapter):
             pass
         else:
             #self.log.info('CONNECTING via %s' % self._type)
+
+            # Resume the saved session if the board still holds it
+            if self._resume(package):
+                self._connected = True
+                return
                       
             # Clear any errors
             self._clear_errors()
             
-            # Initialize the buffers
-            scr_length = package[0].width
-            self._set_scr_length(scr_length)
-            self._input_buffer  = list(package[0].value)
-            self._output_buffer = list(package[0].value)
-            
             # Connect the FPGA to the SCR
             self._scr_enable()
     
@@ -87,13 +95,10 @@ class FPGAParallelAdapter(FPGAAdapter):
     
                 # Create a virtual SCR session to manage state
                 self._scr_sessions[scr.label] = SerialControlRegisterSession(scr)
-                
-                # Calculate and save the number of bytes it will take to represent this scr 
-                self._byte_counts[scr.label]  = self._num_bytes(scr.width)
-                
-                # Set target specific defaults
-                self.set_clock_source(scr.label, 'sma')
                        
+            # Build the configuration of every target
+            self._configure_targets(package)
+
             # Set connection state
             self._connected = True
             
@@ -16,23 +16,29 @@ class FPGASerialAdapter(FPGAAdapter):
     entity_name = 'fpga_serial_adapter'
     entity_atts = []
 
-    def __init__(self):
+    def __init__(self, port = None, state_dir = None):
+        """
+        port      : Register socket used to reach the FPGA, or the address of the port a new
+                    SerialSocket is opened on. Defaults to the first port.
+        state_dir : Optional directory in which the session state is persisted (see FPGAAdapter)
+        """
         # Prepare Parent
-        super(FPGASerialAdapter, self).__init__()
+        super(FPGASerialAdapter, self).__init__(state_dir)
 
         # Set abstract properties
         self._type = 'Serial FPGA'
-        self._port = SerialSocket()
+        self._port = port if isinstance(port, AbstractSocket) else SerialSocket(port)
+        self._address = getattr(port, 'address', None) if isinstance(port, AbstractSocket) else port
 
 
     # Connection Management --------------------------
 
 
     @staticmethod
-    def detect():
+    def detect(port = None):
         """Trys to connect to the Serial FPGA and returns True or False if it is able to connect."""
         try:
-            s = SerialSocket()
+            s = SerialSocket(port)
             d = s.read(0)
         except:
             return False
@@ -59,15 +65,14 @@ class FPGASerialAdapter(FPGAAdapter):
             pass
         else:
             #self.log.info('CONNECTING via %s' % self._type)
+
+            # Resume the saved session if the board still holds it
+            if self._resume(package):
+                self._connected = True
+                return
                       
             # Clear any errors
             self._clear_errors()
-            
-            # Initialize the buffers
-            scr_length = package[0].width
-            self._set_scr_length(scr_length)
-            self._input_buffer  = list(package[0].value)
-            self._output_buffer = list(package[0].value)
 
             # Set global defaults
             self.set_scr_clock_divider('slow')
@@ -86,14 +91,10 @@ class FPGASerialAdapter(FPGAAdapter):
     
                 # Create a virtual SCR session to manage state
                 self._scr_sessions[scr.label] = SerialControlRegisterSession(scr)
-                
-                # Calculate and save the number of bytes it will take to represent this scr 
-                self._byte_counts[scr.label]  = self._num_bytes(scr.width)
-                
-                # FIXME: This is target specific - NEEDS TO BE CHANGED
-                # Set target specific defaults
-                #self.set_clock_source(scr.label, 'sma')
                        
+            # Build the configuration of every target
+            self._configure_targets(package)
+
             # Set connection state
             self._connected = True
             
@@ -2,25 +2,98 @@
 
 """
 Mock adapter to use when testing package connectivity methods without a bench
+
+    A CostModel can be given to the mock to estimate how long the same procedure
+    would take on a bench. Every buffer operation of the mock is charged the port 
+    calls, register transactions, wire bytes and SERDES opcodes that the FPGA adapter
+    issues for it, and the cost is accumulated on a virtual clock.
+
+    Example
+        dut.connect(MockAdapter(CostModel.serial()))
+        run_procedure(dut)
+        dut.connection.estimate()    # {'seconds':4.2, 'calls':1210, 'transactions':8830, ...}
 """
 
+import time
+
 from product.connection_adapters.abstract_adapter import *
 
 VALID_TARGETS = ['top', 'bottom']
 
+# Register transactions the FPGA adapter issues to switch targets (SI_CFG_0, SI_CFG_1, SI_CNT_0, SI_CNT_1)
+SWITCH_TRANSACTIONS = 4
+
+# Register transactions to point the RAM address at a byte (SI_ADDR_0, SI_ADDR_1)
+ADDRESS_TRANSACTIONS = 2
+
+class CostModel(object):
+    """
+    Bench cost of the port traffic of the FPGA adapters, in seconds:
+        call_latency     : Fixed cost of every port call, such as a USB serial round trip
+        transaction_time : Cost of every register read or write, such as the parallel bus cycles
+        byte_time        : Cost of every byte on the wire, such as a serial character
+        opcode_time      : Time the FPGA takes to complete a SERDES opcode
+        write_bytes      : Wire bytes of a register write
+        read_bytes       : Wire bytes of a register read, request and response
+    """
+
+    def __init__(self, call_latency = 0.0, transaction_time = 0.0, byte_time = 0.0, opcode_time = 0.0, write_bytes = 0, read_bytes = 0):
+        self.call_latency     = call_latency
+        self.transaction_time = transaction_time
+        self.byte_time        = byte_time
+        self.opcode_time      = opcode_time
+        self.write_bytes      = write_bytes
+        self.read_bytes       = read_bytes
+
+    @classmethod
+    def serial(cls, baudrate = 19200, call_latency = 0.001, opcode_time = 0.0005):
+        """Cost of the serial FPGA board, 11 bit characters (start, 8 data, odd parity, stop) at the baud rate provided"""
+        return cls(call_latency = call_latency, byte_time = 11.0 / baudrate, opcode_time = opcode_time, write_bytes = 3, read_bytes = 3)
+
+    @classmethod
+    def parallel(cls, transaction_time = 0.00001, opcode_time = 0.0005):
+        """Cost of the parallel FPGA board, a handful of LPT bus cycles per register access"""
+        return cls(transaction_time = transaction_time, opcode_time = opcode_time)
+
+    @classmethod
+    def from_yaml(cls, filepath):
+        """Loads a bench profile measured with the port recorder, for example: {call_latency: 0.0012, byte_time: 0.00058}"""
+        f = open(filepath)
+        try:
+            return cls(**yaml.safe_load(f))
+        finally:
+            f.close()
+
+    def cost(self, calls = 0, writes = 0, reads = 0, opcodes = 0):
+        """Returns the seconds the port traffic provided takes"""
+        return (calls * self.call_latency
+                + (writes + reads) * self.transaction_time
+                + (writes * self.write_bytes + reads * self.read_bytes) * self.byte_time
+                + opcodes * self.opcode_time)
+
+
 class MockAdapter(AbstractAdapter):
     """Mock ConnectionAdapter class exposes an I/O API which will be uniform across all connection adapters"""
  
     entity_name = 'mock_adapter'
     entity_atts = []
 
-    def __init__(self):
+    def __init__(self, cost_model = None, realtime = False):
+        """
+        cost_model : Optional CostModel the port traffic is charged to the virtual clock with
+        realtime   : Whether or not to also sleep for the cost of every operation
+        """
         # Prepare Parent
         super(MockAdapter, self).__init__()
         
         # Set abstract properties
         self._type      = 'Mock'
 
+        # Virtual bench clock
+        self.cost_model = cost_model
+        self.realtime   = realtime
+        self.reset_clock()
+
         # Which SCR was targeted last
         self._cur_target    = None
         
@@ -177,6 +250,7 @@ class MockAdapter(AbstractAdapter):
             # New target, so update the local buffers
             #self.log.debug('Switching targets and updating buffers.')
 
+            self._charge(calls = SWITCH_TRANSACTIONS, writes = SWITCH_TRANSACTIONS)
             if target == 'top':
                 # ... manipulate adapter registers here ...
                 pass
@@ -184,6 +258,11 @@ class MockAdapter(AbstractAdapter):
                 # ... manipulate adapter registers here ...
                 pass
 
+            # Size the adapter buffers for the target
+            if len(self._input_buffer) != self._scr_sessions[target].scr.width:
+                self._input_buffer  = list(self._scr_sessions[target].value)
+                self._output_buffer = list(self._scr_sessions[target].value)
+
             # Swap current physical buffers
             if self._cur_target != None:
                 self.fake_physical_scrs[self._cur_target] = self.fake_device_state[:]
@@ -202,6 +281,34 @@ class MockAdapter(AbstractAdapter):
             self._write_input_buffer(self._scr_sessions[self._cur_target].value)
 
 
+    # Virtual Bench Clock --------------------------------
+
+
+    def reset_clock(self):
+        """Zeros the virtual clock and the port traffic counters"""
+        self.clock = 0.0
+        self.counters = {'calls':0, 'writes':0, 'reads':0, 'opcodes':0}
+
+    def _charge(self, calls = 0, writes = 0, reads = 0, opcodes = 0):
+        """Counts the port traffic of an operation and advances the virtual clock by its cost"""
+        self.counters['calls']   += calls
+        self.counters['writes']  += writes
+        self.counters['reads']   += reads
+        self.counters['opcodes'] += opcodes
+        if self.cost_model != None:
+            cost = self.cost_model.cost(calls, writes, reads, opcodes)
+            self.clock += cost
+            if self.realtime:
+                time.sleep(cost)
+
+    def estimate(self):
+        """Returns the estimated bench seconds and the port traffic since the clock was reset"""
+        results = dict(self.counters)
+        results['transactions'] = self.counters['writes'] + self.counters['reads']
+        results['seconds'] = self.clock
+        return results
+
+
     # Mock Protocol I/O Methods --------------------------------
 
    
@@ -343,15 +450,21 @@ class MockAdapter(AbstractAdapter):
     # Output Management
 
 
-    def refresh(self, target):
+    def refresh(self, target, output_only = False, force = False):
         """
         Populates the gate's output buffer with data from the device        
             Gate Output <- DUT
+
+        output_only = True : Also retrieves the whole output buffer, the Mock has no byte cost
+
+        The Mock keeps no readback cache, so every refresh is forced
         """
         #self.log.debug('Gate.refresh %s' % target)
         # Get the data no matter what
         if self._cur_target == target:
             self._populate_output_buffer()
+            if output_only:
+                self._read_output_buffer()
         else:
             self._set_target(target)
     
@@ -368,7 +481,7 @@ class MockAdapter(AbstractAdapter):
             self._set_target(target)
 
         
-    def get(self, target, global_extents):
+    def get(self, target, global_extents, force = False):
         """
         Immediately returns the data at the index specified from the device (equivalent to a refresh + inspect)
             PC <- Gate <- DUT
@@ -447,6 +560,9 @@ class MockAdapter(AbstractAdapter):
             
             # Fake sending the writes
             self.fake_buffers[self._cur_target]['input'][byte_index] = byte
+
+        # Address and a data plus opcode write for every byte in one block
+        self._charge(calls = 2, writes = ADDRESS_TRANSACTIONS + 2 * len(updated_byte_indexs))
             
         # Update the output buffer
         self._input_buffer = bit_array
@@ -460,6 +576,8 @@ class MockAdapter(AbstractAdapter):
         # Fake sending the data to the device
         # ... manipulate adapter registers here ...
         self.fake_device_state = self.fake_buffers[self._cur_target]['input'][:]
+        # Opcode write and the status read
+        self._charge(calls = 2, writes = 1, reads = 1, opcodes = 1)
         # Save in local buffer
         self._scr_sessions[self._cur_target].sent = self._input_buffer[:]
     
@@ -474,6 +592,8 @@ class MockAdapter(AbstractAdapter):
         # Fake getting the data from the device
         # ... manipulate adapter registers here ...
         self.fake_buffers[self._cur_target]['output'] = self.fake_device_state[:]
+        # Opcode write and the status read
+        self._charge(calls = 2, writes = 1, reads = 1, opcodes = 1)
 
 
     def _read_output_buffer(self, start_bit_index=0, end_bit_index = None):
@@ -512,6 +632,9 @@ class MockAdapter(AbstractAdapter):
             
             # Populate the output buffer
             self._output_buffer[s:e] = list(bit_string)
+
+        # Address and an opcode write plus data read for every byte in one block
+        self._charge(calls = 2, writes = ADDRESS_TRANSACTIONS + end_byte - start_byte, reads = end_byte - start_byte)
             
         # Update the session to reflect the retrieved data
         self._scr_sessions[self._cur_target].retrieved = self._output_buffer[:]
@@ -523,6 +646,7 @@ class MockAdapter(AbstractAdapter):
         """
         # Fake getting the bytes from the I/O
         byte = self.fake_buffers[self._cur_target]['output'][byte_index]
+        self._charge(calls = 2, writes = ADDRESS_TRANSACTIONS + 1, reads = 1)
 
         # Make sure we end early on the last byte
         s = byte_index * 8
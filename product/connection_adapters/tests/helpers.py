@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+"""
+Connection Adapter Test Helpers
+"""
+
+import time
+
+from product.register import *
+from product.package import *
+from product.connection_adapters.mock_adapter import MockAdapter
+
+def mixed_width_package():
+    """Returns a package whose top and bottom SCRs have different widths"""
+    common_block_registers = [
+        Register('VCO_CAL', 'I', '0', '1', '3', '101'),
+        Register('LOCK', 'O', '4', '4', '1', '0')
+        ]
+    lane_registers = [
+        Register('BIST_MODE', 'I', '0', '1', '4', '0001'),
+        Register('TX_AMP', 'I', '5', '6', '5', '01010'),
+        Register('STATUS', 'O', '11', '11', '3', '000')
+        ]
+    return Package({}, common_block_registers, lane_registers, {'top':'0123X', 'bottom':'X01'})
+
+
+class ProbedAdapter(MockAdapter):
+    """Mock adapter whose detect takes probe_time seconds and counts the probes"""
+
+    probe_time = 0
+    probes = 0
+
+    @classmethod
+    def detect(cls):
+        cls.probes += 1
+        time.sleep(cls.probe_time)
+        return True
+
+class SlowAdapter(ProbedAdapter):
+    """Mock adapter whose detect takes a noticeable time"""
+    probe_time = 0.3
+
+class HungAdapter(ProbedAdapter):
+    """Mock adapter whose detect outlasts any reasonable deadline"""
+    probe_time = 3
@@ -7,11 +7,26 @@ Tests ConnectionAdapterFactory
 from common.tests.pyunit_helpers import *
 from unittest import TestCase, main
 
+import time
+
 from product.connection_adapters.connection_adapter_factory import *
+from product.connection_adapters.tests.helpers import ProbedAdapter, SlowAdapter, HungAdapter
+
+HELPERS = 'product.connection_adapters.tests.helpers'
 
 class ConnectionAdapterFactoryTests(TestCase):
     """Tests of the ConnectionAdapterFactory."""
 
+    def setUp(self):
+        self.ttl, self.timeout = ConnectionAdapterFactory.detection_ttl, ConnectionAdapterFactory.detection_timeout
+        ProbedAdapter.probes = 0
+        ConnectionAdapterFactory.register('probed', HELPERS, 'ProbedAdapter', 0)
+
+    def tearDown(self):
+        ConnectionAdapterFactory.detection_ttl, ConnectionAdapterFactory.detection_timeout = self.ttl, self.timeout
+        for type in ['probed', 'slow', 'slower', 'hung']:
+            ConnectionAdapterFactory.unregister(type)
+
     def test_ensure_acts_as_factory(self):
         """Try to create a factory class instance"""
         #f = ConnectionAdapterFactory()
@@ -29,6 +44,50 @@ class ConnectionAdapterFactoryTests(TestCase):
         else:
             print 'Mocking'
 
+    def test_registry(self):
+        """Adapter types are registered in priority order and imported on request"""
+        self.assertEqual(ConnectionAdapterFactory.types()[0], 'probed')
+        self.assertTrue('mock' in ConnectionAdapterFactory.types())
+        self.assertTrue(ConnectionAdapterFactory.adapter_class('probed') is ProbedAdapter)
+        self.assertRaises(LookupError, ConnectionAdapterFactory.adapter_class, 'missing')
+        self.assertTrue(isinstance(ConnectionAdapterFactory.request(), ProbedAdapter))
+
+    def test_detection_cache(self):
+        """Probe results are reused until they expire"""
+        self.assertTrue(ConnectionAdapterFactory.detect('probed'))
+        self.assertTrue(ConnectionAdapterFactory.detect('probed'))
+        self.assertEqual(ProbedAdapter.probes, 1)
+        self.assertTrue('probed' in ConnectionAdapterFactory.timings)
+        ConnectionAdapterFactory.detection_ttl = 0
+        ConnectionAdapterFactory.detect('probed')
+        self.assertEqual(ProbedAdapter.probes, 2)
+
+    def test_ports(self):
+        """A port is only given to the adapter types which accept one"""
+        adapter = ConnectionAdapterFactory.request('mock', 1)
+        self.assertEqual(adapter.type, 'Mock')
+        self.assertEqual(adapter.cost_model, None)
+        self.assertTrue(isinstance(ConnectionAdapterFactory.request(None, 1), ProbedAdapter))
+        self.assertEqual(ConnectionAdapterFactory.accepts_port('serial fpga'), True)
+        self.assertEqual(ConnectionAdapterFactory.accepts_port('mock'), False)
+
+    def test_detect_signature(self):
+        """A detect method which does not take the port of an adapter type accepting one raises"""
+        ConnectionAdapterFactory.register('slow', HELPERS, 'ProbedAdapter', accepts_port = True)
+        self.assertRaises(TypeError, ConnectionAdapterFactory.detect, 'slow', 1)
+        self.assertEqual(ConnectionAdapterFactory.detect('slow'), True)
+
+    def test_concurrent_probes(self):
+        """Probes run concurrently and are bounded by the detection timeout"""
+        ConnectionAdapterFactory.register('slow', HELPERS, 'SlowAdapter')
+        ConnectionAdapterFactory.register('slower', HELPERS, 'SlowAdapter')
+        ConnectionAdapterFactory.register('hung', HELPERS, 'HungAdapter')
+        ConnectionAdapterFactory.detection_timeout = 1.0
+        start = time.time()
+        found = ConnectionAdapterFactory.detect_all(['slow', 'slower', 'hung'])
+        self.assertTrue(time.time() - start < 1.5)
+        self.assertEqual(found, {'slow':True, 'slower':True, 'hung':False})
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
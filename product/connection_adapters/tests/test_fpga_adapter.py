@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+
+"""
+Tests FPGAAdapter via a simulated FPGA
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+import shutil
+import tempfile
+import time
+
+from product.register import *
+from product.package import *
+from product.connection_adapters.fpga_serial_adapter import *
+from product.connection_adapters.fpga_parallel_adapter import *
+from product.connection_adapters.fpga_adapter import SHADOWED_REGISTERS, _STATE_SAVERS
+from io_ports.fpga_registers import CLK_SL, TARGET_FIELDS
+from io_ports.io_port_simulator import *
+from io_ports.io_port_recorder import RecordingSocket, RECORD_WRITE
+from product.connection_adapters.tests.helpers import mixed_width_package
+
+class AddressedSocket(SimulatedFPGASocket):
+    """Simulated FPGA reached through the port address provided"""
+
+    def __init__(self, package, address):
+        super(AddressedSocket, self).__init__(package)
+        self.address = address
+
+class FPGAAdapterTests(TestCase):
+    """Tests the FPGA adapters against a simulated FPGA."""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.socket = SimulatedFPGASocket(self.dut)
+
+    def test_target_configuration(self):
+        """Every target is configured with its own SCR length and byte count"""
+        adapter = FPGAParallelAdapter(self.socket)
+        self.dut.connect(adapter)
+        for scr in self.dut:
+            config = adapter._target_configs[scr.label]
+            self.assertEqual(config['scr_length'], scr.width)
+            self.assertEqual(config['byte_count'], (scr.width + 7) / 8)
+            self.assertEqual(config['clock_source'], 'sma')
+            self.assertEqual(config['fields'], TARGET_FIELDS[scr.label])
+        self.assertEqual(self.socket.read(CLK_SL) & 0x0f, 0x0f)
+        adapter.set_clock_source('bottom', 'internal')
+        self.assertEqual(self.socket.read(CLK_SL) & 0x0f, 0x0d)
+        self.assertRaises(ValueError, adapter.set_clock_source, 'left', 'sma')
+
+    def test_ram_block_polling(self):
+        """A RAM block is clocked in byte by byte and SI_CSR is polled once at its end"""
+        adapter = FPGASerialAdapter(self.socket)
+        self.dut.connect(adapter)
+        data = [0x5A, 0xA5, 0x0F, 0xF0]
+        self.socket.reset_counters()
+        adapter._write_ram(OPCODE_WRITE_SI_RAM0, 3, data)
+        self.assertEqual(self.socket.ram[0][3:7], data)
+        self.assertEqual(self.socket.opcodes, {OPCODE_WRITE_SI_RAM0:4})
+        self.assertEqual(self.socket.reads, 1)
+        self.assertEqual((self.socket.read(SI_ADDR_0), self.socket.read(SI_ADDR_1)), (7, 0))
+
+    def test_unrouted_targets(self):
+        """SCRs the FPGA has no routing or clock fields for are reached without changing either"""
+        dut = Package({}, [Register('VCO_CAL', 'I', '0', '1', '3', '101')], [Register('TX_AMP', 'I', '0', '1', '5', '01010')], {'big':'0123X', 'medium':'X01'})
+        socket = SimulatedFPGASocket(dut, targets = {'big':'xxxxxxxx'})
+        adapter = FPGAParallelAdapter(socket)
+        dut.connect(adapter)
+        self.assertTrue(dut.connected)
+        for scr in dut:
+            config = adapter._target_configs[scr.label]
+            self.assertEqual((config['fields'], config['clock_field']), ([], None))
+        self.assertRaises(ValueError, adapter.set_clock_source, 'big', 'sma')
+
+        dut.big.lane_2['TX_AMP'].set(19)
+        self.assertEqual(socket.chain('big'), dut.big.sent)
+        self.assertEqual(dut.big.lane_2['TX_AMP'].get(), 19)
+
+    def test_mixed_width_targets(self):
+        """Orientations of different widths can be set and retrieved"""
+        self.dut.connect(FPGASerialAdapter(self.socket))
+        self.assertNotEqual(self.dut.top.width, self.dut.bottom.width)
+        self.dut.top.set('TX_AMP', 21)
+        self.dut.bottom.set('BIST_MODE', 3)
+        self.assertEqual(self.socket.chain('top'), self.dut.top.sent)
+        self.assertEqual(self.socket.chain('bottom'), self.dut.bottom.sent)
+        self.assertEqual(self.dut.get('TX_AMP')['top']['lane_3'], 21)
+        self.assertEqual(self.dut.get('BIST_MODE')['bottom']['lane_1'], 3)
+
+    def test_target_switch_writes_only_differences(self):
+        """Switching targets only writes the control registers which change"""
+        recorder = RecordingSocket(self.socket)
+        self.dut.connect(FPGASerialAdapter(recorder))
+        self.dut.top.set('TX_AMP', 21)
+        self.dut.bottom.set('TX_AMP', 21)
+        self.dut.top.set('TX_AMP', 20)
+
+        def control_writes(scr):
+            recorder.records = []
+            scr.set('TX_AMP', 22)
+            return [r.index for r in recorder.records if r.kind == RECORD_WRITE and r.index in SHADOWED_REGISTERS]
+
+        # Same target, no control register traffic
+        self.assertEqual(control_writes(self.dut.top), [])
+        # Both routing bits are already on, so only SI_CFG_0 and the SCR length change
+        self.assertEqual(control_writes(self.dut.bottom), [SI_CFG_0, SI_CNT_0])
+
+
+    def test_exchange(self):
+        """An exchange sets and gets in a single port call"""
+        self.dut.connect(FPGASerialAdapter(self.socket))
+        self.dut.top.set('TX_AMP', 21)
+        self.socket.drive('top', self.dut.top.lane_2['STATUS'].global_index, '110')
+        self.socket.reset_counters()
+
+        results = self.dut.top.exchange('TX_AMP', 22, 'STATUS')
+        ram1_reads = self.socket.opcodes[OPCODE_READ_SI_RAM1]
+        self.assertEqual(results['lane_2'], 3)
+        self.assertEqual(results['lane_0'], 0)
+        self.assertEqual(self.socket.calls, 1)
+        self.assertEqual(self.socket.chain('top'), self.dut.top.sent)
+        self.assertEqual(self.dut.top.lane_0['TX_AMP'].value, 22)
+
+        # Only the RAM_1 bytes which hold the status registers are read
+        expected = set()
+        for lane in self.dut.top.lanes.values():
+            s,e = lane['STATUS'].global_extents
+            expected.update(range(s / 8, (e + 7) / 8))
+        self.assertEqual(ram1_reads, len(expected))
+        self.assertTrue(len(expected) < (self.dut.top.width + 7) / 8)
+
+        self.assertRaises(KeyError, self.dut.top.exchange, 'MISSING', 1, 'STATUS')
+        self.assertRaises(KeyError, self.dut.exchange, 'MISSING', 1, 'STATUS')
+        self.socket.reset_counters()
+        self.assertRaises(KeyError, self.dut.top.exchange, 'TX_AMP', 1, 'MISSING')
+        self.assertRaises(KeyError, self.dut.exchange, 'TX_AMP', 1, 'MISSING')
+        self.assertEqual(self.socket.calls, 0)
+
+    def test_exchange_busy(self):
+        """An exchange which finds the FPGA busy is repeated one step at a time"""
+        socket = SimulatedFPGASocket(self.dut, busy_reads = 3)
+        self.dut.connect(FPGASerialAdapter(socket))
+        socket.drive('top', self.dut.top.lane_1['STATUS'].global_index, '011')
+        results = self.dut.top.exchange('TX_AMP', 17, 'STATUS')
+        self.assertEqual(results['lane_1'], 6)
+        self.assertEqual(socket.chain('top'), self.dut.top.sent)
+        self.assertEqual(self.dut.top.lane_3['TX_AMP'].sent, 17)
+
+    def test_exchange_across_targets(self):
+        """Exchanges at the package reach every target"""
+        self.dut.connect(FPGASerialAdapter(self.socket))
+        results = self.dut.exchange('BIST_MODE', 3, 'BIST_MODE')
+        self.assertEqual(results['top']['lane_0'], 3)
+        self.assertEqual(results['bottom']['lane_1'], 3)
+        self.assertEqual(self.socket.chain('bottom'), self.dut.bottom.sent)
+
+
+    def test_output_bytes(self):
+        """The bytes which hold output registers are known for every target"""
+        adapter = FPGASerialAdapter(self.socket)
+        self.dut.connect(adapter)
+        for scr in self.dut:
+            expected = sorted(set([i / 8 for i, d in enumerate(scr.io_map) if d == 'O']))
+            self.assertEqual(adapter._target_configs[scr.label]['output_bytes'], expected)
+            self.assertTrue(len(expected) < (scr.width + 7) / 8)
+
+    def test_refresh_output_only(self):
+        """An output only refresh retrieves just the bytes holding output registers"""
+        adapter = FPGASerialAdapter(self.socket)
+        self.dut.connect(adapter)
+        self.socket.drive('top', self.dut.top.lane_1['STATUS'].global_index, '101')
+        self.socket.reset_counters()
+
+        self.dut.top.refresh(output_only = True)
+        self.assertEqual(self.socket.opcodes[OPCODE_READ_SI_RAM1], len(adapter._target_configs['top']['output_bytes']))
+        self.assertEqual(self.dut.top.lane_1['STATUS'].retrieved, 5)
+        self.assertTrue(None in adapter['top'].retrieved)
+
+        # Registers outside of the readback interest are still retrieved on request
+        self.assertEqual(self.dut.top.get('TX_AMP')['lane_1'], 10)
+
+    def test_readback_interest(self):
+        """The readback can be restricted to the registers of interest"""
+        adapter = FPGASerialAdapter(self.socket)
+        self.dut.connect(adapter)
+        self.dut.top.set_readback_interest(['LOCK'])
+        self.assertEqual(adapter._target_configs['top']['readback'], [0])
+        self.socket.reset_counters()
+        self.dut.top.refresh(output_only = True)
+        self.assertEqual(self.socket.opcodes[OPCODE_READ_SI_RAM1], 1)
+
+        self.dut.top.set_readback_interest()
+        self.assertEqual(adapter._target_configs['top']['readback'], adapter._target_configs['top']['output_bytes'])
+
+
+    def test_readback_cache(self):
+        """Reads within the window reuse the last capture until the SCR is written"""
+        adapter = FPGASerialAdapter(self.socket)
+        self.dut.connect(adapter)
+        status = [self.dut.top[lane]['STATUS'] for lane in ['lane_0', 'lane_2']]
+        self.dut.top.set('TX_AMP', 7)
+        self.socket.drive('top', status[1].global_index, '110')
+
+        # Disabled by default
+        self.socket.reset_counters()
+        self.assertEqual([r.value for r in status], [0, 3])
+        self.assertEqual(self.socket.opcodes[OPCODE_READ_SERDES], 2)
+        self.assertEqual(adapter.readback_counters, {'hits':0, 'misses':0})
+
+        adapter.set_readback_window(float('inf'))
+        self.socket.reset_counters()
+        self.assertEqual([r.value for r in status], [0, 3])
+        self.assertEqual([r.value for r in status], [0, 3])
+        self.assertEqual(self.socket.opcodes[OPCODE_READ_SERDES], 1)
+        self.assertEqual(adapter.readback_counters, {'hits':3, 'misses':1})
+
+        # The device changes but the capture is reused until forced
+        self.socket.drive('top', status[1].global_index, '011')
+        self.assertEqual(status[1].value, 3)
+        self.dut.top.refresh(force = True)
+        self.assertEqual(status[1].value, 6)
+        self.assertEqual(self.socket.opcodes[OPCODE_READ_SERDES], 2)
+
+        # A write drops the capture
+        self.dut.top.set('TX_AMP', 8)
+        self.assertEqual(self.dut.top.get('TX_AMP')['lane_1'], 8)
+        self.assertEqual(self.socket.opcodes[OPCODE_READ_SERDES], 3)
+
+    def test_readback_window(self):
+        """Captures older than the window are not reused"""
+        adapter = FPGASerialAdapter(self.socket)
+        self.dut.connect(adapter)
+        adapter.set_readback_window(0.02)
+        status = self.dut.bottom.lane_1['STATUS']
+        status.get()
+        self.socket.reset_counters()
+        status.get()
+        self.assertEqual(self.socket.opcodes.get(OPCODE_READ_SERDES, 0), 0)
+        time.sleep(0.05)
+        status.get()
+        self.assertEqual(self.socket.opcodes[OPCODE_READ_SERDES], 1)
+        adapter.set_readback_window(None)
+        status.get()
+        self.assertEqual(self.socket.opcodes[OPCODE_READ_SERDES], 2)
+
+    def test_warm_reconnect(self):
+        """A saved session is resumed without initializing the FPGA"""
+        state_dir = tempfile.mkdtemp()
+        try:
+            adapter = FPGASerialAdapter(self.socket)
+            self.dut.connect(adapter, state_dir = state_dir)
+            self.dut.top.set('TX_AMP', 21)
+            self.dut.bottom.set('BIST_MODE', 3)
+            adapter.save_state()
+
+            dut = mixed_width_package()
+            recorder = RecordingSocket(self.socket)
+            dut.connect(FPGASerialAdapter(recorder), state_dir = state_dir)
+            self.assertTrue(dut.connected)
+            self.assertEqual(dut.top.sent, self.dut.top.sent)
+            self.assertEqual(dut.bottom.sent, self.dut.bottom.sent)
+            # Nothing was written to the control registers or shifted into the SCRs
+            self.assertEqual([r for r in recorder.records if r.kind == RECORD_WRITE and r.index in SHADOWED_REGISTERS], [])
+            self.assertTrue(OPCODE_WRITE_SERDES | SI_CSR_ST | SI_CSR_ERR not in [r.data for r in recorder.records if r.kind == RECORD_WRITE])
+
+            # The resumed session carries on where the last one stopped
+            dut.top.set('BIST_MODE', 2)
+            self.assertEqual(dut.top.get('TX_AMP')['lane_0'], 21)
+            self.assertEqual(self.socket.chain('top'), dut.top.sent)
+        finally:
+            shutil.rmtree(state_dir)
+
+    def test_cold_reconnect(self):
+        """A saved session is not resumed once the board has been reset"""
+        state_dir = tempfile.mkdtemp()
+        try:
+            adapter = FPGASerialAdapter(self.socket)
+            self.dut.connect(adapter, state_dir = state_dir)
+            self.dut.top.set('TX_AMP', 21)
+            adapter.save_state()
+
+            self.socket.power_on()
+            dut = mixed_width_package()
+            dut.connect(FPGASerialAdapter(self.socket), state_dir = state_dir)
+            self.assertTrue(dut.connected)
+            self.assertEqual(dut.top.sent, None)
+        finally:
+            shutil.rmtree(state_dir)
+
+    def test_state_file_per_port(self):
+        """Boards with the same ID on different ports keep their own state file, saved by the last adapter connected"""
+        state_dir = tempfile.mkdtemp()
+        try:
+            sockets = [AddressedSocket(self.dut, address) for address in ['/dev/ttyS0', '/dev/ttyS1']]
+            adapters = []
+            for socket in sockets:
+                adapters.append(FPGASerialAdapter(socket))
+                mixed_width_package().connect(adapters[-1], state_dir = state_dir)
+            self.assertEqual([os.path.basename(a.state_file) for a in adapters],
+                             ['fpga_serial_adapter_dev_ttyS0_%02x.yaml' % SIMULATOR_FPGA_ID, 'fpga_serial_adapter_dev_ttyS1_%02x.yaml' % SIMULATOR_FPGA_ID])
+
+            reconnected = FPGASerialAdapter(sockets[0])
+            mixed_width_package().connect(reconnected, state_dir = state_dir)
+            self.assertTrue(_STATE_SAVERS[reconnected.state_file] is reconnected)
+            self.assertTrue(_STATE_SAVERS[adapters[1].state_file] is adapters[1])
+
+            for adapter in [reconnected, adapters[1]]:
+                adapter.disconnect()
+                self.assertFalse(adapter.connected)
+                self.assertFalse(adapter.state_file in _STATE_SAVERS)
+                self.assertTrue(os.path.isfile(adapter.state_file))
+            # A superseded adapter does not drop the registration of the adapter which replaced it
+            mixed_width_package().connect(reconnected, state_dir = state_dir)
+            adapters[0].disconnect()
+            self.assertTrue(_STATE_SAVERS[reconnected.state_file] is reconnected)
+            reconnected.disconnect()
+        finally:
+            shutil.rmtree(state_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,11 @@ from unittest import TestCase, main
 from product.register import *
 from product.package import *
 from product.connection_adapters.mock_adapter import *
+from product.connection_adapters.tests.helpers import mixed_width_package
+
+import os
+import tempfile
+import time
 
 class MockAdapterTests(TestCase):
     """Tests a Package session via a Mock Adapter."""
@@ -646,5 +651,89 @@ class MockAdapterTests(TestCase):
                 self.assertEqual(results[orientation][self.dut[orientation].lanes[lane].label], 10)
 
 
+
+class MockExchangeTests(TestCase):
+    """Tests exchanges via a Mock Adapter."""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.dut.connect(MockAdapter())
+
+    def test_exchange_at_package(self):
+        """Set a value and get it back with a single exchange at the package"""
+        results = self.dut.exchange('BIST_MODE', 10, 'BIST_MODE')
+        for orientation in self.dut.orientations:
+            for lane in self.dut[orientation].lanes:
+                self.assertEqual(results[orientation][self.dut[orientation].lanes[lane].label], 10)
+
+
+class MockCostModelTests(TestCase):
+    """Tests the virtual bench clock of the Mock Adapter."""
+
+    def connect(self, cost_model = None, realtime = False):
+        dut = mixed_width_package()
+        adapter = MockAdapter(cost_model, realtime)
+        dut.connect(adapter)
+        adapter.reset_clock()
+        return dut, adapter
+
+    def test_counters_without_cost_model(self):
+        """Port traffic is counted, but the clock does not move without a cost model"""
+        dut, adapter = self.connect()
+        dut.top.set('TX_AMP', 21)
+        estimate = adapter.estimate()
+        self.assertEqual(estimate['seconds'], 0)
+        self.assertEqual(estimate['opcodes'], 1)
+        self.assertEqual(estimate['transactions'], estimate['writes'] + estimate['reads'])
+
+    def test_serial_estimate(self):
+        """The clock advances by the modelled cost of the port traffic"""
+        model = CostModel.serial()
+        dut, adapter = self.connect(model)
+        dut.top.set('TX_AMP', 21)
+        dut.top.get('TX_AMP')
+        c = adapter.counters
+        self.assertAlmostEqual(adapter.clock, model.cost(c['calls'], c['writes'], c['reads'], c['opcodes']))
+        self.assertTrue(adapter.clock > 0)
+
+        slow_dut, slow_adapter = self.connect(CostModel.serial(9600))
+        slow_dut.top.set('TX_AMP', 21)
+        slow_dut.top.get('TX_AMP')
+        self.assertTrue(slow_adapter.clock > adapter.clock)
+
+    def test_batching_is_cheaper(self):
+        """Preparing registers and committing them once beats setting them one by one"""
+        dut, adapter = self.connect(CostModel.serial())
+        for lane in ['lane_0', 'lane_1', 'lane_2']:
+            dut.top[lane]['TX_AMP'].set(21)
+        sets = adapter.estimate()
+
+        dut, adapter = self.connect(CostModel.serial())
+        for lane in ['lane_0', 'lane_1', 'lane_2']:
+            dut.top[lane]['TX_AMP'].prepare(21)
+        dut.top.commit()
+        batched = adapter.estimate()
+        self.assertTrue(batched['opcodes'] < sets['opcodes'])
+        self.assertTrue(batched['seconds'] < sets['seconds'])
+
+    def test_realtime(self):
+        """In real time the mock sleeps for the modelled cost"""
+        dut, adapter = self.connect(CostModel(call_latency = 0.01), True)
+        start = time.time()
+        dut.top.set('TX_AMP', 21)
+        self.assertTrue(time.time() - start >= adapter.clock * 0.9)
+
+    def test_bench_profile(self):
+        """Measured bench profiles load from YAML"""
+        handle, filepath = tempfile.mkstemp('.yaml')
+        os.write(handle, 'call_latency: 0.002\nbyte_time: 0.0001\nwrite_bytes: 3\n')
+        os.close(handle)
+        try:
+            model = CostModel.from_yaml(filepath)
+        finally:
+            os.remove(filepath)
+        self.assertAlmostEqual(model.cost(calls = 1, writes = 2), 0.002 + 0.0006)
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+"""
+Tests ThreadedAdapter wrapped around an FPGA adapter and a simulated FPGA
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+import threading
+
+from product.connection_adapters.threaded_adapter import *
+from product.connection_adapters.fpga_serial_adapter import *
+from io_ports.io_port_simulator import *
+from product.connection_adapters.tests.helpers import mixed_width_package
+
+class ThreadedAdapterTests(TestCase):
+    """Tests the threaded adapter against a simulated FPGA."""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.socket = SimulatedFPGASocket(self.dut)
+        self.adapter = ThreadedAdapter(FPGASerialAdapter(self.socket))
+        self.dut.connect(self.adapter)
+
+    def tearDown(self):
+        self.adapter.close()
+
+    def test_round_trip(self):
+        """The package API behaves as it does on the wrapped adapter"""
+        self.assertTrue(self.dut.connected)
+        self.assertEqual(self.adapter.type, 'Threaded Serial FPGA')
+        self.dut.top.set('TX_AMP', 21)
+        self.dut.bottom.set('BIST_MODE', 3)
+        self.assertEqual(self.dut.get('TX_AMP')['top']['lane_3'], 21)
+        self.assertEqual(self.dut.get('BIST_MODE')['bottom']['lane_1'], 3)
+        self.assertEqual(self.socket.chain('top'), self.dut.top.sent)
+        self.assertEqual(self.socket.chain('bottom'), self.dut.bottom.sent)
+
+    def test_futures(self):
+        """Commands return futures which resolve once the worker has executed them"""
+        register = self.dut.top.lane_0['TX_AMP']
+        future = self.adapter.set('top', register.global_index, register.reg_value_as_bin(21))
+        self.assertEqual(future.result(5), None)
+        self.assertTrue(future.done())
+        self.adapter.get('top', register.global_extents).result(5)
+        self.assertEqual(register.retrieved, 21)
+
+    def test_coalesced_sets(self):
+        """Adjacent sets to the same target are shifted into the SCR once"""
+        registers = [self.dut.top[lane]['TX_AMP'] for lane in ['lane_0', 'lane_1', 'lane_2']]
+        value = registers[0].reg_value_as_bin(22)
+        self.socket.reset_counters()
+        self.adapter.lock.acquire()
+        try:
+            # The worker is held while the commands are queued
+            self.adapter.set('top', 0, self.dut.top.default)
+            futures = [self.adapter.set('top', r.global_index, value) for r in registers]
+        finally:
+            self.adapter.lock.release()
+        self.adapter.wait()
+        self.assertTrue(self.socket.opcodes[OPCODE_WRITE_SERDES] <= 2)
+        self.assertEqual([f.done() for f in futures], [True, True, True])
+        self.assertEqual(self.socket.chain('top'), self.dut.top.sent)
+        self.assertEqual([r.get() for r in registers], [22, 22, 22])
+
+    def test_coalesce(self):
+        """Adjacent commands for the same target are merged"""
+        def commands(*calls):
+            return [(name, args, AdapterFuture(name), args[0]) for name, args in calls]
+        groups = self.adapter._coalesce(commands(
+            ('set', ('top', 0, '01')), ('set', ('top', 4, '1')),
+            ('refresh', ('top', False)), ('inspect', ('top', (2, 5))), ('inspect', ('top', (8, 9))),
+            ('get', ('bottom', (0, 3))), ('set', ('bottom', 0, '1'))
+            ))
+        self.assertEqual([(name, args, len(futures)) for name, args, futures in groups], [
+            ('set_merged', ('top', [(0, '01'), (4, '1')]), 2),
+            ('get', ('top', (2, 9)), 3),
+            ('get', ('bottom', (0, 3)), 1),
+            ('set', ('bottom', 0, '1'), 1)
+            ])
+
+    def test_untargeted_commands(self):
+        """A command for a target can follow a command without arguments in one drain"""
+        self.adapter.lock.acquire()
+        try:
+            # The worker is held on the first set while the rest are queued
+            self.adapter.set('top', 0, '1')
+            futures = [self.adapter.submit('reset_readback_counters'), self.adapter.set('top', 0, '0')]
+        finally:
+            self.adapter.lock.release()
+        self.adapter.wait(timeout = 5)
+        self.assertEqual([f.done() for f in futures], [True, True])
+        self.assertTrue(self.adapter._worker.isAlive())
+        self.assertEqual(self.socket.chain('top'), self.dut.top.sent)
+
+    def test_wait_timeout(self):
+        """Waiting on commands which do not complete in time raises a RuntimeError"""
+        self.adapter.lock.acquire()
+        try:
+            future = self.adapter.set('top', 0, '1')
+            self.assertRaises(RuntimeError, self.adapter.wait, 'top', 0.2)
+        finally:
+            self.adapter.lock.release()
+        self.assertEqual(future.result(5), None)
+
+    def test_disconnect(self):
+        """Disconnecting executes the queued commands, disconnects the wrapped adapter and stops the worker"""
+        register = self.dut.top.lane_1['TX_AMP']
+        future = self.adapter.set('top', register.global_index, register.reg_value_as_bin(13))
+        self.adapter.disconnect()
+        self.assertTrue(future.done())
+        s,e = register.global_extents
+        self.assertEqual(self.socket.chain('top')[s:e], register.reg_value_as_bin(13))
+        self.assertFalse(self.adapter.connected)
+        self.assertFalse(self.adapter._worker.isAlive())
+
+    def test_queued_reads(self):
+        """Queued refreshes and inspects retrieve the device state"""
+        status = [self.dut.top[lane]['STATUS'] for lane in ['lane_0', 'lane_1']]
+        self.socket.drive('top', status[1].global_index, '111')
+        self.adapter.refresh('top')
+        futures = [self.adapter.inspect('top', register.global_extents) for register in status]
+        self.adapter.wait()
+        self.assertEqual([f.done() for f in futures], [True, True])
+        self.assertEqual([r.retrieved for r in status], [0, 7])
+
+    def test_error_propagation(self):
+        """Errors raised on the worker are raised by the future and by the next wait"""
+        future = self.adapter.set('missing', 0, '1')
+        self.assertRaises(Exception, future.result, 5)
+
+        self.adapter.set('missing', 0, '1')
+        self.assertRaises(Exception, self.adapter.wait)
+        self.adapter.wait()
+
+    def test_shared_between_threads(self):
+        """Several threads can drive the package through one adapter"""
+        def worker(lane, value):
+            self.dut.top[lane]['TX_AMP'].set(value)
+        threads = [threading.Thread(target = worker, args = ('lane_%s' % i, 20 + i)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.adapter.wait()
+        self.assertEqual(self.socket.chain('top'), self.dut.top.sent)
+        self.assertEqual([self.dut.top['lane_%s' % i]['TX_AMP'].get() for i in range(4)], [20, 21, 22, 23])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+
+"""
+Threaded connection adapter
+
+    Wraps any connection adapter so that a single worker thread owns it, and
+    with it the port. API calls are queued as commands and return an
+    AdapterFuture, so Python side work can overlap slow serial and parallel
+    transfers, and a Package can be shared between threads.
+
+    Commands which change the device (prepare, clear, commit, set, refresh,
+    inspect, get, exchange) return without waiting. Reading a session, which is
+    how the Package API sees sent and retrieved values, waits until every command
+    queued for that SCR has been executed, so the blocking Package API behaves
+    exactly as it does on the wrapped adapter. Call result() on a future to
+    block on a single command.
+
+    The worker coalesces adjacent commands for the same target before executing them:
+        set + set                 One set of the merged value
+        refresh + inspect         One get
+        get + get, get + inspect  One get spanning both extents
+        inspect + inspect         One inspect spanning both extents
+
+    Example
+        dut.connect(ThreadedAdapter(FPGASerialAdapter()))
+        dut.set('TX_AMP', 10)                        # Returns immediately
+        analyse(previous_results)                    # Overlaps the transfer
+        dut.get('STATUS')                            # Waits for the set
+"""
+
+import Queue
+import sys
+import threading
+import time
+
+from product.connection_adapters.abstract_adapter import *
+
+# Commands whose results are read back from the sessions
+READ_COMMANDS = ['inspect', 'get']
+
+# Seconds between checks that the worker thread is still alive while waiting on it
+WAIT_POLL = 0.1
+
+class AdapterFuture(object):
+    """The pending result of a command queued on a ThreadedAdapter"""
+
+    def __init__(self, name):
+        self.name = name
+        self._event = threading.Event()
+        self._result = None
+        self._exc_info = None
+        self.retrieved = False
+
+    def done(self):
+        """Whether or not the command has been executed"""
+        return self._event.isSet()
+
+    def result(self, timeout = None):
+        """Waits for the command to be executed and returns its result, or raises its exception"""
+        self._event.wait(timeout)
+        if not self._event.isSet():
+            raise RuntimeError('%s did not complete within %s seconds' % (self.name, timeout))
+        self.retrieved = True
+        if self._exc_info != None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def _set_result(self, result):
+        self._result = result
+        self._event.set()
+
+    def _set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self._event.set()
+
+
+class ThreadedAdapter(AbstractAdapter):
+    """Runs every command of the wrapped adapter on a dedicated worker thread"""
+
+    entity_name = 'threaded_adapter'
+    entity_atts = []
+
+    def __init__(self, adapter):
+        # Prepare Parent
+        super(ThreadedAdapter, self).__init__()
+
+        # Set abstract properties
+        self._type    = 'Threaded %s' % adapter.type
+        self._adapter = adapter
+
+        # Held by the worker while it executes commands
+        self.lock = threading.RLock()
+
+        # Number of queued commands per target, None for commands without a target
+        self._pending = {}
+        self._idle    = threading.Condition()
+        self._failed  = []
+
+        self._queue  = Queue.Queue()
+        self._worker = threading.Thread(target = self._run, name = 'ThreadedAdapter')
+        self._worker.setDaemon(True)
+        self._worker.start()
+
+    def __getitem__(self, session_label):
+        """Waits for the commands queued for the SCR and returns its session"""
+        self.wait(session_label)
+        return self._adapter[session_label]
+
+    @property
+    def adapter(self):
+        """Returns the wrapped adapter"""
+        return self._adapter
+
+
+    # Connection Management -----------------------------------
+
+
+    @staticmethod
+    def detect():
+        """The threaded adapter is available wherever the adapter it wraps is"""
+        return True
+
+    def connect(self, package):
+        """Connects the wrapped adapter on the worker thread"""
+        return self.submit('connect', package).result()
+
+    def disconnect(self):
+        """
+        Disconnects the wrapped adapter on the worker thread once the queued commands have
+        been executed, and then stops the worker thread, see close
+        """
+        try:
+            if hasattr(self._adapter, 'disconnect'):
+                self.submit('disconnect').result()
+        finally:
+            self.close()
+
+    @property
+    def state(self):
+        """Returns the connection state of the wrapped adapter."""
+        return self._adapter.state
+
+    @property
+    def connected(self):
+        """Returns the connection state of the wrapped adapter."""
+        return self._adapter.connected
+
+    def log_adapter_state(self):
+        """Writes out the complete state of the wrapped adapter to the log"""
+        self.submit('log_adapter_state').result()
+
+    @rw_property
+    def state_dir(self):
+        """The state directory of the wrapped adapter, see FPGAAdapter"""
+        def fget(self):
+            return getattr(self._adapter, 'state_dir', None)
+        def fset(self, state_dir):
+            self._adapter.state_dir = state_dir
+
+    def close(self):
+        """Executes the queued commands and stops the worker thread"""
+        if self._worker.isAlive():
+            self._queue.put(None)
+            self._worker.join()
+
+
+    # Command Queue -----------------------------------
+
+
+    def submit(self, name, *args):
+        """Queues the named adapter method to be called with the arguments provided and returns its AdapterFuture"""
+        future = AdapterFuture(name)
+        if threading.currentThread() is self._worker:
+            # Commands issued while executing a command run immediately
+            self._execute(name, args, [future])
+            return future
+        target = args[0] if args and isinstance(args[0], basestring) else None
+        self._idle.acquire()
+        try:
+            self._pending[target] = self._pending.get(target, 0) + 1
+        finally:
+            self._idle.release()
+        self._queue.put((name, args, future, target))
+        return future
+
+    def wait(self, target = None, timeout = None):
+        """
+        Waits until the commands queued for the target, or every command if no target is
+        provided, have been executed. Raises the first error no future has reported, or a
+        RuntimeError if the commands are not executed within the timeout or the worker
+        thread has stopped.
+        """
+        if threading.currentThread() is not self._worker:
+            deadline = time.time() + timeout if timeout != None else None
+            self._idle.acquire()
+            try:
+                while self._pending.get(target, 0) > 0 or self._pending.get(None, 0) > 0 or (target == None and sum(self._pending.values()) > 0):
+                    if not self._worker.isAlive():
+                        raise RuntimeError('The worker thread stopped with commands queued for %s' % target)
+                    poll = WAIT_POLL
+                    if deadline != None:
+                        poll = min(poll, deadline - time.time())
+                        if poll <= 0:
+                            raise RuntimeError('Commands queued for %s did not complete within %s seconds' % (target, timeout))
+                    self._idle.wait(poll)
+            finally:
+                self._idle.release()
+        failed = [future for future in self._failed if not future.retrieved]
+        self._failed = []
+        if failed:
+            failed[0].result()
+
+    def _run(self):
+        """Worker thread loop which executes the queued commands in coalesced groups"""
+        while True:
+            commands = [self._queue.get()]
+            stop = commands[0] == None
+            while not stop:
+                try:
+                    command = self._queue.get_nowait()
+                except Queue.Empty:
+                    break
+                if command == None:
+                    stop = True
+                else:
+                    commands.append(command)
+            commands = [command for command in commands if command != None]
+            for name, args, future, target in commands:
+                future.target = target
+            try:
+                groups = self._coalesce(commands)
+            except:
+                # Execute the commands as they were queued
+                self.log.exception('Commands could not be coalesced')
+                groups = [(name, args, [future]) for name, args, future, target in commands]
+            for name, args, futures in groups:
+                try:
+                    self._execute(name, args, futures)
+                except:
+                    self._fail(futures, sys.exc_info())
+                self._idle.acquire()
+                try:
+                    for future in futures:
+                        self._pending[future.target] -= 1
+                    self._idle.notifyAll()
+                finally:
+                    self._idle.release()
+            if stop:
+                break
+
+    def _coalesce(self, commands):
+        """Merges adjacent commands for the same target, returning a list of (name, args, futures)"""
+        groups = []
+        for name, args, future, target in commands:
+            if groups and target != None and groups[-1][1] and groups[-1][1][0] == target:
+                last_name, last_args, futures = groups[-1]
+                merged = None
+                if name == 'set' and last_name in ('set', 'set_merged'):
+                    # Values are applied in order when the merged set is executed
+                    sets = last_args[1] if last_name == 'set_merged' else [last_args[1:]]
+                    merged = ('set_merged', (target, sets + [args[1:]]))
+                elif name == 'inspect' and last_name == 'refresh' and not last_args[1:2] == (True,):
+                    # A forced refresh makes a forced get
+                    merged = ('get', (target, args[1]) + tuple(last_args[2:3]))
+                elif name in READ_COMMANDS and (last_name == 'get' or (name == 'inspect' and last_name == 'inspect')):
+                    force = tuple(last_args[2:3])
+                    if name == 'get' and args[2:3] == (True,):
+                        force = (True,)
+                    merged = (last_name, (target, self._span(last_args[1], args[1])) + force)
+                if merged != None:
+                    groups[-1] = (merged[0], merged[1], futures + [future])
+                    continue
+            groups.append((name, args, [future]))
+        return groups
+
+    def _span(self, extents_a, extents_b):
+        """Returns the extents which span both of the extents provided"""
+        return (min(extents_a[0], extents_b[0]), max(extents_a[1], extents_b[1]))
+
+    def _execute(self, name, args, futures):
+        """Executes a command on the wrapped adapter and resolves the futures of every command merged into it"""
+        self.lock.acquire()
+        try:
+            try:
+                if name == 'set_merged':
+                    target, sets = args
+                    send = list(self._adapter[target].value)
+                    for global_index, value in sets:
+                        send[global_index : global_index + len(value)] = list(value)
+                    result = self._adapter.set(target, 0, send)
+                else:
+                    result = getattr(self._adapter, name)(*args)
+            except:
+                self._fail(futures, sys.exc_info())
+            else:
+                for future in futures:
+                    future._set_result(result)
+        finally:
+            self.lock.release()
+
+
+    def _fail(self, futures, exc_info):
+        """Resolves the futures with the exception, to be raised by result() or the next wait()"""
+        for future in futures:
+            future._set_exc_info(exc_info)
+        self._failed.extend(futures)
+
+
+    # Configuration Delegation Hooks ---------------------------------
+
+
+    def set_clock_source(self, target, source):
+        """Queues a clock source change, see AbstractAdapter"""
+        return self.submit('set_clock_source', target, source)
+
+    def set_readback_interest(self, target, global_extents = None):
+        """Queues a readback interest change, see AbstractAdapter"""
+        return self.submit('set_readback_interest', target, global_extents)
+
+    def set_readback_window(self, seconds = None):
+        """Sets the readback cache window of the wrapped adapter once the queued commands have been executed"""
+        return self.submit('set_readback_window', seconds).result()
+
+    @property
+    def readback_window(self):
+        """Returns the readback cache window of the wrapped adapter"""
+        return self._adapter.readback_window
+
+    @property
+    def readback_counters(self):
+        """Returns the readback cache hits and misses of the wrapped adapter"""
+        self.wait()
+        return self._adapter.readback_counters
+
+    def reset_readback_counters(self):
+        """Zeroes the readback cache hits and misses of the wrapped adapter"""
+        self.submit('reset_readback_counters').result()
+
+
+    # Package, SCR, Block, Register API Hooks -------------------------
+
+
+    def prepare(self, target, global_index, value):
+        """Queues a prepare, see AbstractAdapter"""
+        return self.submit('prepare', target, global_index, value)
+
+    def check(self, target, global_extents):
+        """Returns the prepared value once every queued command has been executed, see AbstractAdapter"""
+        return self.submit('check', target, global_extents).result()
+
+    def clear(self, target, global_extents):
+        """Queues a clear, see AbstractAdapter"""
+        return self.submit('clear', target, global_extents)
+
+    def commit(self, target, global_extents):
+        """Queues a commit, see AbstractAdapter"""
+        return self.submit('commit', target, global_extents)
+
+    def set(self, target, global_index, value):
+        """Queues a set, see AbstractAdapter"""
+        return self.submit('set', target, global_index, value)
+
+    def refresh(self, target, output_only = False, force = False):
+        """Queues a refresh, see AbstractAdapter"""
+        return self.submit('refresh', target, output_only, force)
+
+    def inspect(self, target, global_extents):
+        """Queues an inspect, see AbstractAdapter"""
+        return self.submit('inspect', target, global_extents)
+
+    def get(self, target, global_extents, force = False):
+        """Queues a get, see AbstractAdapter"""
+        return self.submit('get', target, global_extents, force)
+
+    def exchange(self, target, global_index, value, global_extents):
+        """Queues an exchange, see AbstractAdapter"""
+        return self.submit('exchange', target, global_index, value, global_extents)
+
+    def compile_stream(self, steps):
+        """Prepares the steps for the wrapped adapter on the calling thread, see AbstractAdapter"""
+        return self._adapter.compile_stream(steps)
+
+    def stream(self, steps, callback = None):
+        """Streams the steps on the worker thread and waits for the callback results, see AbstractAdapter"""
+        return self.submit('stream', steps, callback).result()
+
+
+if __name__=='__main__' :
+    pass
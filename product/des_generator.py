@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+"""
+DES Generator
+
+    Generates synthetic DES files to check how the framework scales to parts with
+    more lanes, more registers and longer SCRs than the product files on hand. The
+    files hold ID, ORIENTATION, CONSTANT, LIMIT, LEVEL and NAME records in the
+    layout Package.from_txt_file reads. Every input register directly follows its
+    enable bit, and output registers have none.
+
+    Generation is seeded, so the same options always produce the same file.
+
+    Example
+        write_des_file('DES_32_lane.txt', lanes = 32, lane_registers = 120)
+        dut = Package.from_txt_file('DES_32_lane.txt')
+
+    Usage
+        python product/des_generator.py -l 32 -r 120 -o DES_32_lane.txt
+        python product/des_generator.py -l 16 -s 20000 -o DES_16_lane.txt
+"""
+
+import math
+import random
+import sys
+
+from optparse import OptionParser
+
+from common.base import *
+from product.serial_control_register import LANE_CHARACTERS
+
+# Register widths and how often they occur, as (width, weight)
+DEFAULT_WIDTHS = [(1, 50), (2, 12), (3, 10), (4, 10), (5, 6), (6, 4), (8, 5), (16, 3)]
+
+DEFAULT_METADATA = {'scale':'65nm', 'process':'SYNTHETIC'}
+
+# Supplies given a LIMIT and a LEVEL record, as (supply, limit, level)
+DEFAULT_SUPPLIES = [('avdd', '1.4', '1.1'), ('dvdd', '1.4', '1'), ('core_vdd', '1.4', '1'), ('avddh', '2', '1')]
+
+def default_orientations(lanes):
+    """Returns a top orientation with the common block in the middle and a bottom orientation with it on the left"""
+    sequence = LANE_CHARACTERS[:lanes]
+    middle = lanes / 2
+    return {'top':'%sX%s' % (sequence[:middle], sequence[middle:]), 'bottom':'X%s' % sequence}
+
+def _registers(prefix, count, widths, output_ratio, generator, min_width = 0):
+    """
+    Returns a list of (name, width, default, direction, start, enable) which lays the registers
+    out back to back, adding registers beyond count until the block is min_width bits wide
+    """
+    population = []
+    for width, weight in widths:
+        population.extend([width] * weight)
+    registers = []
+    index = 0
+    while len(registers) < count or index < min_width:
+        width = generator.choice(population)
+        default = ''.join([generator.choice('01') for i in range(width)])
+        if generator.random() < output_ratio:
+            registers.append(('%s_STAT_%03d' % (prefix, len(registers)), width, default, 'O', index, index))
+            index += width
+        else:
+            # The enable bit immediately precedes the register
+            registers.append(('%s_CTRL_%03d' % (prefix, len(registers)), width, default, 'I', index + 1, index))
+            index += width + 1
+    return registers
+
+def generate_des(lanes = 4, common_registers = 16, lane_registers = 32, widths = DEFAULT_WIDTHS, output_ratio = 0.25,
+                 orientations = None, scr_length = None, constants = 8, metadata = None, seed = 0):
+    """
+    Returns the text of a synthetic DES file
+        lanes            : Lanes in the default orientations, at most 33
+        common_registers : Registers in the common block
+        lane_registers   : Registers in each lane
+        widths           : Register width distribution as a list of (width, weight)
+        output_ratio     : Fraction of the registers which are outputs
+        orientations     : Dictionary of label:sequence pairs, defaults to default_orientations(lanes)
+        scr_length       : If provided, lanes get registers until the longest SCR is at least this many bits
+        constants        : Number of CONSTANT records
+        metadata         : Dictionary of ID records
+        seed             : Random seed
+    """
+    if lanes < 1 or lanes > len(LANE_CHARACTERS):
+        raise ValueError('A DES file can hold between 1 and %s lanes, %s is invalid.' % (len(LANE_CHARACTERS), lanes))
+    generator    = random.Random(seed)
+    orientations = orientations if orientations != None else default_orientations(lanes)
+    metadata     = metadata if metadata != None else DEFAULT_METADATA
+
+    common = _registers('CB', common_registers, widths, output_ratio, generator)
+    min_lane_width = 0
+    if scr_length != None:
+        common_width   = sum([r[1] + (1 if r[3] == 'I' else 0) for r in common])
+        longest        = max([len(sequence) - 1 for sequence in orientations.values()])
+        min_lane_width = int(math.ceil(max(0, scr_length - common_width) / float(longest)))
+        lane_registers = 1
+    lane = _registers('LN', lane_registers, widths, output_ratio, generator, min_lane_width)
+
+    lines = []
+    for key in sorted(metadata):
+        lines.append('ID\t%s\t%s' % (key, metadata[key]))
+    for label in sorted(orientations):
+        lines.append('ORIENTATION\t%s\t%s' % (label, orientations[label]))
+    for i in range(constants):
+        lines.append('CONSTANT\tMODE_%s\tb%s' % (i, int_to_bin(i, 4)))
+    for supply, limit, level in DEFAULT_SUPPLIES:
+        lines.append('LIMIT\t%s\t%s' % (supply, limit))
+        lines.append('LEVEL\t%s\t%s' % (supply, level))
+    for parent, registers in [('C', common), ('L', lane)]:
+        for name, width, default, direction, start, enable in registers:
+            lines.extend([
+                'NAME\t%s' % name,
+                'WIDTH\t%s' % width,
+                'DEFAULT\tb%s' % default,
+                'PARENT\t%s' % parent,
+                'DIRECTION\t%s' % direction,
+                'START\t%s' % start,
+                'ENABLE\t%s' % enable,
+                'GROUP\tnone'
+                ])
+    return '\n'.join(lines) + '\n'
+
+def write_des_file(filepath, **options):
+    """Writes a synthetic DES file, see generate_des for the options"""
+    f = open(filepath, 'w')
+    try:
+        f.write(generate_des(**options))
+    finally:
+        f.close()
+    return filepath
+
+
+def main(argv = None):
+    """Writes a synthetic DES file from the command line options"""
+    parser = OptionParser(usage = '%prog [options]')
+    parser.add_option('-o', '--output', default = 'DES_synthetic.txt', help = 'DES file to write')
+    parser.add_option('-l', '--lanes', type = 'int', default = 4, help = 'Lanes per orientation')
+    parser.add_option('-c', '--common-registers', type = 'int', default = 16, help = 'Registers in the common block')
+    parser.add_option('-r', '--lane-registers', type = 'int', default = 32, help = 'Registers in each lane')
+    parser.add_option('-s', '--scr-length', type = 'int', default = None, help = 'Minimum length of the longest SCR, overrides --lane-registers')
+    parser.add_option('-p', '--output-ratio', type = 'float', default = 0.25, help = 'Fraction of output registers')
+    parser.add_option('--seed', type = 'int', default = 0, help = 'Random seed')
+    options, args = parser.parse_args(argv)
+    write_des_file(options.output, lanes = options.lanes, common_registers = options.common_registers,
+                   lane_registers = options.lane_registers, scr_length = options.scr_length,
+                   output_ratio = options.output_ratio, seed = options.seed)
+    print 'Wrote %s' % options.output
+    return 0
+
+
+if __name__=='__main__' :
+    sys.exit(main())
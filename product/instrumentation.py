@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""
+Instrumentation
+
+    Traces a procedure through the Package, SerialControlRegister, Register,
+    connection adapter and port layers with the spans of common.tracing, so that
+    the time spent walking the register tree, converting register strings, in
+    adapter buffer logic and on the port itself can be told apart.
+
+    Nothing is instrumented until enable() is called, and disable() restores the
+    original methods, so untraced runs pay nothing.
+
+    Example
+        aggregate = AggregateSink()
+        enable([aggregate, ChromeTraceSink('procedure.trace.json')])
+        try:
+            procedure(dut)
+        finally:
+            disable()
+        print aggregate.format(20)
+"""
+
+from common.base import *
+from common.tracing import *
+from common.hierarchy import Node
+from product.package import Package
+from product.register_collection import RegisterCollection
+from product.serial_control_register import SerialControlRegister
+from product.register import Register
+from product.connection_adapters.abstract_adapter import AbstractAdapter
+from io_ports.io_port_abstract import AbstractSocket
+
+# Register API shared by every level of the hierarchy
+API_CALLS = ['connect', 'reset', 'prepare', 'check', 'clear', 'commit', 'set', 'refresh', 'set_readback_interest', 'inspect', 'get', 'exchange', 'stream', 'sweep', 'trim', 'vector', 'set_vector', 'snapshot', 'watch']
+
+# Tree traversal
+TREE_PROPERTIES = ['root', 'global_index', 'global_extents', 'width']
+
+# String and value conversion
+CONVERSIONS = ['translate_register_string', 'translate_register_string_delta', 'reg_value_as_bin', 'inverted_bit_array_to_int']
+
+# Adapter buffer logic below the API calls
+ADAPTER_INTERNALS = ['_set_target', '_build_prepared', '_write_input_buffer', '_commit_input_buffer', '_populate_output_buffer',
+                     '_read_output_buffer', '_read_output_bytes', '_read_output_buffer_byte', '_write_ram', '_read_ram', '_send_opcode']
+
+PORT_CALLS = ['read', 'write', 'read_block', 'write_block', 'transfer']
+
+# Classes traced by layer as (class, names, layer, whether subclasses are traced)
+LAYERS = [
+    (Package,               API_CALLS,                     'package',  False),
+    (SerialControlRegister, API_CALLS + CONVERSIONS,       'scr',      False),
+    (RegisterCollection,    API_CALLS + CONVERSIONS,       'block',    False),
+    (Register,              API_CALLS + CONVERSIONS,       'register', False),
+    (Node,                  TREE_PROPERTIES,               'tree',     False),
+    (AbstractAdapter,       API_CALLS + ADAPTER_INTERNALS, 'adapter',  True),
+    (AbstractSocket,        PORT_CALLS,                    'port',     True)
+    ]
+
+_tracer = None
+
+def enable(sinks = None, layers = None):
+    """
+    Instruments the layers and returns the Tracer handing spans to the sinks provided
+        sinks  : List of sinks, defaults to a single AggregateSink
+        layers : Optional list of layer names to trace, defaults to every layer
+    """
+    global _tracer
+    disable()
+    _tracer = Tracer(sinks if sinks != None else [AggregateSink()])
+    for cls, names, layer, hierarchy in LAYERS:
+        if layers != None and layer not in layers:
+            continue
+        if hierarchy:
+            _tracer.instrument_hierarchy(cls, names, layer)
+        else:
+            _tracer.instrument(cls, names, layer)
+    return _tracer
+
+def disable():
+    """Restores the instrumented classes and closes the sinks of the active tracer"""
+    global _tracer
+    if _tracer != None:
+        _tracer.close()
+        _tracer = None
+
+def tracer():
+    """Returns the active Tracer, or None when tracing is disabled"""
+    return _tracer
+
+
+if __name__=='__main__' :
+    pass
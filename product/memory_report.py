@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Memory Report
+
+    Breaks down the memory retained by a Package by the type of object holding
+    it. Every object reachable from the package is counted once. Classes,
+    modules, functions and loggers are shared by every package, so they are
+    not followed.
+
+    Each instance is charged its own size plus its __dict__, and containers
+    reached straight from an instance, such as the _children list of a Node or
+    the sent, prepared and retrieved lists of an SCR session, are charged to
+    that instance's type. Strings, numbers and other scalars are charged to
+    their own type.
+
+    Two overheads are also broken out as their share of the instance dictionaries
+    they live in, which the type totals already include:
+        label references   The attributes append_reference adds for every child,
+                           e.g. dut.top.lane_0.tx_amp
+        logger references  The self.log attribute AppBase.__init__ gives every instance
+
+    Example
+        report = dut.memory_report()
+        print format_memory_report(report)
+"""
+
+import gc
+import logging
+import sys
+import types
+
+from common.base import *
+
+# Objects which are shared by every package and so are not charged to one
+SHARED_TYPES = (type, types.ClassType, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+                types.MethodType, types.CodeType, logging.Logger, logging.Handler, logging.Manager)
+
+# Containers charged to the instance which holds them
+CONTAINER_TYPES = (list, dict, tuple, set, frozenset)
+
+# Node attributes which hold other nodes but are not label references
+NODE_ATTRIBUTES = ['parent', 'enable_bit', 'log']
+
+def memory_report(root):
+    """
+    Returns a dictionary describing the memory retained by root:
+        types      : {type name:{'instances', 'objects', 'bytes'}}, where objects includes the
+                     containers charged to the instances
+        overheads  : {'label references':{'objects', 'bytes'}, 'logger references':{'objects', 'bytes'}}
+        total      : {'objects', 'bytes'}
+    """
+    report = {'types':{}, 'overheads':{}, 'total':{'objects':0, 'bytes':0}}
+    seen = set()
+    stack = [(root, None)]
+    while stack:
+        obj, owner = stack.pop()
+        if id(obj) in seen or isinstance(obj, SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+
+        instances = 1
+        if isinstance(obj, CONTAINER_TYPES):
+            category = owner if owner != None else type(obj).__name__
+            referent_owner = owner
+            if owner != None:
+                instances = 0
+        else:
+            category = type(obj).__name__
+            referent_owner = category if hasattr(obj, '__dict__') else None
+            if hasattr(obj, '__dict__'):
+                _overheads(report, obj)
+
+        _charge(report['types'], category, sys.getsizeof(obj))
+        report['types'][category]['instances'] = report['types'][category].get('instances', 0) + instances
+        report['total']['objects'] += 1
+        report['total']['bytes']   += sys.getsizeof(obj)
+        for referent in gc.get_referents(obj):
+            stack.append((referent, referent_owner))
+    return report
+
+def _charge(totals, category, size, objects = 1):
+    entry = totals.get(category)
+    if entry == None:
+        entry = totals[category] = {'objects':0, 'bytes':0}
+    entry['objects'] += objects
+    entry['bytes']   += size
+
+def _overheads(report, obj):
+    """Charges the label and logger references held in the instance dictionary"""
+    attributes = obj.__dict__
+    if 'log' in attributes and isinstance(attributes['log'], logging.Logger):
+        _charge(report['overheads'], 'logger references', _entry_bytes(attributes, ['log']))
+    labels = [k for k, v in attributes.items() if not k.startswith('_') and k not in NODE_ATTRIBUTES and isinstance(v, AppBase)]
+    if labels:
+        _charge(report['overheads'], 'label references', _entry_bytes(attributes, labels) + sum([sys.getsizeof(k) for k in labels]), len(labels))
+
+def _entry_bytes(attributes, keys):
+    """Returns the share of the dictionary's size taken up by the keys provided"""
+    return sys.getsizeof(attributes) * len(keys) / len(attributes)
+
+def format_memory_report(report, limit = None):
+    """Returns the report as a table, the heaviest type first"""
+    lines = ['%-36s %10s %10s %12s' % ('TYPE', 'INSTANCES', 'OBJECTS', 'BYTES')]
+    rows = report['types'].items()
+    rows.sort(key = lambda row: row[1]['bytes'], reverse = True)
+    for name, entry in rows[:limit]:
+        lines.append('%-36s %10s %10s %12s' % (name, entry['instances'], entry['objects'], entry['bytes']))
+    lines.append('%-36s %10s %10s %12s' % ('TOTAL', '', report['total']['objects'], report['total']['bytes']))
+    for name, entry in sorted(report['overheads'].items()):
+        lines.append('%-36s %10s %10s %12s' % ('(%s)' % name, '', entry['objects'], entry['bytes']))
+    return '\n'.join(lines)
+
+
+if __name__=='__main__' :
+    pass
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""
+OperationSequence
+
+    Multi-step register scripts, such as toggling a reset, pulsing a
+    calibration start or writing registers in a required order, are recorded
+    as an ordered list of register writes with explicit commit points. Every
+    commit point becomes one SCR state, and the sequence is compiled into the
+    steps of AbstractAdapter.stream, which the FPGA adapter turns into the
+    RAM_0 bytes that change from one state to the next and the SERDES commits
+    between them. Each state's bytes and commit go to the port as one batch,
+    and the next state's bytes only once that commit has finished, so the
+    states reach the silicon in order.
+
+    Writes are recorded by label rather than by Register, so one sequence can
+    be run on any package built from the same DES. Compiled steps are kept,
+    keyed by the layout of the registers written, the SCR values the sequence
+    starts from and the adapter, so running the sequence again on a package in
+    the same state, or on another DUT in that state, skips the compile.
+
+    Writes between commit points land in the SCR together, as a prepare and
+    commit would. An SCR the writes leave unchanged is not sent at that commit
+    point. Writes after the last commit point are committed at the end.
+
+    Example
+        reset = OperationSequence()
+        reset.set('BIST_MODE', 0)
+        reset.commit()
+        reset.toggle('RESET', 'top')
+        reset.pulse('CAL_START', 1, scr = 'bottom', block = 'lane_0')
+        for dut in duts:
+            reset.run(dut)
+"""
+
+from common.base import *
+
+class OperationSequence(object):
+    """An ordered list of register writes and commit points which is compiled and sent as a stream"""
+
+    def __init__(self):
+        # Operations as [(scr label, block label, register label, value), ...] where None is a commit point
+        self.operations = []
+        # Compiled steps and plans as {(adapter class, layout, bases):(steps, plan)}
+        self._compiled = {}
+        self.compiles = 0
+
+    def __len__(self):
+        """Returns the number of commit points, counting writes left after the last one"""
+        return len(self._groups())
+
+
+    # Recording -----------------------------
+
+
+    def set(self, key, value, scr = None, block = None):
+        """
+        Records a write of the value to the register identified by key, a register label or a
+        Register. A label is written in every block holding it, optionally narrowed to one SCR
+        and one block, as Package.set does.
+        """
+        self.operations.append(self._address(key, scr, block) + (value,))
+        return self
+
+    def commit(self):
+        """Records a commit point, after which the writes recorded since the last one land in the SCR"""
+        if self.operations and self.operations[-1] != None:
+            self.operations.append(None)
+        return self
+
+    def toggle(self, key, scr = None, block = None):
+        """Records the register being set to 0, 1 and then 0 again, each committed on its own, see Register.toggle"""
+        self.set(key, 0, scr, block).commit()
+        return self.pulse(key, 1, 0, scr, block)
+
+    def pulse(self, key, value = 1, idle = 0, scr = None, block = None):
+        """Records the register being set to value and then back to idle, each committed on its own"""
+        self.commit()
+        self.set(key, value, scr, block).commit()
+        return self.set(key, idle, scr, block).commit()
+
+    def _address(self, key, scr, block):
+        if not isinstance(key, basestring):
+            return (key.root.label, key.parent.label, key.label)
+        return (scr and scr.lower(), block and block.lower(), key.upper())
+
+    def _groups(self):
+        """Returns the writes between commit points as [[(scr, block, register, value), ...], ...]"""
+        groups = [[]]
+        for operation in self.operations:
+            if operation == None:
+                groups.append([])
+            else:
+                groups[-1].append(operation)
+        return [group for group in groups if group]
+
+
+    # Compile and Run -----------------------------
+
+
+    def resolve(self, package):
+        """
+        Returns the writes between commit points with the registers of the package they land in,
+        as [[(scr label, [register, ...], value), ...], ...]
+        """
+        groups = []
+        for group in self._groups():
+            writes = []
+            for scr_label, block_label, key, value in group:
+                scrs = [package[scr_label]] if scr_label != None else list(package)
+                found = False
+                for scr in scrs:
+                    blocks = [scr[block_label]] if block_label != None else list(scr)
+                    registers = [b[key] for b in blocks if b.has_register(key)]
+                    if registers:
+                        writes.append((scr.label, registers, value))
+                        found = True
+                if not found:
+                    raise KeyError('No register %s to write in %s' % ('.'.join([l for l in [scr_label, block_label, key] if l]), package))
+            groups.append(writes)
+        return groups
+
+    def compile(self, package):
+        """
+        Returns the steps for AbstractAdapter.stream and the adapter's compiled plan of them,
+        starting from the values last sent to every SCR written, or the defaults
+        """
+        groups = self.resolve(package)
+        scrs = []
+        for writes in groups:
+            for label, registers, value in writes:
+                if label not in scrs:
+                    scrs.append(label)
+        bases = {}
+        for label in scrs:
+            scr = package[label]
+            bases[label] = ''.join(scr.sent) if scr.is_sent else ''.join(scr.default)
+
+        connection = package.connection
+        layout = tuple([(label, tuple([r.global_extents for r in registers]), value) for writes in groups for label, registers, value in writes])
+        key = (type(getattr(connection, 'adapter', connection)), layout, tuple(sorted(bases.items())))
+        if key in self._compiled:
+            return self._compiled[key]
+
+        steps = []
+        state = dict([(label, list(bits)) for label, bits in bases.items()])
+        for writes in groups:
+            before = dict([(label, ''.join(bits)) for label, bits in state.items()])
+            for label, registers, value in writes:
+                send = state[label]
+                for register in registers:
+                    s,e = register.global_extents
+                    send[s:e] = list(register.reg_value_as_bin(value))
+                    # Auto-enable as Register.set does
+                    if register.enable_bit != None and register.root.autoenable:
+                        send[s - 1] = '1'
+            step = [(label, ''.join(state[label])) for label in scrs if ''.join(state[label]) != before[label]]
+            if step:
+                steps.append(step)
+
+        self.compiles += 1
+        self._compiled[key] = (steps, connection.compile_stream(steps))
+        return self._compiled[key]
+
+    def run(self, package):
+        """Compiles the sequence for the package, unless it already has been, and streams it to the device"""
+        steps, plan = self.compile(package)
+        package.connection.stream(plan)
+        return steps
+
+
+if __name__=='__main__' :
+    pass
@@ -4,10 +4,17 @@
 StatelessPackageF
 """
 
+import time
+
 from common.base import *
 from product.register import *
 from product.register_collection import *
 from product.serial_control_register import *
+from product.memory_report import memory_report
+from product.sweep import Sweep
+from product.packed import PackageLayout
+from product.watch import Watch
+from product.connection_adapters.abstract_adapter import AbstractAdapter
 from product.connection_adapters.connection_adapter_factory import *
 
 class Package(AppBase):
@@ -138,6 +145,13 @@ class Package(AppBase):
         self._process  = metadata.get('process', None)
         self._metadata = metadata
         
+        # Keep the layout so that the package can be cloned
+        self._definition = (metadata, common_block_registers, lane_registers, block_orientations, constants, limits, levels)
+        self._infer_enable = infer_enable
+
+        # Register layout used by snapshots, built on first use
+        self._snapshot_layout = None
+
         # Save limits and constants
         self._limits = limits
         self._levels = levels
@@ -157,8 +171,16 @@ class Package(AppBase):
             
         # Retrieve a connection adapter and connect if requested to do so
         self._connection = None
+        self._connect_time = None
         if connection_type != None:
             self.connect(connection_type)
+
+    def clone(self, connection_type = None):
+        """
+        Returns a new, unconnected package with the same layout as this one, for example
+        to drive another board of the same product without parsing the DES file again
+        """
+        return self.__class__(*(self._definition + (connection_type, self._infer_enable)))
             
  
     # References -----------------------------
@@ -235,6 +257,13 @@ class Package(AppBase):
         """Returns a dictionary containing information about this package."""
         return self._metadata
 
+    def memory_report(self):
+        """
+        Returns the memory retained by the package broken down by object type,
+        see product.memory_report for the layout of the report
+        """
+        return memory_report(self)
+
     @property
     def connection(self):
         """Returns the scale of the manufacturing process (65nm, 90nm, etc)."""
@@ -266,23 +295,45 @@ class Package(AppBase):
     # Connection management -----------------------------
 
 
-    def connect(self, adapter = None):
-        
+    def connect(self, adapter = None, state_dir = None, port = None):
+        """
+        Connects the package to the device via the adapter provided, which may be
+        an adapter type such as 'serial fpga', an adapter instance, or None to detect
+
+        state_dir : Optional directory in which adapters which support it persist the 
+        session state, so that the next connect to the same board resumes it
+
+        port : Optional address of the port the board is attached to, used when an
+        adapter has to be requested
+        """
+        start = time.time()
+        # Use an adapter instance as is, for example one built around a simulated port
+        if isinstance(adapter, AbstractAdapter):
+            self._connection = adapter
         # Retrieve or switch connection adapters if requested to do so
-        if self._connection == None or (adapter != None and adapter != self._connection.type):
+        elif self._connection == None or (adapter != None and adapter != self._connection.type):
             #try:
-            self._connection = ConnectionAdapterFactory.request(adapter)
+            self._connection = ConnectionAdapterFactory.request(adapter, port)
             #except LookupError, e:
             #self.log.warn(e)                
             #else:
                 # TODO: Destroy old session if it existed
             #    pass
+        if state_dir != None:
+            self._connection.state_dir = state_dir
         try:
             self._connection.connect(self)
         except LookupError, e:
             msg = 'Could not connect via %s adapter: %s' % (self._connection.type, e)
             self.log.error(msg)
             raise Exception(msg)
+        self._connect_time = time.time() - start
+        self.log.debug('Connected via %s in %.3f s' % (self._connection.type, self._connect_time))
+
+    @property
+    def connect_time(self):
+        """Seconds the most recent connect took, including adapter detection"""
+        return self._connect_time
 
     @property
     def connected(self):
@@ -354,6 +405,19 @@ class Package(AppBase):
         else:
             return None
 
+    def snapshot(self, source = 'retrieved'):
+        """
+        Returns a Snapshot of every register in the package decoded from the bits last retrieved,
+        the bits last sent or the defaults, see product.packed. Nothing is read from the device,
+        so refresh first for fresh retrieved values.
+        """
+        if source == 'default' or self.connected:
+            if self._snapshot_layout == None:
+                self._snapshot_layout = PackageLayout(self)
+            return self._snapshot_layout.snapshot(self, source)
+        else:
+            return None
+
 
     # Input Management --------------------------------------------
 
@@ -421,14 +485,28 @@ class Package(AppBase):
     # Output Management --------------------------------------------
 
 
-    def refresh(self):
+    def refresh(self, output_only = False, force = False):
         """
         Updates the gate's output buffer with fresh data from the device
             PC   Gate <- DUT
+        
+        output_only = True : Also retrieves the bytes which hold output registers (see 
+        SerialControlRegister.refresh)
+
+        force = True : Captures every SCR even if the adapter's readback cache holds a fresh capture
+        """
+        if self.connected:
+            for scr in self:
+                scr.refresh(output_only, force)
+
+    def set_readback_interest(self, keys = None):
+        """
+        Restricts the readback of every SCR to the registers matching the keys provided 
+        (see SerialControlRegister.set_readback_interest)
         """
         if self.connected:
             for scr in self:
-                scr.refresh()
+                scr.set_readback_interest(keys)
                 
     def inspect(self, key):
         """
@@ -456,6 +534,60 @@ class Package(AppBase):
         else:
             return None
 
+
+    # Combined Input / Output Management --------------------------------------------
+
+
+    def exchange(self, set_key, value, get_key):
+        """
+        Immediately sets the element identified by set_key to the value provided and then
+        gets all of the elements matching get_key from the device in a single round trip per SCR
+        which holds set_key. SCRs which hold set_key but not get_key are only set.
+            PC -> Gate -> DUT -> Gate -> PC
+        """
+        if self.connected:
+            scrs = [scr for scr in self if [block for block in scr if block.has_register(set_key)]]
+            if not scrs:
+                raise KeyError('No register %s to set in %s' % (set_key, self))
+            if not [scr for scr in scrs if [block for block in scr if block.has_register(get_key)]]:
+                raise KeyError('No register %s to get in %s' % (get_key, self))
+            results = {}
+            for scr in scrs:
+                if [block for block in scr if block.has_register(get_key)]:
+                    results[scr.label] = scr.exchange(set_key, value, get_key)
+                else:
+                    scr.set(set_key, value)
+            return results
+        else:
+            return None
+
+    def sweep(self, axes, measure = None):
+        """
+        Steps the registers through every combination of the values of the axes, a list of
+        (key, values) pairs, in every SCR which holds them, calling measure with each point
+        once it is set. Returns a list of (point, measurement) pairs, see product.sweep.
+            (PC -> Gate -> DUT, measure) x points
+        """
+        if self.connected:
+            return Sweep(self, axes).run(measure)
+        else:
+            return None
+
+    def watch(self, keys = None, interval = 0.1, callback = None):
+        """
+        Starts watching the registers matching the keys, by default every output register, from a
+        background thread which calls back with the registers that changed every interval.
+        Returns the running Watch, see product.watch. The package must be connected through a
+        ThreadedAdapter so that the watch can share it with the foreground.
+            (Gate <- DUT, PC <- Gate Out) every interval
+        """
+        if self.connected:
+            watch = Watch(self, keys, interval, callback)
+            watch.start()
+            return watch
+        else:
+            return None
+
     # Iterator
 
     def __iter__(self):
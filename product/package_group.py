@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+"""
+PackageGroup
+
+    Drives several test boards carrying the same product from one parsed Package.
+    The layout is cloned once per board and every operation on the group is run
+    on all of the boards concurrently, returning a dictionary of board:result pairs.
+
+    Boards are driven by a pool of threads rather than processes, since each board's
+    adapter owns an open port and the session state of its package, neither of which
+    can be handed to another process. The port I/O releases the GIL, so the boards
+    run in parallel.
+
+    Example
+        dut = Package.from_txt_file('DES_65nm_Fuji.txt')
+        boards = PackageGroup.from_ports(dut, {'board_a':0, 'board_b':1}, 'serial fpga')
+        boards.connect()
+        boards.set('TX_AMP', 10)
+        boards.get('STATUS')                   # {'board_a':{'top':{...}}, 'board_b':{...}}
+        boards.map(run_procedure, 0.95)        # run_procedure(package, 0.95) on every board
+"""
+
+from multiprocessing.pool import ThreadPool
+
+from common.base import *
+from product.package import *
+
+class PackageGroup(AppBase):
+    """
+    A PackageGroup clones one package layout onto a number of boards, each reached through
+    its own connection adapter, and fans operations out across the boards.
+    """
+
+    entity_name = 'package_group'
+    entity_atts = ['boards']
+
+
+    # Class Constructors -----------------------------
+
+
+    @classmethod
+    def from_ports(cls, package, ports, adapter = None, workers = None):
+        """
+        Constructor which requests one adapter per port address
+        ports   : Dictionary of board label:port address pairs, or a list of port addresses
+        adapter : Adapter type such as 'serial fpga', or None to detect it on every port
+        """
+        if not isinstance(ports, dict):
+            ports = dict([('board_%s' % i, port) for i, port in enumerate(ports)])
+        adapters = {}
+        for label in ports:
+            adapters[label] = ConnectionAdapterFactory.request(adapter, ports[label])
+        return cls(package, adapters, workers)
+
+
+    # Instance Constructor -----------------------------
+
+
+    def __init__(self, package, adapters, workers = None):
+        """
+        package  : Package whose layout is cloned for every board
+        adapters : Dictionary of board label:adapter instance pairs, or a list of adapter
+                   instances which are labeled board_0, board_1, ...
+        workers  : Number of threads driving the boards, defaults to one per board
+        """
+        # Prepare Parent
+        super(PackageGroup, self).__init__()
+
+        if not isinstance(adapters, dict):
+            adapters = dict([('board_%s' % i, adapter) for i, adapter in enumerate(adapters)])
+        if len(adapters) == 0:
+            raise ValueError('A package group needs at least one board')
+
+        self._adapters = adapters
+        self._packages = {}
+        for label in adapters:
+            self._packages[label] = package.clone()
+
+        # Raise an exception after an operation fails on any of the boards
+        self.raise_errors = True
+
+        self._pool = ThreadPool(workers if workers != None else len(adapters))
+
+
+    # References -----------------------------
+
+
+    def __len__(self):
+        """Returns the number of boards in the group"""
+        return len(self._packages)
+
+    def __getitem__(self, label):
+        """Returns the package of the board specified"""
+        return self._packages[label]
+
+    def __iter__(self):
+        """Iterates over the packages of the boards in label order"""
+        return iter([self._packages[label] for label in self.boards])
+
+    @property
+    def boards(self):
+        """Returns the sorted board labels"""
+        return sorted(self._packages.keys())
+
+    @property
+    def adapters(self):
+        """Returns a dictionary of board label:adapter pairs"""
+        return self._adapters
+
+
+    # Fan Out -----------------------------
+
+
+    def map(self, function, *args, **kwargs):
+        """
+        Calls function(package, *args, **kwargs) for the package of every board concurrently
+        and returns a dictionary of board label:result pairs. If any of the boards fail, an
+        exception naming them is raised once every board is done, unless raise_errors is False,
+        in which case the result of a failed board is the exception it raised.
+        """
+        def call(label):
+            return function(self._packages[label], *args, **kwargs)
+        return self._run(getattr(function, '__name__', '%s' % function), call)
+
+    def _run(self, name, call):
+        """Calls call(label) for every board on the pool, see map"""
+        def guarded(label):
+            try:
+                return call(label)
+            except Exception, e:
+                self.log.exception('%s failed on %s' % (name, label))
+                return e
+        labels = self.boards
+        results = dict(zip(labels, self._pool.map(guarded, labels)))
+        failed = [label for label in labels if isinstance(results[label], Exception)]
+        if failed and self.raise_errors:
+            raise Exception('%s failed on %s: %s' % (name, ', '.join(failed), '; '.join(['%s' % results[label] for label in failed])))
+        return results
+
+    def _fan_out(self, method, *args):
+        """Calls the package method on every board, see map"""
+        def call(label):
+            return getattr(self._packages[label], method)(*args)
+        return self._run(method, call)
+
+
+    # Connection management -----------------------------
+
+
+    def connect(self, state_dir = None):
+        """Connects the package of every board to its adapter, see Package.connect"""
+        def call(label):
+            self._packages[label].connect(self._adapters[label], state_dir)
+        self._run('connect', call)
+
+    @property
+    def connected(self):
+        """Whether or not every board is connected"""
+        for package in self:
+            if not package.connected:
+                return False
+        return True
+
+    def close(self):
+        """Stops the threads driving the boards"""
+        self._pool.close()
+        self._pool.join()
+
+
+    # Package API -----------------------------
+
+
+    def reset(self):
+        """Resets every board, see Package.reset"""
+        return self._fan_out('reset')
+
+    def prepare(self, key, value):
+        """Prepares the value on every board, see Package.prepare"""
+        return self._fan_out('prepare', key, value)
+
+    def check(self, key):
+        """Returns the prepared values of every board, see Package.check"""
+        return self._fan_out('check', key)
+
+    def clear(self):
+        """Clears the prepared values of every board, see Package.clear"""
+        return self._fan_out('clear')
+
+    def commit(self):
+        """Commits the prepared values of every board, see Package.commit"""
+        return self._fan_out('commit')
+
+    def set(self, key, value):
+        """Sets the value on every board, see Package.set"""
+        return self._fan_out('set', key, value)
+
+    def refresh(self, output_only = False):
+        """Refreshes every board, see Package.refresh"""
+        return self._fan_out('refresh', output_only)
+
+    def set_readback_interest(self, keys = None):
+        """Restricts the readback of every board, see Package.set_readback_interest"""
+        return self._fan_out('set_readback_interest', keys)
+
+    def inspect(self, key):
+        """Returns the retrieved values of every board, see Package.inspect"""
+        return self._fan_out('inspect', key)
+
+    def get(self, key):
+        """Gets the values of every board, see Package.get"""
+        return self._fan_out('get', key)
+
+    def exchange(self, set_key, value, get_key):
+        """Sets and gets in a single round trip per SCR on every board, see Package.exchange"""
+        return self._fan_out('exchange', set_key, value, get_key)
+
+
+if __name__=='__main__' :
+    pass
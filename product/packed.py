@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+"""
+Packed
+
+    Decodes and encodes one register across every lane of an SCR in a single
+    pass over the SCR's bit list, rather than a register at a time. Values are
+    held in arrays indexed by lane id.
+
+    numpy is used when it is installed, in which case decoding is a gather of
+    every lane's bits followed by one weighted sum and encoding is one scatter
+    into the send buffer. Without numpy the same work is done with lists, and
+    lists take the place of arrays.
+
+    Registers are stored LSB first, see Register.inverted_bit_array_to_int, so
+    bit i of a lane's register sits at its start index plus i.
+
+    PackageLayout does the same for every register of every block of every SCR
+    in a package, decoding the default, sent or retrieved bits into a Snapshot,
+    which holds one value per register and diffs against another snapshot with
+    one comparison.
+
+    Example
+        layout = LaneLayout(dut.top, 'TX_AMP')
+        values = layout.decode(dut.top.session.retrieved)
+        send   = layout.encode(dut.top.sent, [3, 7, 7, 3])
+
+        before = dut.snapshot('sent')
+        procedure(dut)
+        for key, old, new in dut.snapshot('sent').diff(before):
+            print '%s.%s.%s : %s => %s' % (key + (old, new))
+"""
+
+from common.base import *
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class LaneLayout(object):
+    """Bit positions of one register in every lane of an SCR"""
+
+    def __init__(self, scr, key):
+        """
+        scr : SerialControlRegister
+        key : Register found in the lanes of the SCR
+        """
+        self.key = key
+        # Lanes holding the register as [(lane id, start index), ...]
+        self.lanes = []
+        self.width = None
+        for lane_id, block in scr.lanes.items():
+            if block.has_register(key):
+                register = block[key]
+                self.lanes.append((int(lane_id), register.global_extents[0]))
+                self.width = register.width
+        if not self.lanes:
+            raise KeyError('No lane register %s in %s' % (key, scr))
+        self.lanes.sort()
+        self.size = self.lanes[-1][0] + 1
+        self.lane_ids = [lane_id for lane_id, start in self.lanes]
+
+        if numpy != None:
+            starts = numpy.array([start for lane_id, start in self.lanes])
+            self._ids     = numpy.array(self.lane_ids)
+            self._indexes = starts[:, None] + numpy.arange(self.width)
+            self._weights = numpy.left_shift(1, numpy.arange(self.width, dtype = numpy.int64))
+
+    def selected(self, mask = None):
+        """Returns the positions in self.lanes of the lanes the mask, indexed by lane id, selects"""
+        if mask is None:
+            return range(len(self.lanes))
+        return [i for i, lane_id in enumerate(self.lane_ids) if lane_id < len(mask) and mask[lane_id]]
+
+    def decode(self, bits, mask = None):
+        """
+        Returns the register value of every lane from the bit list provided. Lanes the SCR does
+        not have, lanes the mask leaves out and lanes with unknown bits are masked, or None
+        without numpy. A plain array is returned when no lane is masked.
+        """
+        selected = self.selected(mask)
+        if numpy == None:
+            values = [None] * self.size
+            for i in selected:
+                lane_id, start = self.lanes[i]
+                lane_bits = bits[start:start + self.width]
+                if None not in lane_bits:
+                    values[lane_id] = int(''.join(lane_bits)[::-1], 2)
+            return values
+
+        # Bits as a lane x bit array
+        gathered = numpy.array(bits, dtype = object)[self._indexes]
+        values = numpy.zeros(self.size, dtype = numpy.int64)
+        values[self._ids] = ((gathered == '1') * self._weights).sum(axis = 1)
+
+        masked = numpy.ones(self.size, dtype = bool)
+        masked[self._ids[selected]] = False
+        masked[self._ids[numpy.equal(gathered, None).any(axis = 1)]] = True
+        if masked.any():
+            return numpy.ma.masked_array(values, masked)
+        return values
+
+    def encode(self, bits, values, mask = None):
+        """
+        Returns the bit string with the register of every lane the mask selects replaced by its
+        entry in values, which is indexed by lane id
+        """
+        selected = self.selected(mask)
+        limit = 1 << self.width
+        for i in selected:
+            value = values[self.lane_ids[i]]
+            if not 0 <= value < limit:
+                raise ValueError('%s is not a valid %d bit value for %s of lane %s' % (value, self.width, self.key, self.lane_ids[i]))
+        if numpy == None:
+            send = list(bits)
+            for i in selected:
+                lane_id, start = self.lanes[i]
+                send[start:start + self.width] = list(int_to_bin(values[lane_id], self.width)[::-1])
+            return ''.join(send)
+
+        send = numpy.array(list(bits), dtype = 'S1')
+        lane_values = numpy.asarray(values, dtype = numpy.int64)[self._ids[selected]]
+        lane_bits = numpy.right_shift(lane_values[:, None], numpy.arange(self.width)) & 1
+        send[self._indexes[selected]] = numpy.where(lane_bits, '1', '0')
+        return send.tostring()
+
+
+SOURCES = ['retrieved', 'sent', 'default']
+
+# Widths beyond which register values no longer fit in a 64 bit integer
+MAX_INT64_WIDTH = 62
+
+class PackageLayout(object):
+    """Bit positions of every register of a package, row by row"""
+
+    def __init__(self, package):
+        # Registers as [(scr label, block label, register label), ...] and their bits
+        self.keys   = []
+        self.starts = []
+        self.widths = []
+        # SCRs as [(scr label, first row, end row), ...]
+        self.scrs   = []
+        for label in sorted(package.orientations.keys()):
+            scr = package[label]
+            first = len(self.keys)
+            for block in scr:
+                for register in block:
+                    self.keys.append((scr.label, block.label, register.label))
+                    self.starts.append(register.global_extents[0])
+                    self.widths.append(register.width)
+            self.scrs.append((scr.label, first, len(self.keys)))
+        self.rows = dict([(key, row) for row, key in enumerate(self.keys)])
+
+        if numpy != None:
+            width = max(self.widths)
+            dtype = numpy.int64 if width <= MAX_INT64_WIDTH else object
+            offsets = numpy.arange(width)
+            widths  = numpy.array(self.widths)[:, None]
+            # Every register padded to the widest, where the padding points at bit 0 and weighs nothing
+            self._valid   = offsets < widths
+            self._indexes = numpy.where(self._valid, numpy.array(self.starts)[:, None] + offsets, 0)
+            self._weights = numpy.where(self._valid, numpy.array([1 << i for i in range(width)], dtype = dtype), 0).astype(dtype)
+
+    def decode(self, buffers):
+        """
+        Returns (values, known) for the bit lists provided as {scr label:bits}, where known is
+        False for the registers holding a bit which is None
+        """
+        if numpy == None:
+            values, known = [], []
+            for label, first, end in self.scrs:
+                bits = list(buffers[label])
+                for row in range(first, end):
+                    register_bits = bits[self.starts[row]:self.starts[row] + self.widths[row]]
+                    known.append(None not in register_bits)
+                    values.append(int(''.join(register_bits)[::-1], 2) if known[-1] else 0)
+            return values, known
+
+        values = numpy.zeros(len(self.keys), dtype = self._weights.dtype)
+        known  = numpy.zeros(len(self.keys), dtype = bool)
+        for label, first, end in self.scrs:
+            gathered = numpy.array(list(buffers[label]), dtype = object)[self._indexes[first:end]]
+            values[first:end] = ((gathered == '1') * self._weights[first:end]).sum(axis = 1)
+            known[first:end]  = ~(numpy.equal(gathered, None) & self._valid[first:end]).any(axis = 1)
+        return values, known
+
+    def snapshot(self, package, source = 'retrieved'):
+        """Returns a Snapshot of the package's default, sent or retrieved bits"""
+        if source not in SOURCES:
+            raise ValueError('Unknown snapshot source %s, expected one of %s' % (source, ', '.join(SOURCES)))
+        buffers = {}
+        for label, first, end in self.scrs:
+            if source == 'default':
+                buffers[label] = package[label].default
+            else:
+                buffers[label] = getattr(package.connection[label], source)
+        values, known = self.decode(buffers)
+        return Snapshot(self, source, values, known)
+
+
+class Snapshot(object):
+    """The value of every register of a package at one moment"""
+
+    def __init__(self, layout, source, values, known):
+        self.layout = layout
+        self.source = source
+        self.values = values
+        self.known  = known
+
+    def __len__(self):
+        return len(self.layout.keys)
+
+    def __getitem__(self, key):
+        """Returns the value of the register identified by (scr label, block label, register label), or None if unknown"""
+        row = self.layout.rows[(key[0].lower(), key[1].lower(), key[2].upper())]
+        return int(self.values[row]) if self.known[row] else None
+
+    def as_dict(self):
+        """Returns the snapshot as {scr label:{block label:{register label:value}}}"""
+        results = {}
+        for row, (scr, block, register) in enumerate(self.layout.keys):
+            value = int(self.values[row]) if self.known[row] else None
+            results.setdefault(scr, {}).setdefault(block, {})[register] = value
+        return results
+
+    def diff(self, other):
+        """
+        Returns [(key, other value, value), ...] for every register whose value differs from the
+        other snapshot, which must be of the same package
+        """
+        if other.layout is not self.layout:
+            raise ValueError('Snapshots of different packages can not be compared')
+        if numpy == None:
+            rows = [row for row in range(len(self)) if (self.values[row], self.known[row]) != (other.values[row], other.known[row])]
+        else:
+            rows = numpy.nonzero((self.values != other.values) | (self.known != other.known))[0]
+        return [(self.layout.keys[row], other[self.layout.keys[row]], self[self.layout.keys[row]]) for row in rows]
+
+
+if __name__=='__main__' :
+    pass
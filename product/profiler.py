@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+"""
+Profiler
+
+    Runs a procedure script under cProfile with the DES file and the connection
+    adapter substituted, so that a procedure written for a test board can be
+    profiled on any PC. Every Package the script loads is built from the DES
+    file provided, and every connect is made through a MockAdapter or through an
+    FPGA serial adapter driving a SimulatedFPGASocket.
+
+    The profile is reported as
+        collapsed stacks   One 'frame;frame;frame microseconds' line per stack, the input
+                           of flamegraph.pl and speedscope. cProfile only records callers,
+                           so time is split between the stacks leading to a function in
+                           proportion to the time each caller spent in it.
+        hot functions      The functions with the most self time and the self time of
+                           every subsystem (common.hierarchy, product, connection_adapters,
+                           io_ports)
+
+    Usage
+        python product/profiler.py -d DES_65nm_Fuji.txt -a simulator product/tests/tool_scr_inspector.py
+        python product/profiler.py -d DES_65nm_Fuji.txt -o inspector.collapsed -s inspector.pstats -n 40 procedure.py
+"""
+
+import cProfile
+import pstats
+import sys
+
+from optparse import OptionParser
+
+from common.base import *
+from product.package import Package
+from product.connection_adapters.mock_adapter import MockAdapter
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+from io_ports.io_port_simulator import SimulatedFPGASocket
+
+ROOT = exepath('..')
+
+# Subsystems as (name, path prefix relative to the repository), the first match wins
+SUBSYSTEMS = [
+    ('common.hierarchy',    'common/hierarchy.py'),
+    ('common',              'common/'),
+    ('connection_adapters', 'product/connection_adapters/'),
+    ('product',             'product/'),
+    ('io_ports',            'io_ports/')
+    ]
+
+# Adapters which stand in for the test board, as name : function taking the package
+ADAPTERS = {
+    'mock'      : lambda package: MockAdapter(),
+    'simulator' : lambda package: FPGASerialAdapter(SimulatedFPGASocket(package))
+    }
+
+# Stacks which account for less time than this are dropped from the collapsed output
+MIN_STACK_SECONDS = 1e-6
+
+
+# Substitution -----------------------------
+
+
+class Substitution(object):
+    """Points Package.from_txt_file at a DES file and Package.connect at a stand in adapter"""
+
+    def __init__(self, des_file = None, adapter = 'mock'):
+        self.des_file = des_file
+        self.adapter  = adapter
+        self._originals = []
+
+    def apply(self):
+        """Replaces the Package methods"""
+        if self.des_file != None:
+            des_file = self.des_file
+            load = Package.from_txt_file.im_func
+            self._replace(Package, 'from_txt_file', classmethod(lambda cls, filepath, *args, **keyw: load(cls, des_file, *args, **keyw)))
+        if self.adapter != None:
+            factory = ADAPTERS[self.adapter]
+            connect = Package.__dict__['connect']
+            self._replace(Package, 'connect', lambda package, adapter = None, state_dir = None, port = None: connect(package, factory(package), state_dir))
+
+    def _replace(self, cls, name, replacement):
+        self._originals.append((cls, name, cls.__dict__[name]))
+        setattr(cls, name, replacement)
+
+    def restore(self):
+        """Restores the Package methods"""
+        while self._originals:
+            cls, name, original = self._originals.pop()
+            setattr(cls, name, original)
+
+
+# Profiling -----------------------------
+
+
+def profile_call(function, *args, **keyw):
+    """Returns (result, pstats.Stats) for the call of function"""
+    profile = cProfile.Profile()
+    result = profile.runcall(function, *args, **keyw)
+    return result, pstats.Stats(profile)
+
+def profile_script(script, args = None, des_file = None, adapter = 'mock', raise_errors = True):
+    """
+    Runs the script as __main__ with the substitutions applied and returns its pstats.Stats.
+    If raise_errors is False, an exception raised by the script is logged and the profile
+    of the run up to the exception is returned.
+    """
+    substitution = Substitution(des_file, adapter)
+    namespace = {'__name__':'__main__', '__file__':script}
+    profile = cProfile.Profile()
+    argv = sys.argv
+    sys.argv = [script] + list(args or [])
+    substitution.apply()
+    try:
+        try:
+            profile.runcall(execfile, script, namespace)
+        except Exception:
+            if raise_errors:
+                raise
+            logging.getLogger('root').exception('%s raised an exception, the profile ends there' % script)
+    finally:
+        substitution.restore()
+        sys.argv = argv
+    return pstats.Stats(profile)
+
+def subsystem(filename):
+    """Returns the subsystem the source file belongs to, or None if it is outside of the repository"""
+    path = os.path.abspath(filename)
+    if not path.startswith(ROOT):
+        return None
+    path = path[len(ROOT):].lstrip(os.sep).replace(os.sep, '/')
+    for name, prefix in SUBSYSTEMS:
+        if path.startswith(prefix):
+            return name
+    return None
+
+def frame_label(function):
+    """Returns the label of a pstats function key (filename, line, name)"""
+    filename, line, name = function
+    if filename == '~':
+        return name
+    path = os.path.abspath(filename)
+    if path.startswith(ROOT):
+        path = path[len(ROOT):].lstrip(os.sep)
+    else:
+        path = os.path.basename(path)
+    return '%s:%s:%s' % (path.replace(os.sep, '/'), line, name)
+
+
+# Reports -----------------------------
+
+
+def collapsed_stacks(stats, max_depth = 64):
+    """Returns a list of 'frame;frame;frame microseconds' lines"""
+    entries = stats.stats
+    callees = {}
+    for function, (cc, nc, tt, ct, callers) in entries.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(function)
+    roots = [f for f, entry in entries.items() if not entry[4]]
+    totals = {}
+
+    def walk(function, stack, fraction):
+        tt, ct = entries[function][2], entries[function][3]
+        if tt * fraction >= MIN_STACK_SECONDS:
+            key = ';'.join([frame_label(f) for f in stack])
+            totals[key] = totals.get(key, 0) + tt * fraction
+        if len(stack) >= max_depth:
+            return
+        for callee in callees.get(function, []):
+            if callee in stack:
+                continue
+            callee_ct = entries[callee][3]
+            edge_ct = entries[callee][4][function][3]
+            share = fraction * edge_ct / callee_ct if callee_ct else 0
+            if callee_ct * share >= MIN_STACK_SECONDS:
+                walk(callee, stack + [callee], share)
+
+    for root in roots:
+        walk(root, [root], 1.0)
+    return ['%s %d' % (key, int(round(seconds * 1e6))) for key, seconds in sorted(totals.items()) if round(seconds * 1e6) > 0]
+
+def hot_functions(stats, limit = 25):
+    """Returns a list of (label, subsystem, calls, self seconds, cumulative seconds), the most self time first"""
+    rows = []
+    for function, (cc, nc, tt, ct, callers) in stats.stats.items():
+        rows.append((frame_label(function), subsystem(function[0]), nc, tt, ct))
+    rows.sort(key = lambda row: row[3], reverse = True)
+    return rows[:limit]
+
+def subsystem_totals(stats):
+    """Returns a dictionary of subsystem : self seconds, where None holds the time outside of the repository"""
+    totals = {}
+    for function, (cc, nc, tt, ct, callers) in stats.stats.items():
+        name = subsystem(function[0])
+        totals[name] = totals.get(name, 0.0) + tt
+    return totals
+
+def format_hot_functions(stats, limit = 25):
+    """Returns the hot functions and the subsystem totals as text tables"""
+    lines = ['%-60s %-20s %10s %10s %10s' % ('FUNCTION', 'SUBSYSTEM', 'CALLS', 'SELF', 'CUMULATIVE')]
+    for label, name, calls, tt, ct in hot_functions(stats, limit):
+        lines.append('%-60s %-20s %10s %10.4f %10.4f' % (label[-60:], name or '-', calls, tt, ct))
+    lines.append('')
+    lines.append('%-20s %10s' % ('SUBSYSTEM', 'SELF'))
+    totals = subsystem_totals(stats)
+    for name in sorted(totals, key = lambda n: totals[n], reverse = True):
+        lines.append('%-20s %10.4f' % (name or '-', totals[name]))
+    return '\n'.join(lines)
+
+
+# Command Line -----------------------------
+
+
+def main(argv = None):
+    """Profiles a procedure script and writes the reports"""
+    parser = OptionParser(usage = '%prog [options] SCRIPT [ARGS]')
+    parser.disable_interspersed_args()
+    parser.add_option('-d', '--des', default = None, help = 'DES file every Package is loaded from')
+    parser.add_option('-a', '--adapter', default = 'mock', choices = sorted(ADAPTERS.keys()) + ['none'], help = 'Adapter every connect is made through, mock, simulator or none')
+    parser.add_option('-o', '--collapsed', default = None, help = 'File the collapsed stacks are written to')
+    parser.add_option('-s', '--stats', default = None, help = 'File the raw pstats are written to')
+    parser.add_option('-n', '--top', type = 'int', default = 25, help = 'Number of hot functions listed')
+    options, args = parser.parse_args(argv)
+    if not args:
+        parser.error('A script to profile is required')
+
+    stats = profile_script(args[0], args[1:], options.des, None if options.adapter == 'none' else options.adapter, False)
+    if options.collapsed != None:
+        f = open(options.collapsed, 'w')
+        try:
+            f.write('\n'.join(collapsed_stacks(stats)) + '\n')
+        finally:
+            f.close()
+    if options.stats != None:
+        stats.dump_stats(options.stats)
+    print format_hot_functions(stats, options.top)
+    return 0
+
+
+if __name__=='__main__' :
+    sys.exit(main())
@@ -6,6 +6,7 @@ Register
 
 from common.hierarchy import *
 from product.bit_address import *
+from product.operation_sequence import OperationSequence
 
 class Register(Node):
     """
@@ -373,24 +374,26 @@ class Register(Node):
             register.set(0)
             register.set(1)
             register.set(0)
+
+        The three values are compiled into an OperationSequence and streamed, one port call each.
         """
         if self.connected:
-            self.set(0)
-            self.set(1)
-            self.set(0)
+            OperationSequence().toggle(self).run(self.root.package)
         else:
             return None
 
     # Output Management --------------------------------------------
 
 
-    def refresh(self):
+    def refresh(self, force = False):
         """
         Updates the gate's output buffer with fresh data from the device.
             PC   Gate <- DUT
+
+        force = True : Captures the SCR even if the adapter's readback cache holds a fresh capture
         """
         if self.connected:
-            self.root.connection.refresh(self.root.label)
+            self.root.connection.refresh(self.root.label, False, force)
 
     def inspect(self):
         """
@@ -303,13 +303,15 @@ class RegisterCollection(Node):
     # Output Management --------------------------------------------
 
 
-    def refresh(self):
+    def refresh(self, force = False):
         """
         Updates the gate's output buffer with fresh data from the device.
             PC   Gate <- DUT
+
+        force = True : Captures the SCR even if the adapter's readback cache holds a fresh capture
         """
         if self.connected:
-            self.root.connection.refresh(self.root.label)
+            self.root.connection.refresh(self.root.label, False, force)
 
     def inspect(self, key):
         """
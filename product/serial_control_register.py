@@ -8,13 +8,20 @@ from common.hierarchy import *
 from common.insensitive_dict import InsensitiveDict
 from product.register import *
 from product.register_collection import *
+from product.sweep import Sweep
+from product.trim import Trim
+from product.packed import LaneLayout
 
+# Characters which identify the lanes in an orientation sequence, each lane's id is its position.
+# X is left out as it marks the common block.
+LANE_CHARACTERS = '0123456789ABCDEFGHIJKLMNOPQRSTUVW'
 
 
 class SerialControlRegister(Node):
     """
     Serial Control Registers are made up of exactly one Common Block and some number of Lanes 
     Examples: 01234567C, 0123C4567, C0123, 0C1
+    Lanes beyond 9 are identified by the letters A to W, so 0123456789ABCDEFX holds 16 lanes
     """
 
     entity_name = 'serial_control_register'
@@ -46,11 +53,14 @@ class SerialControlRegister(Node):
         # Get path through sequence
         self._scr_sequence = self._calculate_scr_block_path(self._block_orientation)
         # Capture the highest lane id for use in validation
-        self._max_lane_id = int(max(self._scr_sequence[1:])) # This will need to change if we move the FPGA mirroring
+        self._max_lane_id = max([LANE_CHARACTERS.index(c) for c in self._scr_sequence[1:]]) # This will need to change if we move the FPGA mirroring
         
         #self.log.debug('scr_sequence: %s' % self._scr_sequence) 
         #self.log.debug('Greatest lane id: %s' % self._max_lane_id)   
 
+        # Lane layouts of the registers read and written as vectors
+        self._lane_layouts = {}
+
         self._lanes = InsensitiveDict()
         for char in self._scr_sequence:
             if char == 'X':
@@ -59,9 +69,9 @@ class SerialControlRegister(Node):
                 self._common_block = block
             else:
                 unique_lane_registers = self._clone_block(lane_registers)
-                lane_id = 'lane_%s' % char
+                lane_id = 'lane_%s' % LANE_CHARACTERS.index(char)
                 block = RegisterCollection(unique_lane_registers, 'lane', lane_id)
-                self._lanes[int(char)] = block
+                self._lanes[LANE_CHARACTERS.index(char)] = block
                 # Metaprogram reference to children
                 append_reference(self, lane_id, block)
             self.add_node(block)
@@ -124,6 +134,15 @@ class SerialControlRegister(Node):
                 raise LookupError('Could not find node %s' % label_or_index)
         return n
 
+    @property
+    def io_map(self):
+        """Returns a string holding the direction, I or O, of the register at every bit address in the SCR"""
+        io = []
+        for block in self:
+            for i in xrange(block.width):
+                io.append(block.register_at_bit_address(i).direction)
+        return ''.join(io)
+
     def bit_address_map(self, highlight_register = None):
         """Writes the serial control registers bit address map to the logger"""
 
@@ -134,8 +153,8 @@ class SerialControlRegister(Node):
                 for register in self.common_block.registers:
                     self.log.debug('CB.%s.%s = %s' %(register.direction, register.label, register.default))
             else:
-                for register in self['lane_%s' % block].registers:
-                    self.log.debug('L%s.%s.%s = %s' %(block, register.direction, register.label, register.default))
+                for register in self['lane_%s' % LANE_CHARACTERS.index(block)].registers:
+                    self.log.debug('L%s.%s.%s = %s' %(LANE_CHARACTERS.index(block), register.direction, register.label, register.default))
                     
         self.log.debug('----------------------------- Bit Address Map')
         highlight = []
@@ -162,9 +181,10 @@ class SerialControlRegister(Node):
                         highlight.append('_')
                     base +=1
             else:
-                for i in xrange(self['lane_%s' % block].width):
-                    register = self['lane_%s' % block].register_at_bit_address(i)
-                    self.log.debug('%s L%s.%s.%s = %s' %(base, block, register.direction, register.label, register.default))
+                lane = self['lane_%s' % LANE_CHARACTERS.index(block)]
+                for i in xrange(lane.width):
+                    register = lane.register_at_bit_address(i)
+                    self.log.debug('%s L%s.%s.%s = %s' %(base, LANE_CHARACTERS.index(block), register.direction, register.label, register.default))
                     
                     # Build I/O map
                     io.append(register.direction)
@@ -338,7 +358,7 @@ class SerialControlRegister(Node):
                 local_index = int((index - cb_width) % lane_width)
                 path_index = int(math.floor((index - cb_width) / lane_width))
                 base = cb_width + (lane_width * path_index)
-                lane_id = int(scr_path_ref[1 + path_index])
+                lane_id = LANE_CHARACTERS.index(scr_path_ref[1 + path_index])
                 block_label = self.lanes[lane_id].label
                 register = self.lanes[lane_id].register_at_bit_address(local_index)
 
@@ -548,13 +568,36 @@ class SerialControlRegister(Node):
     # Output Management --------------------------------------------
 
 
-    def refresh(self):
+    def refresh(self, output_only = False, force = False):
         """
         Updates the gate's output buffer with fresh data from the device
             PC   Gate <- DUT
+        
+        output_only = True : Also retrieves the bytes which hold output registers (or the 
+        readback interest, see set_readback_interest) from the gate's output buffer
+            PC <- Gate <- DUT
+
+        force = True : Captures the SCR even if the adapter's readback cache holds a fresh 
+        capture, see AbstractAdapter.set_readback_window
         """
         if self.connected:
-            self.root.connection.refresh(self.root.label)
+            self.root.connection.refresh(self.root.label, output_only, force)
+
+    def set_readback_interest(self, keys = None):
+        """
+        Restricts the readback performed by refresh(output_only = True) and target switches 
+        to the registers matching the keys provided. None restores the output registers.
+        """
+        if self.connected:
+            if keys == None:
+                self.root.connection.set_readback_interest(self.root.label, None)
+            else:
+                extents = []
+                for key in keys:
+                    for block in self:
+                        if block.has_register(key):
+                            extents.append(block[key].global_extents)
+                self.root.connection.set_readback_interest(self.root.label, extents)
 
     def inspect(self, key):
         """
@@ -589,6 +632,100 @@ class SerialControlRegister(Node):
             return None
 
 
+    def lane_layout(self, key):
+        """Returns the LaneLayout of the register identified by key, see product.packed"""
+        layout = self._lane_layouts.get(key.upper())
+        if layout == None:
+            layout = self._lane_layouts[key.upper()] = LaneLayout(self, key)
+        return layout
+
+    def vector(self, key, mask = None):
+        """
+        Immediately gets the lane register identified by key from the device and returns its
+        value in every lane as an array indexed by lane id. Lanes which are left out of the
+        optional mask, also indexed by lane id, are masked in the array.
+            PC <- Gate <- DUT
+        """
+        if self.connected:
+            self.root.connection.refresh(self.root.label)
+            self.root.connection.inspect(self.root.label, self.global_extents)
+            return self.lane_layout(key).decode(self.session.retrieved, mask)
+        else:
+            return None
+
+    def set_vector(self, key, values, mask = None):
+        """
+        Immediately sets the lane register identified by key in every lane to its entry in values,
+        indexed by lane id, in a single send. Lanes which are left out of the optional mask keep
+        their last sent value.
+            PC -> Gate -> DUT
+        """
+        if self.connected:
+            # Begin with last sent values or the defaults if the buffer has never been commited
+            send = self.sent if self.is_sent else self.default
+            send = self.lane_layout(key).encode(send, values, mask)
+            self.root.connection.set(self.root.label, self.global_index, send)
+
+
+    # Combined Input / Output Management --------------------------------------------
+
+
+    def exchange(self, set_key, value, get_key):
+        """
+        Immediately sets the element identified by set_key to the value provided and then
+        gets all of the elements matching get_key from the device in a single round trip
+            PC -> Gate -> DUT -> Gate -> PC
+        """
+        if self.connected:
+            # Begin with last sent values or the defaults if the buffer has never been commited
+            send = list(self.sent) if self.is_sent else list(self.default)
+            blocks = [block for block in self if block.has_register(set_key)]
+            if not blocks:
+                raise KeyError('No register %s to set in %s' % (set_key, self))
+            for block in blocks:
+                binary_value = block[set_key].reg_value_as_bin(value)
+                s,e = block[set_key].global_extents
+                send[s:e] = list(binary_value)
+            # Only read back the extents which hold the requested elements
+            extents = [block[get_key].global_extents for block in self if block.has_register(get_key)]
+            if not extents:
+                raise KeyError('No register %s to get in %s' % (get_key, self))
+            self.root.connection.exchange(self.root.label, self.global_index, ''.join(send), extents)
+            results = {}
+            for block in self:
+                if block.has_register(get_key):
+                    results[block.label] = block[get_key].retrieved
+            return results
+        else:
+            return None
+
+    def sweep(self, axes, measure = None):
+        """
+        Steps the registers through every combination of the values of the axes, a list of
+        (key, values) pairs, calling measure with each point once it is set. Returns a list of
+        (point, measurement) pairs, see product.sweep.
+            (PC -> Gate -> DUT, measure) x points
+        """
+        if self.connected:
+            return Sweep(self, axes).run(measure)
+        else:
+            return None
+
+    def trim(self, key, measure, target, monotonic = True, lanes = None, method = 'bisect', tolerance = None):
+        """
+        Searches every lane for the code of the register identified by key which brings the
+        quantity returned by measure closest to the target, writing the codes of all of the
+        lanes together each iteration. Returns the Trim, whose result holds the codes and
+        whose history holds every iteration, see product.trim.
+            (PC -> Gate -> DUT, measure) x iterations
+        """
+        if self.connected:
+            trim = Trim(self, key, measure, target, monotonic, lanes, method, tolerance = tolerance)
+            trim.run()
+            return trim
+        else:
+            return None
+
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""
+Sweep
+
+    Characterization sweeps step one or more registers through their values and
+    measure the part at every point. A Sweep encodes the SCR value of every point
+    before the first is sent and hands the whole sequence to the adapter's stream
+    method, which works out the RAM bytes that change from one point to the next
+    up front and only sends those.
+
+    Axes are (key, values) pairs, and a key is set in every block of every SCR
+    which holds it, as SerialControlRegister.set does. The last axis changes
+    fastest. Points are dictionaries of key : value.
+
+    Example
+        def measure(point):
+            return bert.error_rate()
+        results = dut.sweep([('TX_AMP', range(32)), ('TX_EMPH', range(4))], measure)
+        for point, error_rate in results:
+            ...
+"""
+
+from common.base import *
+from common.hierarchy import Node
+
+class Sweep(object):
+    """A sweep of register values across one SCR, or every SCR of a package"""
+
+    def __init__(self, target, axes):
+        """
+        target : A SerialControlRegister, or a Package to sweep every SCR which holds the keys
+        axes   : List of (key, values) pairs
+        """
+        self.target = target
+        self.axes = [(key, list(values)) for key, values in axes]
+        self._steps = None
+
+        # Registers of every SCR holding the keys as {scr label:{key:[register, ...]}}
+        self._registers = {}
+        scrs = [target] if isinstance(target, Node) else list(target)
+        for key, values in self.axes:
+            found = False
+            for scr in scrs:
+                for block in scr:
+                    if block.has_register(key):
+                        self._registers.setdefault(scr.label, {}).setdefault(key, []).append(block[key])
+                        found = True
+            if not found:
+                raise KeyError('No register %s to sweep in %s' % (key, target))
+        self._scrs = [scr for scr in scrs if scr.label in self._registers]
+
+    def __len__(self):
+        """Returns the number of points in the sweep"""
+        count = 1
+        for key, values in self.axes:
+            count *= len(values)
+        return count
+
+    @property
+    def points(self):
+        """Returns the points of the sweep in the order they are visited"""
+        points = [{}]
+        for key, values in self.axes:
+            points = [dict(point.items() + [(key, value)]) for point in points for value in values]
+        return points
+
+    def compile(self):
+        """
+        Encodes the SCR values of every point, starting from the values last sent or the
+        defaults, and returns the steps for AbstractAdapter.stream
+        """
+        # Encode every value once
+        encoded = {}
+        for key, values in self.axes:
+            for scr in self._scrs:
+                for register in self._registers[scr.label].get(key, [])[:1]:
+                    for value in values:
+                        encoded[(scr.label, key, value)] = list(register.reg_value_as_bin(value))
+
+        steps = []
+        bases = dict([(scr.label, list(scr.sent) if scr.is_sent else list(scr.default)) for scr in self._scrs])
+        for point in self.points:
+            step = []
+            for scr in self._scrs:
+                send = list(bases[scr.label])
+                for key, registers in self._registers[scr.label].items():
+                    bits = encoded[(scr.label, key, point[key])]
+                    for register in registers:
+                        s,e = register.global_extents
+                        send[s:e] = bits
+                step.append((scr.label, ''.join(send)))
+            steps.append(step)
+        self._steps = steps
+        return steps
+
+    def run(self, measure = None):
+        """
+        Streams the sweep to the device, calling measure with the point after it is set, and
+        returns a list of (point, measurement) pairs
+        """
+        if self._steps == None:
+            self.compile()
+        points = self.points
+        callback = None
+        if measure != None:
+            callback = lambda index: measure(points[index])
+        results = self.target.connection.stream(self._steps, callback)
+        return zip(points, results)
+
+
+if __name__=='__main__' :
+    pass
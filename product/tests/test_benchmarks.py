@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""
+Tests of the benchmark harness
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+import os
+import tempfile
+
+from product.benchmarks import *
+from product.des_generator import write_des_file
+
+class BenchmarkTests(TestCase):
+    """Tests of the benchmark harness"""
+
+    def setUp(self):
+        handle, self.history = tempfile.mkstemp('.jsonl')
+        os.close(handle)
+        handle, self.des = tempfile.mkstemp('.txt')
+        os.close(handle)
+        write_des_file(self.des, lanes = 2, common_registers = 4, lane_registers = 8)
+
+    def tearDown(self):
+        os.remove(self.history)
+        os.remove(self.des)
+
+    def test_run_benchmarks(self):
+        """Every benchmark reports its seconds per call"""
+        results = run_benchmarks(self.des, 2)
+        for scope in ['register', 'block', 'scr', 'package']:
+            for call in IO_CALLS:
+                self.assertTrue(results['%s.%s' % (scope, call)]['seconds'] > 0)
+        self.assertTrue(results['package.from_txt_file']['bytes'] > 0)
+        self.assertTrue('scr.translate_register_string_delta' in results)
+
+    def test_memory(self):
+        """The memory benchmark breaks the retained bytes down by type"""
+        results = run_benchmarks(self.des, memory_only = True)
+        self.assertTrue(results['memory.total']['bytes'] > results['memory.Register']['bytes'] > 0)
+        self.assertTrue(results['memory.logger references']['objects'] > 0)
+        self.assertFalse('package.set' in results)
+
+    def test_history(self):
+        """Runs are appended to the history file"""
+        record({'a':{'seconds':1.0}}, self.history, 'abc1234')
+        record({'a':{'seconds':2.0}}, self.history, 'def5678')
+        runs = load_history(self.history)
+        self.assertEqual([run['commit'] for run in runs], ['abc1234', 'def5678'])
+        self.assertEqual(find_run(runs, 'abc')['results'], {'a':{'seconds':1.0}})
+        self.assertRaises(LookupError, find_run, runs, 'fff')
+
+    def test_compare(self):
+        """Benchmarks which slow down past the threshold are flagged"""
+        record({'fast':{'seconds':1.0, 'bytes':100}, 'slow':{'seconds':1.0}}, self.history, 'base')
+        record({'fast':{'seconds':0.5, 'bytes':105}, 'slow':{'seconds':1.5}}, self.history, 'head')
+        self.assertEqual(main(['--compare', '-f', self.history, 'base', 'head']), 1)
+        runs = load_history(self.history)
+        rows = compare(runs[0], runs[1])
+        self.assertEqual([(row[0], row[1]) for row in regressions(rows)], [('slow', 'seconds')])
+        self.assertEqual(regressions(rows, 0.6), [])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+Tests of the synthetic DES generator
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+import os
+import tempfile
+
+from product.des_generator import *
+from product.package import Package
+from product.connection_adapters.mock_adapter import MockAdapter
+
+class DESGeneratorTests(TestCase):
+    """Tests of the synthetic DES generator"""
+
+    def setUp(self):
+        handle, self.filepath = tempfile.mkstemp('.txt')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.filepath)
+
+    def load(self, **options):
+        write_des_file(self.filepath, **options)
+        return Package.from_txt_file(self.filepath)
+
+    def test_layout(self):
+        """The generated file parses into the requested lanes and registers"""
+        dut = self.load(lanes = 16, common_registers = 10, lane_registers = 40)
+        self.assertEqual(len(dut), 2)
+        for scr in dut:
+            self.assertEqual(len(scr.lanes), 16)
+            self.assertEqual(len(scr.lanes[15].registers), 40)
+            self.assertEqual(scr.lanes[15].label, 'lane_15')
+
+    def test_enable_adjacency(self):
+        """Every input register directly follows its enable bit"""
+        for line in generate_des(lanes = 2, seed = 3).split('NAME')[1:]:
+            fields = dict([l.split('\t') for l in line.strip().split('\n')[1:]])
+            offset = 1 if fields['DIRECTION'] == 'I' else 0
+            self.assertEqual(int(fields['START']), int(fields['ENABLE']) + offset)
+
+    def test_seed(self):
+        """The same seed produces the same file"""
+        self.assertEqual(generate_des(seed = 7), generate_des(seed = 7))
+        self.assertNotEqual(generate_des(seed = 7), generate_des(seed = 8))
+
+    def test_scr_length(self):
+        """Lanes grow until the longest SCR reaches the requested length"""
+        dut = self.load(lanes = 32, scr_length = 20000)
+        self.assertTrue(max([len(scr.default) for scr in dut]) >= 20000)
+        self.assertRaises(ValueError, generate_des, lanes = 40)
+
+    def test_connect(self):
+        """A generated part connects to the mock adapter"""
+        dut = self.load(lanes = 12)
+        dut.connect(MockAdapter())
+        self.assertTrue(dut.connected)
+
+
+if __name__ == '__main__':
+    main()
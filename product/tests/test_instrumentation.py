@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+"""
+Tests tracing a package through every layer
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+from product.instrumentation import *
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+from product.connection_adapters.tests.helpers import mixed_width_package
+from io_ports.io_port_simulator import SimulatedFPGASocket
+
+class InstrumentationTests(TestCase):
+    """Tests of the layer instrumentation"""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.dut.connect(FPGASerialAdapter(SimulatedFPGASocket(self.dut)))
+
+    def tearDown(self):
+        disable()
+
+    def test_layers(self):
+        """A traced call is broken down from the package to the port"""
+        aggregate = AggregateSink()
+        enable([aggregate])
+        self.dut.set('TX_AMP', 21)
+        layers = set([entry['layer'] for entry in aggregate.results.values()])
+        self.assertTrue(set(['package', 'scr', 'register', 'tree', 'adapter', 'port']) <= layers)
+        self.assertEqual(aggregate.results['Package.set']['calls'], 1)
+        self.assertTrue(aggregate.results['SimulatedFPGASocket.write']['calls'] > 0)
+
+    def test_disable(self):
+        """Disabling restores the untraced classes"""
+        original = Package.__dict__['set']
+        enable(layers = ['package'])
+        self.assertFalse(Package.__dict__['set'] is original)
+        self.assertTrue(tracer() != None)
+        disable()
+        self.assertTrue(Package.__dict__['set'] is original)
+        self.assertEqual(tracer(), None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+"""
+Tests of the package memory report
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+from product.memory_report import *
+from product.connection_adapters.mock_adapter import MockAdapter
+from product.connection_adapters.tests.helpers import mixed_width_package
+
+class MemoryReportTests(TestCase):
+    """Tests of the package memory report"""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+
+    def test_types(self):
+        """Every register and bit address is charged to its type"""
+        report = self.dut.memory_report()
+        registers = sum([len(block.registers) for scr in self.dut for block in [scr.cb] + scr.lanes.values()])
+        self.assertTrue(report['types']['Register']['instances'] >= registers)
+        self.assertTrue(report['types']['BitAddress']['instances'] >= sum([scr.width for scr in self.dut]))
+        self.assertEqual(report['total']['bytes'], sum([entry['bytes'] for entry in report['types'].values()]))
+        self.assertTrue(report['overheads']['label references']['objects'] >= registers)
+        self.assertTrue('TOTAL' in format_memory_report(report))
+
+    def test_sessions(self):
+        """A connected package also retains its adapter sessions"""
+        before = self.dut.memory_report()
+        self.dut.connect(MockAdapter())
+        after = self.dut.memory_report()
+        self.assertEqual(after['types']['SerialControlRegisterSession']['instances'], len(self.dut))
+        self.assertTrue(after['total']['bytes'] > before['total']['bytes'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+"""
+Tests of operation sequences
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+from product.operation_sequence import *
+from product.connection_adapters.fpga_adapter import OPCODE_WRITE_SI_RAM0, OPCODE_WRITE_SERDES, StreamPlan
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+from product.connection_adapters.mock_adapter import MockAdapter
+from product.connection_adapters.threaded_adapter import ThreadedAdapter
+from product.connection_adapters.tests.helpers import mixed_width_package
+from io_ports.io_port_simulator import SimulatedFPGASocket
+
+class RecordingSocket(SimulatedFPGASocket):
+    """Simulated FPGA which keeps every value shifted into a scan chain"""
+
+    def power_on(self):
+        super(RecordingSocket, self).power_on()
+        self.shifted = []
+
+    def _shift_in(self, target, address):
+        super(RecordingSocket, self)._shift_in(target, address)
+        self.shifted.append((target, self.chain(target)))
+
+
+class OperationSequenceTests(TestCase):
+    """Tests of the OperationSequence class"""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.socket = RecordingSocket(self.dut)
+        self.dut.connect(FPGASerialAdapter(self.socket))
+
+    def values(self, scr, block, key):
+        """Returns the register's value in every state shifted into the SCR"""
+        s,e = self.dut[scr][block][key].global_extents
+        return [int(bits[s:e][::-1], 2) for target, bits in self.socket.shifted if target == scr]
+
+    def test_recording(self):
+        """Writes are recorded by label with a commit point between every group"""
+        sequence = OperationSequence()
+        sequence.set('tx_amp', 3, 'TOP').commit().commit()
+        sequence.toggle(self.dut.bottom.lane_1['BIST_MODE'])
+        self.assertEqual(sequence.operations, [('top', None, 'TX_AMP', 3), None,
+                                               ('bottom', 'lane_1', 'BIST_MODE', 0), None,
+                                               ('bottom', 'lane_1', 'BIST_MODE', 1), None,
+                                               ('bottom', 'lane_1', 'BIST_MODE', 0), None])
+        self.assertEqual(len(sequence), 4)
+        self.assertRaises(KeyError, OperationSequence().set('MISSING', 1).run, self.dut)
+
+    def test_ordered_states(self):
+        """Every commit point is shifted into the SCR in order, one port call each"""
+        sequence = OperationSequence()
+        sequence.set('TX_AMP', 7, 'top').set('VCO_CAL', 2, 'top').commit()
+        sequence.pulse('BIST_MODE', 9, 0, 'top', 'lane_2')
+        sequence.set('TX_AMP', 12, 'top', 'lane_0')
+
+        self.dut.top.lane_2['BIST_MODE'].set(3)
+        self.socket.reset_counters()
+        self.socket.shifted = []
+        steps = sequence.run(self.dut)
+        self.assertEqual(len(steps), 4)
+        self.assertEqual(self.socket.opcodes[OPCODE_WRITE_SERDES], 4)
+        self.assertEqual(self.socket.calls, 4)
+        self.assertEqual(self.values('top', 'lane_2', 'BIST_MODE'), [3, 9, 0, 0])
+        self.assertEqual(self.values('top', 'lane_0', 'TX_AMP'), [7, 7, 7, 12])
+        self.assertEqual(self.values('top', 'common_block', 'VCO_CAL'), [2, 2, 2, 2])
+        self.assertEqual(self.socket.chain('top'), self.dut.top.sent)
+        self.assertEqual(self.dut.top.lane_0['TX_AMP'].sent, 12)
+
+    def test_fewer_writes(self):
+        """Only the RAM bytes which change between commit points are written"""
+        sequence = OperationSequence()
+        for value in range(8):
+            sequence.set('VCO_CAL', value, 'top').commit()
+        self.dut.top.refresh()
+        self.socket.reset_counters()
+        sequence.run(self.dut)
+        streamed = self.socket.counters
+
+        for value in range(8):
+            self.dut.top.cb['VCO_CAL'].set(value)
+        self.socket.reset_counters()
+        for value in range(8):
+            self.dut.top.cb['VCO_CAL'].set(value)
+        self.assertTrue(streamed['writes'] < self.socket.writes)
+        self.assertTrue(streamed['calls'] < self.socket.calls)
+        self.assertEqual(streamed['opcodes'][OPCODE_WRITE_SERDES], 8)
+
+    def test_unchanged_scrs(self):
+        """An SCR the writes leave unchanged is not sent"""
+        self.dut.set('BIST_MODE', 4)
+        sequence = OperationSequence().set('BIST_MODE', 4).commit().set('BIST_MODE', 5, 'bottom')
+        self.socket.reset_counters()
+        steps = sequence.run(self.dut)
+        self.assertEqual([[target for target, value in step] for step in steps], [['bottom']])
+        self.assertEqual(self.socket.opcodes[OPCODE_WRITE_SERDES], 1)
+        self.assertEqual(self.socket.chain('bottom'), self.dut.bottom.sent)
+
+    def test_toggle(self):
+        """Register.toggle sends 0, 1 and 0 as one stream"""
+        register = self.dut.bottom.lane_0['BIST_MODE']
+        register.set(6)
+        self.socket.reset_counters()
+        self.socket.shifted = []
+        register.toggle()
+        self.assertEqual(self.values('bottom', 'lane_0', 'BIST_MODE'), [0, 1, 0])
+        self.assertEqual(self.socket.calls, 3)
+        self.assertEqual(register.sent, 0)
+
+    def test_busy(self):
+        """States reach the SCR in order when every commit keeps the FPGA busy"""
+        dut = mixed_width_package()
+        self.socket = RecordingSocket(dut, busy_reads = 3)
+        dut.connect(FPGASerialAdapter(self.socket))
+        self.dut = dut
+
+        sequence = OperationSequence()
+        for value in range(1, 6):
+            sequence.set('TX_AMP', value, 'top', 'lane_0').commit()
+        sequence.run(dut)
+        self.assertEqual(self.values('top', 'lane_0', 'TX_AMP'), [1, 2, 3, 4, 5])
+        self.assertEqual(self.socket.chain('top'), dut.top.sent)
+
+        register = dut.bottom.lane_0['BIST_MODE']
+        register.set(6)
+        self.socket.shifted = []
+        register.toggle()
+        self.assertEqual(self.values('bottom', 'lane_0', 'BIST_MODE'), [0, 1, 0])
+        self.assertEqual(self.socket.chain('bottom'), dut.bottom.sent)
+
+    def test_cache(self):
+        """A compiled sequence is reused on another DUT starting from the same values"""
+        sequence = OperationSequence().toggle('TX_AMP', 'top', 'lane_1')
+        sequence.run(self.dut)
+        self.assertEqual(sequence.compiles, 1)
+        self.assertTrue(isinstance(sequence.compile(mixed_width_package_connected()[0])[1], StreamPlan))
+
+        other, socket = mixed_width_package_connected()
+        self.dut.top.reset()
+        other.top.reset()
+        sequence.run(self.dut)
+        compiles = sequence.compiles
+        sequence.run(other)
+        self.assertEqual(sequence.compiles, compiles)
+        self.assertEqual(socket.chain('top'), self.socket.chain('top'))
+        self.assertEqual(other.top.lane_1['TX_AMP'].sent, 0)
+
+        sequence.run(mock_package())
+        self.assertEqual(sequence.compiles, compiles + 1)
+
+    def test_adapters(self):
+        """Sequences run on the mock and threaded adapters"""
+        dut = mock_package()
+        steps = OperationSequence().pulse('TX_AMP', 31, 2, 'top').run(dut)
+        self.assertEqual(len(steps), 2)
+        self.assertEqual(dut.top.lane_3['TX_AMP'].sent, 2)
+
+        dut = mixed_width_package()
+        socket = SimulatedFPGASocket(dut)
+        adapter = ThreadedAdapter(FPGASerialAdapter(socket))
+        dut.connect(adapter)
+        try:
+            OperationSequence().pulse('TX_AMP', 31, 2, 'bottom').run(dut)
+            self.assertEqual(socket.chain('bottom'), dut.bottom.sent)
+            self.assertEqual(dut.bottom.lane_1['TX_AMP'].sent, 2)
+        finally:
+            adapter.close()
+
+
+def mixed_width_package_connected():
+    """Returns a mixed width package connected to a simulated FPGA, and the simulator"""
+    dut = mixed_width_package()
+    socket = SimulatedFPGASocket(dut)
+    dut.connect(FPGASerialAdapter(socket))
+    return dut, socket
+
+def mock_package():
+    """Returns a mixed width package connected to a mock adapter"""
+    dut = mixed_width_package()
+    dut.connect(MockAdapter())
+    return dut
+
+
+if __name__ == '__main__':
+    main()
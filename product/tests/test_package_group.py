@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+Tests PackageGroup against several simulated FPGA boards
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+from product.package_group import *
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+from product.connection_adapters.tests.helpers import mixed_width_package
+from io_ports.io_port_simulator import SimulatedFPGASocket
+
+class PackageGroupTests(TestCase):
+    """Tests the package group fan out."""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.sockets = [SimulatedFPGASocket(self.dut) for i in range(3)]
+        self.group = PackageGroup(self.dut, [FPGASerialAdapter(socket) for socket in self.sockets])
+        self.group.connect()
+
+    def tearDown(self):
+        self.group.close()
+
+    def test_clone(self):
+        """A clone has the same layout as the original and its own registers"""
+        clone = self.dut.clone()
+        self.assertEqual(clone.default, self.dut.default)
+        self.assertFalse(clone.connected)
+        self.assertFalse(clone.top.lane_0['TX_AMP'] is self.dut.top.lane_0['TX_AMP'])
+
+    def test_boards(self):
+        """Every board gets its own connected package"""
+        self.assertEqual(self.group.boards, ['board_0', 'board_1', 'board_2'])
+        self.assertEqual(len(self.group), 3)
+        self.assertTrue(self.group.connected)
+        self.assertFalse(self.dut.connected)
+        self.assertFalse(self.group['board_0'] is self.group['board_1'])
+
+    def test_fan_out(self):
+        """Operations reach every board and return per board results"""
+        self.group.set('TX_AMP', 21)
+        results = self.group.get('TX_AMP')
+        self.assertEqual(sorted(results.keys()), self.group.boards)
+        for label in self.group.boards:
+            self.assertEqual(results[label]['top']['lane_2'], 21)
+        for socket, package in zip(self.sockets, self.group):
+            self.assertEqual(socket.chain('top'), package.top.sent)
+
+    def test_map(self):
+        """Procedures run against the package of every board"""
+        def procedure(package, value):
+            package.bottom.set('BIST_MODE', value)
+            return package.bottom.get('BIST_MODE')['lane_1']
+        self.assertEqual(self.group.map(procedure, 3), {'board_0':3, 'board_1':3, 'board_2':3})
+
+    def test_from_ports(self):
+        """One adapter of the type requested is created per port"""
+        group = PackageGroup.from_ports(self.dut, {'left':1, 'right':2}, 'mock')
+        try:
+            self.assertEqual(group.boards, ['left', 'right'])
+            self.assertEqual([group.adapters[label].type for label in group.boards], ['Mock', 'Mock'])
+        finally:
+            group.close()
+
+    def test_errors(self):
+        """A failure on one board is reported once every board is done"""
+        def procedure(package):
+            if package is self.group['board_1']:
+                raise ValueError('Board fault')
+            return True
+        self.assertRaises(Exception, self.group.map, procedure)
+        self.group.raise_errors = False
+        results = self.group.map(procedure)
+        self.assertEqual(results['board_0'], True)
+        self.assertTrue(isinstance(results['board_1'], ValueError))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+"""
+Tests of lane register vectors
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+import product.packed
+from product.packed import *
+from product.connection_adapters.fpga_adapter import OPCODE_WRITE_SERDES
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+from product.connection_adapters.tests.helpers import mixed_width_package
+from io_ports.io_port_simulator import SimulatedFPGASocket
+
+class LaneLayoutTests(TestCase):
+    """Tests of the LaneLayout class"""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.socket = SimulatedFPGASocket(self.dut)
+        self.dut.connect(FPGASerialAdapter(self.socket))
+        self.numpy = product.packed.numpy
+
+    def tearDown(self):
+        product.packed.numpy = self.numpy
+
+    def test_set_vector(self):
+        """Every lane gets its own value in a single send"""
+        self.socket.reset_counters()
+        self.dut.top.set_vector('TX_AMP', [3, 31, 0, 17])
+        self.assertEqual(self.socket.opcodes[OPCODE_WRITE_SERDES], 1)
+        self.assertEqual(self.dut.top.get('TX_AMP'), {'lane_0':3, 'lane_1':31, 'lane_2':0, 'lane_3':17})
+        self.assertEqual(self.socket.chain('top'), self.dut.top.sent)
+        self.assertEqual(list(self.dut.top.vector('TX_AMP')), [3, 31, 0, 17])
+
+    def test_mask(self):
+        """Lanes left out of the mask keep their values and are masked when read"""
+        self.dut.top.set_vector('BIST_MODE', [1, 2, 3, 4])
+        self.dut.top.set_vector('BIST_MODE', [9, 9, 9, 9], [True, False, True, False])
+        self.assertEqual(self.dut.top.get('BIST_MODE'), {'lane_0':9, 'lane_1':2, 'lane_2':9, 'lane_3':4})
+        vector = self.dut.top.vector('BIST_MODE', [False, True, True])
+        self.assertEqual(list(vector.mask), [True, False, False, True])
+        self.assertEqual(vector.compressed().tolist(), [2, 9])
+
+    def test_output_register(self):
+        """Output registers are decoded from the retrieved bits"""
+        for label, value in [('lane_0', 5), ('lane_2', 6)]:
+            status = self.dut.top[label]['STATUS']
+            self.socket.drive('top', status.global_index, status.reg_value_as_bin(value))
+        self.assertEqual(list(self.dut.top.vector('STATUS')), [5, 0, 6, 0])
+
+    def test_invalid(self):
+        """Values beyond the register width and unknown registers are refused"""
+        self.assertRaises(ValueError, self.dut.bottom.set_vector, 'BIST_MODE', [16, 0])
+        self.assertRaises(KeyError, self.dut.bottom.vector, 'VCO_CAL')
+
+    def test_without_numpy(self):
+        """Lists take the place of arrays when numpy is not installed"""
+        product.packed.numpy = None
+        layout = LaneLayout(self.dut.top, 'TX_AMP')
+        send = layout.encode(self.dut.top.default, [1, 2, 3, 4], [True, True, False, True])
+        self.assertEqual(layout.decode(list(send)), [1, 2, 10, 4])
+        self.assertEqual(layout.decode(list(send), [False, True]), [None, 2, None, None])
+        product.packed.numpy = self.numpy
+        if self.numpy != None:
+            self.assertEqual(LaneLayout(self.dut.top, 'TX_AMP').encode(self.dut.top.default, [1, 2, 3, 4], [True, True, False, True]), send)
+
+
+class SnapshotTests(TestCase):
+    """Tests of package snapshots"""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.socket = SimulatedFPGASocket(self.dut)
+        self.numpy = product.packed.numpy
+
+    def tearDown(self):
+        product.packed.numpy = self.numpy
+
+    def expected(self, source):
+        # Decoded a register at a time
+        results = {}
+        for scr in self.dut:
+            for block in scr:
+                for register in block:
+                    results.setdefault(scr.label, {}).setdefault(block.label, {})[register.label] = getattr(register, source)
+        return results
+
+    def test_default(self):
+        """Defaults are decoded without a connection"""
+        snapshot = self.dut.snapshot('default')
+        self.assertEqual(snapshot.as_dict(), self.expected('default'))
+        self.assertEqual(snapshot[('top', 'lane_3', 'tx_amp')], 10)
+        self.assertEqual(self.dut.snapshot('sent'), None)
+
+    def test_sent_and_retrieved(self):
+        """Every register matches its own sent and retrieved value"""
+        self.dut.connect(FPGASerialAdapter(self.socket))
+        self.dut.top.set_vector('TX_AMP', [1, 2, 3, 4])
+        self.dut.bottom.set('VCO_CAL', 5)
+        status = self.dut.bottom.lane_1['STATUS']
+        self.socket.drive('bottom', status.global_index, status.reg_value_as_bin(3))
+        self.dut.get('STATUS')
+        for source in ['sent', 'retrieved']:
+            self.assertEqual(self.dut.snapshot(source).as_dict(), self.expected(source))
+        self.assertEqual(self.dut.snapshot()[('bottom', 'lane_1', 'STATUS')], 3)
+        self.assertRaises(ValueError, self.dut.snapshot, 'prepared')
+
+    def test_diff(self):
+        """Snapshots diff down to the registers which changed"""
+        self.dut.connect(FPGASerialAdapter(self.socket))
+        self.dut.top.set('BIST_MODE', 0)
+        before = self.dut.snapshot('sent')
+        self.dut.top.set_vector('BIST_MODE', [0, 7, 0, 0])
+        self.dut.top.set('VCO_CAL', 2)
+        after = self.dut.snapshot('sent')
+        self.assertEqual(sorted(after.diff(before)), [(('top', 'common_block', 'VCO_CAL'), self.dut.top.cb['VCO_CAL'].default, 2), (('top', 'lane_1', 'BIST_MODE'), 0, 7)])
+        self.assertEqual(after.diff(after), [])
+        # Registers of an SCR which has never been sent are unknown
+        self.assertEqual(after[('bottom', 'lane_0', 'BIST_MODE')], None)
+        self.assertRaises(ValueError, after.diff, mixed_width_package().snapshot('default'))
+
+    def test_without_numpy(self):
+        """Lists take the place of arrays when numpy is not installed"""
+        self.dut.connect(FPGASerialAdapter(self.socket))
+        self.dut.top.set('TX_AMP', 19)
+        with_numpy = self.dut.snapshot('sent')
+        product.packed.numpy = None
+        self.dut._snapshot_layout = None
+        snapshot = self.dut.snapshot('sent')
+        self.assertEqual(snapshot.as_dict(), with_numpy.as_dict())
+        self.dut.top.set('TX_AMP', 18)
+        self.assertEqual(len(self.dut.snapshot('sent').diff(snapshot)), 4)
+
+
+if __name__ == '__main__':
+    main()
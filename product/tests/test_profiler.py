@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+Tests of the procedure profiling harness
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+import os
+import tempfile
+
+from product.profiler import *
+from product.des_generator import write_des_file
+
+PROCEDURE = """
+from product.package import Package
+dut = Package.from_txt_file('DES_on_the_bench_pc.txt', connect = 'Parallel FPGA')
+scr = dut[0]
+scr.reset()
+scr.refresh()
+result = scr.translate_register_string_delta(scr.sent, scr.default)
+"""
+
+class ProfilerTests(TestCase):
+    """Tests of the procedure profiling harness"""
+
+    def setUp(self):
+        handle, self.script = tempfile.mkstemp('.py')
+        os.write(handle, PROCEDURE)
+        os.close(handle)
+        handle, self.des = tempfile.mkstemp('.txt')
+        os.close(handle)
+        write_des_file(self.des, lanes = 2, common_registers = 4, lane_registers = 8)
+
+    def tearDown(self):
+        os.remove(self.script)
+        os.remove(self.des)
+
+    def test_substitution(self):
+        """The procedure runs against the DES and adapter provided, and the Package is restored afterwards"""
+        from_txt_file = Package.__dict__['from_txt_file']
+        connect = Package.__dict__['connect']
+        for adapter in ['mock', 'simulator']:
+            stats = profile_script(self.script, des_file = self.des, adapter = adapter)
+            self.assertTrue(stats.total_tt > 0)
+        self.assertTrue(Package.__dict__['from_txt_file'] is from_txt_file)
+        self.assertTrue(Package.__dict__['connect'] is connect)
+
+    def test_reports(self):
+        """Collapsed stacks and hot functions are attributed to the subsystems"""
+        stats = profile_script(self.script, des_file = self.des, adapter = 'simulator')
+        stacks = collapsed_stacks(stats)
+        self.assertTrue(len(stacks) > 0)
+        for line in stacks:
+            frames, microseconds = line.rsplit(' ', 1)
+            self.assertTrue(int(microseconds) > 0)
+        # Time on the port is nested under the package call which caused it
+        self.assertTrue([line for line in stacks if line.find('product/serial_control_register.py') < line.find('io_ports/io_port_simulator.py') > 0])
+        totals = subsystem_totals(stats)
+        for name in ['product', 'common.hierarchy', 'connection_adapters', 'io_ports']:
+            self.assertTrue(name in totals, name)
+        self.assertEqual(subsystem(exepath('../../common/hierarchy.py')), 'common.hierarchy')
+        self.assertTrue('SUBSYSTEM' in format_hot_functions(stats, 5))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+Tests of register sweeps
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+from product.sweep import *
+from product.connection_adapters.fpga_adapter import OPCODE_WRITE_SI_RAM0, OPCODE_WRITE_SERDES
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+from product.connection_adapters.mock_adapter import MockAdapter
+from product.connection_adapters.tests.helpers import mixed_width_package
+from io_ports.io_port_simulator import SimulatedFPGASocket
+
+class SweepTests(TestCase):
+    """Tests of register sweeps"""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.socket = SimulatedFPGASocket(self.dut)
+        self.dut.connect(FPGASerialAdapter(self.socket))
+
+    def test_points(self):
+        """The last axis changes fastest"""
+        sweep = Sweep(self.dut.top, [('TX_AMP', [1, 2]), ('BIST_MODE', [3, 4, 5])])
+        self.assertEqual(len(sweep), 6)
+        self.assertEqual(sweep.points[:4], [{'TX_AMP':1, 'BIST_MODE':3}, {'TX_AMP':1, 'BIST_MODE':4}, {'TX_AMP':1, 'BIST_MODE':5}, {'TX_AMP':2, 'BIST_MODE':3}])
+        self.assertRaises(KeyError, Sweep, self.dut.top, [('MISSING', [1])])
+
+    def test_measure(self):
+        """Every point is set on the device before it is measured"""
+        def measure(point):
+            return self.dut.top.get('TX_AMP')['lane_3'], self.dut.top.get('BIST_MODE')['lane_0']
+        results = self.dut.top.sweep([('TX_AMP', range(0, 32, 8)), ('BIST_MODE', [2, 9])], measure)
+        self.assertEqual(len(results), 8)
+        for point, measurement in results:
+            self.assertEqual(measurement, (point['TX_AMP'], point['BIST_MODE']))
+        self.assertEqual(self.socket.chain('top'), self.dut.top.sent)
+        self.assertEqual(self.dut.top.lane_1['TX_AMP'].sent, 24)
+
+    def test_package(self):
+        """A package sweep sets every SCR holding the register at every point"""
+        results = self.dut.sweep([('BIST_MODE', [5, 6])], lambda point: self.dut.get('BIST_MODE'))
+        for point, measurement in results:
+            self.assertEqual(measurement['top']['lane_2'], point['BIST_MODE'])
+            self.assertEqual(measurement['bottom']['lane_1'], point['BIST_MODE'])
+        self.assertEqual(self.socket.chain('bottom'), self.dut.bottom.sent)
+
+    def test_streamed_bytes(self):
+        """After the first point only the RAM bytes which change are written"""
+        self.dut.top.refresh()
+        self.socket.reset_counters()
+        self.dut.top.sweep([('VCO_CAL', range(8))])
+        streamed = self.socket.opcodes[OPCODE_WRITE_SI_RAM0]
+        self.assertEqual(self.socket.opcodes[OPCODE_WRITE_SERDES], 8)
+        self.assertEqual(self.dut.top.cb['VCO_CAL'].sent, 7)
+
+        self.socket.reset_counters()
+        for value in range(8):
+            self.dut.top.set('VCO_CAL', value)
+        looped = self.socket.opcodes[OPCODE_WRITE_SI_RAM0]
+        byte_count = (self.dut.top.width + 7) / 8
+        self.assertEqual(looped, 8 * byte_count)
+        self.assertEqual(streamed, byte_count + 7)
+
+    def test_default_stream(self):
+        """Adapters without a streaming transfer set every step in turn"""
+        dut = mixed_width_package()
+        dut.connect(MockAdapter())
+        results = dut.bottom.sweep([('TX_AMP', [3, 4])], lambda point: dut.bottom.get('TX_AMP')['lane_0'])
+        self.assertEqual([m for p, m in results], [3, 4])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+"""
+Tests the port transaction counts against the checked in table
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+from product.transaction_counts import *
+
+class TransactionCountTests(TestCase):
+    """Tests of the port transaction counts"""
+
+    def test_table(self):
+        """Every operation generates the port traffic recorded in the table"""
+        rows = differences(load_table(), count_all())
+        self.assertEqual(rows, [], '\n'.join(['%s %s %s %s: %s -> %s' % row for row in rows]))
+
+    def test_repeatable(self):
+        """Counting an operation twice gives the same counters"""
+        load = des_sources()[SYNTHETIC_DES]
+        try:
+            first = count_operation(load, FPGASerialAdapter, 'scr.set')
+            self.assertEqual(count_operation(load, FPGASerialAdapter, 'scr.set'), first)
+            self.assertEqual(first['transactions'], first['reads'] + first['writes'])
+            self.assertTrue(first['opcodes']['write_serdes'] > 0)
+        finally:
+            os.remove(load.filepath)
+
+    def test_differences(self):
+        """Changed counters are reported, DES missing from either table are not"""
+        expected = {'a':{'serial fpga':{'set':{'reads':1, 'opcodes':{'write_ram0':2}}}}, 'b':{}}
+        actual   = {'a':{'serial fpga':{'set':{'reads':1, 'opcodes':{'write_ram0':3}}}}, 'c':{}}
+        self.assertEqual(differences(expected, actual), [('a', 'serial fpga', 'set', 'opcodes.write_ram0', 2, 3)])
+        self.assertEqual(differences(expected, expected), [])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+Tests of register trims
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+from product.trim import *
+from product.connection_adapters.fpga_adapter import OPCODE_WRITE_SERDES
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+from product.connection_adapters.tests.helpers import mixed_width_package
+from io_ports.io_port_simulator import SimulatedFPGASocket
+
+# Measured quantity of every lane as a function of the TX_AMP code
+RESPONSES = {
+    'lane_0' : lambda code: 40.0 + 1.5 * code,
+    'lane_1' : lambda code: 30.0 + 2.0 * code,
+    'lane_2' : lambda code: 95.0 - 1.75 * code,
+    'lane_3' : lambda code: 20.0 + 0.5 * code
+    }
+
+class TrimTests(TestCase):
+    """Tests of register trims"""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.socket = SimulatedFPGASocket(self.dut)
+        self.dut.connect(FPGASerialAdapter(self.socket))
+        self.socket.reset_counters()
+
+    def measure(self, codes):
+        # Measures the codes on the device rather than the codes the trim asked for
+        sent = self.dut.top.get('TX_AMP')
+        for lane in codes:
+            self.assertEqual(sent[lane], codes[lane])
+        return dict([(lane, RESPONSES[lane](sent[lane])) for lane in codes])
+
+    def closest(self, lane, target):
+        return min(range(32), key = lambda code: abs(RESPONSES[lane](code) - target))
+
+    def test_bisect(self):
+        """Every lane reaches the code closest to the target with one SCR write per iteration"""
+        trim = self.dut.top.trim('TX_AMP', self.measure, 60.0)
+        for lane in RESPONSES:
+            if lane != 'lane_3':
+                self.assertEqual(trim.result[lane], self.closest(lane, 60.0))
+        # The target is out of reach of lane 3, so it takes the nearer end
+        self.assertEqual(trim.result['lane_3'], 31)
+        self.assertTrue(trim.iterations <= 7)
+        self.assertEqual(self.socket.opcodes[OPCODE_WRITE_SERDES], trim.iterations + 1)
+        self.assertEqual(self.dut.top.lane_2['TX_AMP'].sent, trim.result['lane_2'])
+
+    def test_secant(self):
+        """Interpolating converges faster on a linear response"""
+        bisect = self.dut.top.trim('TX_AMP', self.measure, 55.0, lanes = [0, 1, 2])
+        secant = self.dut.top.trim('TX_AMP', self.measure, 55.0, lanes = [0, 1, 2], method = 'secant')
+        self.assertEqual(secant.result, bisect.result)
+        self.assertTrue(secant.iterations < bisect.iterations)
+
+    def test_history(self):
+        """The history holds the code and measurement of every lane searched at every iteration"""
+        trim = self.dut.top.trim('TX_AMP', self.measure, 62.0, lanes = ['lane_1'], tolerance = 0.5)
+        convergence = trim.convergence('lane_1')
+        self.assertEqual(convergence[:2], [(0, 30.0), (31, 92.0)])
+        self.assertEqual(convergence[-1], (16, 62.0))
+        self.assertEqual(len(convergence), trim.iterations)
+        self.assertEqual(self.dut.top.lane_0['TX_AMP'].sent, 10)
+
+    def test_linear(self):
+        """A response which is not monotonic is searched code by code"""
+        def measure(codes):
+            return dict([(lane, (code - 11) ** 2) for lane, code in codes.items()])
+        trim = self.dut.bottom.trim('TX_AMP', measure, 0, monotonic = False)
+        self.assertEqual(trim.iterations, 32)
+        self.assertEqual(trim.result, {'lane_0':11, 'lane_1':11})
+        self.assertRaises(ValueError, Trim, self.dut.bottom, 'TX_AMP', measure, 0, method = 'newton')
+        self.assertRaises(KeyError, Trim, self.dut.bottom, 'MISSING', measure, 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+Tests of register watches
+"""
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+import threading
+
+from product.watch import *
+from product.connection_adapters.fpga_adapter import OPCODE_READ_SERDES, OPCODE_READ_SI_RAM1
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+from product.connection_adapters.threaded_adapter import ThreadedAdapter
+from product.connection_adapters.tests.helpers import mixed_width_package
+from io_ports.io_port_simulator import SimulatedFPGASocket
+
+class WatchTests(TestCase):
+    """Tests of the Watch class"""
+
+    def setUp(self):
+        self.dut = mixed_width_package()
+        self.socket = SimulatedFPGASocket(self.dut)
+        self.adapter = ThreadedAdapter(FPGASerialAdapter(self.socket))
+        self.dut.connect(self.adapter)
+
+    def tearDown(self):
+        self.adapter.close()
+
+    def drive(self, scr, lane, key, value):
+        register = self.dut[scr][lane][key]
+        self.socket.drive(scr, register.global_index, register.reg_value_as_bin(value))
+
+    def test_registers(self):
+        """Every output register is watched by default, read back in spans"""
+        watch = Watch(self.dut)
+        self.assertEqual(sorted([key for key, s, e in watch.registers['bottom']]),
+                         [('bottom', 'common_block', 'LOCK'), ('bottom', 'lane_0', 'STATUS'), ('bottom', 'lane_1', 'STATUS')])
+        self.assertTrue(sum([e - s for s,e in watch.spans['top']]) < self.dut.top.width / 2)
+        watch = Watch(self.dut, ['status'])
+        self.assertEqual(len(watch.registers['top']), 4)
+        self.assertRaises(KeyError, Watch, self.dut, ['MISSING'])
+
+    def test_poll(self):
+        """Only the registers which changed are reported"""
+        watch = Watch(self.dut, ['STATUS'])
+        self.assertEqual(watch.poll(), {})
+        self.assertEqual(watch.poll(), {})
+        self.drive('top', 'lane_2', 'STATUS', 5)
+        self.drive('bottom', 'lane_0', 'STATUS', 2)
+        self.assertEqual(watch.poll(), {('top', 'lane_2', 'STATUS'):(0, 5), ('bottom', 'lane_0', 'STATUS'):(0, 2)})
+        self.assertEqual(watch.poll(), {})
+        self.assertEqual((watch.captures, watch.changes), (4, 1))
+
+    def test_readback(self):
+        """A capture reads back only the spans holding watched registers"""
+        watch = Watch(self.dut, [self.dut.top.lane_0['STATUS']])
+        self.adapter.wait()
+        self.socket.reset_counters()
+        watch.poll()
+        self.assertEqual(self.socket.opcodes[OPCODE_READ_SERDES], 1)
+        self.assertEqual(self.socket.opcodes[OPCODE_READ_SI_RAM1], 1)
+
+    def test_background(self):
+        """The watch thread calls back with changes while the foreground uses the package"""
+        changed = threading.Event()
+        deltas = []
+        def callback(delta):
+            deltas.append(delta)
+            changed.set()
+        watch = self.dut.watch(['STATUS'], 0.01, callback)
+        try:
+            self.assertTrue(watch.running)
+            for value in range(8):
+                self.dut.top.set('TX_AMP', value)
+            self.assertEqual(self.dut.top.get('TX_AMP')['lane_3'], 7)
+            self.drive('top', 'lane_1', 'STATUS', 3)
+            changed.wait(5)
+        finally:
+            watch.stop()
+        self.assertFalse(watch.running)
+        self.assertEqual(watch.error, None)
+        self.assertEqual(deltas[0], {('top', 'lane_1', 'STATUS'):(0, 3)})
+
+        # Restarting takes a new baseline
+        self.drive('top', 'lane_1', 'STATUS', 4)
+        with watch:
+            self.assertTrue(watch.running)
+        self.assertEqual(watch._previous['top'][3:6], '001')
+
+    def test_plain_adapter(self):
+        """A package connected without a ThreadedAdapter can not be watched"""
+        dut = mixed_width_package()
+        dut.connect(FPGASerialAdapter(SimulatedFPGASocket(dut)))
+        self.assertRaises(ValueError, dut.watch)
+
+
+if __name__ == '__main__':
+    main()
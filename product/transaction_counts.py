@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+"""
+Port Transaction Counts
+
+    Counts the port calls, register reads and writes, and FPGA opcodes that each
+    public operation generates when the FPGA adapters drive a SimulatedFPGASocket.
+    Unlike wall clock benchmarks the counts are exact and repeatable, and they are
+    what decides how long an operation takes on a serial or parallel board.
+
+    The counts of every bundled DES, and of a generated DES which is always
+    available, are checked in as a table. The tests compare the tree against it,
+    so a change which adds bus traffic shows up as a diff of the table.
+
+    Every operation runs on a freshly connected package, so that the shadowed
+    control registers and the current target are the same for every count.
+
+    Usage
+        python product/transaction_counts.py                # Print the counts
+        python product/transaction_counts.py --update       # Rewrite the checked in table
+        python product/transaction_counts.py --check        # Exit with 1 if the counts differ from the table
+"""
+
+import glob
+import json
+import sys
+import tempfile
+
+from optparse import OptionParser
+
+from common.base import *
+from product.package import Package
+from product.des_generator import generate_des
+from product.connection_adapters.fpga_adapter import OPCODE_READ_SERDES, OPCODE_WRITE_SERDES, OPCODE_READ_SI_RAM0, OPCODE_WRITE_SI_RAM0, OPCODE_READ_SI_RAM1, OPCODE_WRITE_SI_RAM1
+from product.connection_adapters.fpga_serial_adapter import FPGASerialAdapter
+from product.connection_adapters.fpga_parallel_adapter import FPGAParallelAdapter
+from io_ports.io_port_simulator import SimulatedFPGASocket
+
+DEFAULT_TABLE = exepath('tests/mocks/port_transaction_counts.json')
+
+# Bundled DES files which are counted when they are present
+BUNDLED_DES = exepath('tests/mocks/DES_*.txt')
+
+# Options of the generated DES, see des_generator.generate_des
+SYNTHETIC_DES = 'synthetic'
+SYNTHETIC_OPTIONS = {'lanes':4, 'common_registers':16, 'lane_registers':32, 'seed':0}
+
+ADAPTERS = {
+    'serial fpga'   : FPGASerialAdapter,
+    'parallel fpga' : FPGAParallelAdapter
+    }
+
+OPCODE_NAMES = {
+    OPCODE_READ_SERDES   : 'read_serdes',
+    OPCODE_WRITE_SERDES  : 'write_serdes',
+    OPCODE_READ_SI_RAM0  : 'read_ram0',
+    OPCODE_WRITE_SI_RAM0 : 'write_ram0',
+    OPCODE_READ_SI_RAM1  : 'read_ram1',
+    OPCODE_WRITE_SI_RAM1 : 'write_ram1'
+    }
+
+
+# Counted Operations -----------------------------
+
+
+def _register(dut):
+    """Returns the first input register of the first lane of the first SCR"""
+    block = dut[0].lanes[min(dut[0].lanes.keys())]
+    return [r for r in block.registers if r.direction == 'I'][0]
+
+def _other_value(register):
+    """Returns a value for the register which differs from its default"""
+    return (register.default + 1) % (2 ** register.width)
+
+def _switch_target(dut):
+    """Points the adapter at the first SCR and returns a call which switches it to the second"""
+    dut[0].refresh()
+    return lambda: dut.connection._set_target(dut[1].label)
+
+def _commit(dut):
+    """Prepares a register and returns the commit of its SCR"""
+    register = _register(dut)
+    dut[0].prepare(register.label, _other_value(register))
+    return dut[0].commit
+
+def _clock_source(dut):
+    """Returns a call which starts the internal clock of the first SCR"""
+    return lambda: dut.connection.set_clock_source(dut[0].label, 'internal')
+
+# Operations as name : setup, where setup takes a connected package and returns the call to count
+OPERATIONS = {
+    'register.set'      : lambda dut: lambda: _register(dut).set(_other_value(_register(dut))),
+    'register.get'      : lambda dut: _register(dut).get,
+    'scr.set'           : lambda dut: lambda: dut[0].set(_register(dut).label, _other_value(_register(dut))),
+    'scr.commit'        : _commit,
+    'scr.refresh'       : lambda dut: dut[0].refresh,
+    'scr.get'           : lambda dut: lambda: dut[0].get(_register(dut).label),
+    'package.reset'     : lambda dut: dut.reset,
+    'package.set'       : lambda dut: lambda: dut.set(_register(dut).label, _other_value(_register(dut))),
+    'package.get'       : lambda dut: lambda: dut.get(_register(dut).label),
+    'target_switch'     : _switch_target,
+    'clock.source'      : _clock_source,
+    'clock.divider'     : lambda dut: lambda: dut.connection.set_scr_clock_divider('fast')
+    }
+
+def _counters(socket):
+    """Returns the socket's counters with the opcodes named"""
+    counters = socket.counters
+    opcodes = {}
+    for opcode, count in counters['opcodes'].items():
+        opcodes[OPCODE_NAMES.get(opcode, '0x%02x' % opcode)] = count
+    counters['opcodes'] = opcodes
+    counters['transactions'] = counters['reads'] + counters['writes']
+    return counters
+
+def count_operation(load, adapter_class, name):
+    """
+    Returns the counters of the named operation on a freshly connected package
+        load          : Function which returns a new Package
+        adapter_class : FPGA adapter class which drives the simulated socket
+        name          : 'connect' or a key of OPERATIONS
+    """
+    dut = load()
+    socket = SimulatedFPGASocket(dut)
+    dut.connect(adapter_class(socket))
+    if name != 'connect':
+        call = OPERATIONS[name](dut)
+        socket.reset_counters()
+        call()
+    return _counters(socket)
+
+def count_des(load):
+    """Returns a dictionary of adapter type : operation : counters for the package built by load"""
+    dut = load()
+    names = ['connect'] + sorted(OPERATIONS.keys())
+    if len(dut) < 2:
+        names.remove('target_switch')
+    if dut[0].label not in ('top', 'bottom'):
+        names.remove('clock.source')
+    results = {}
+    for type in sorted(ADAPTERS):
+        results[type] = {}
+        for name in names:
+            results[type][name] = count_operation(load, ADAPTERS[type], name)
+    return results
+
+
+# Counts Table -----------------------------
+
+
+def _synthetic_loader():
+    """Returns a function which builds the generated DES package"""
+    handle, filepath = tempfile.mkstemp('.txt')
+    try:
+        os.write(handle, generate_des(**SYNTHETIC_OPTIONS))
+    finally:
+        os.close(handle)
+    def load():
+        return Package.from_txt_file(filepath)
+    load.filepath = filepath
+    return load
+
+def des_sources(pattern = BUNDLED_DES):
+    """Returns a dictionary of DES name : package loader for the generated DES and every bundled DES present"""
+    sources = {SYNTHETIC_DES:_synthetic_loader()}
+    for filepath in sorted(glob.glob(pattern)):
+        sources[os.path.basename(filepath)] = (lambda f: lambda: Package.from_txt_file(f))(filepath)
+    return sources
+
+def count_all(pattern = BUNDLED_DES):
+    """Returns the counts table of the generated DES and every bundled DES present"""
+    sources = des_sources(pattern)
+    try:
+        table = {}
+        for name in sorted(sources):
+            table[name] = count_des(sources[name])
+        return table
+    finally:
+        os.remove(sources[SYNTHETIC_DES].filepath)
+
+def load_table(table_file = DEFAULT_TABLE):
+    """Returns the checked in counts table"""
+    f = open(table_file)
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+def save_table(table, table_file = DEFAULT_TABLE):
+    """Writes the counts table in a stable, diff friendly layout"""
+    f = open(table_file, 'w')
+    try:
+        f.write(json.dumps(table, sort_keys = True, indent = 1, separators = (',', ': ')) + '\n')
+    finally:
+        f.close()
+
+def differences(expected, actual):
+    """
+    Returns a list of (des, adapter type, operation, metric, expected, actual) for every
+    counter which differs, comparing only the DES present in both tables
+    """
+    rows = []
+    for des in sorted(set(expected) & set(actual)):
+        for type in sorted(set(expected[des]) | set(actual[des])):
+            operations = set(expected[des].get(type, {})) | set(actual[des].get(type, {}))
+            for name in sorted(operations):
+                a = _flatten(expected[des].get(type, {}).get(name, {}))
+                b = _flatten(actual[des].get(type, {}).get(name, {}))
+                for metric in sorted(set(a) | set(b)):
+                    if a.get(metric) != b.get(metric):
+                        rows.append((des, type, name, metric, a.get(metric), b.get(metric)))
+    return rows
+
+def _flatten(counters):
+    flat = {}
+    for metric, value in counters.items():
+        if isinstance(value, dict):
+            for key, count in value.items():
+                flat['%s.%s' % (metric, key)] = count
+        else:
+            flat[metric] = value
+    return flat
+
+def format_table(table):
+    """Returns the counts as a text table"""
+    lines = ['%-26s %-14s %-16s %8s %8s %8s %8s' % ('DES', 'ADAPTER', 'OPERATION', 'CALLS', 'READS', 'WRITES', 'OPCODES')]
+    for des in sorted(table):
+        for type in sorted(table[des]):
+            for name, counters in sorted(table[des][type].items()):
+                lines.append('%-26s %-14s %-16s %8s %8s %8s %8s' % (des, type, name, counters['calls'], counters['reads'], counters['writes'], sum(counters['opcodes'].values())))
+    return '\n'.join(lines)
+
+
+# Command Line -----------------------------
+
+
+def main(argv = None):
+    """Prints, checks or updates the counts table, returning 1 if a check found differences"""
+    parser = OptionParser(usage = '%prog [options]')
+    parser.add_option('-f', '--table', default = DEFAULT_TABLE, help = 'Checked in counts table')
+    parser.add_option('-u', '--update', action = 'store_true', default = False, help = 'Rewrite the counts table')
+    parser.add_option('-c', '--check', action = 'store_true', default = False, help = 'Compare the counts with the table')
+    options, args = parser.parse_args(argv)
+
+    table = count_all()
+    if options.update:
+        save_table(table, options.table)
+        print 'Updated %s' % options.table
+    elif options.check:
+        rows = differences(load_table(options.table), table)
+        for row in rows:
+            print '%s %s %s %s: %s -> %s' % row
+        return 1 if rows else 0
+    else:
+        print format_table(table)
+    return 0
+
+
+if __name__=='__main__' :
+    sys.exit(main())
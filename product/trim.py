@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+"""
+Trim
+
+    Trims a lane register until a measured quantity, such as a termination
+    resistance, a swing or an offset, reaches a target. Every lane is searched
+    on its own, but the lanes share the SCR, so the codes of all of the lanes
+    still searching are written together, one SCR write and one measurement
+    per iteration.
+
+    Methods
+        bisect   Halves the bracket of codes around the target every iteration
+        secant   Interpolates between the ends of the bracket, which converges in
+                 fewer iterations when the quantity is close to linear in the code
+        linear   Steps through every code, used when the quantity is not monotonic
+
+    The ends of the code range are measured first, which also gives the direction
+    of every lane. A lane whose target lies outside of its ends is trimmed to the
+    closer end. Once every lane has finished the code which came closest to the
+    target is written to each lane.
+
+    measure is called with the codes just written as {lane label:code} and returns
+    the measured quantity of each lane as {lane label:value}.
+
+    Example
+        def measure(codes):
+            return dict([(lane, ohmmeter[lane].resistance) for lane in codes])
+        trim = dut.top.trim('RTERM', measure, 50.0, tolerance = 0.5)
+        print trim.codes
+"""
+
+from common.base import *
+
+METHODS = ['bisect', 'secant', 'linear']
+
+class Trim(object):
+    """A search for the code of a register in every lane which brings a measurement to a target"""
+
+    def __init__(self, scr, key, measure, target, monotonic = True, lanes = None, method = 'bisect', codes = None, tolerance = None):
+        """
+        scr       : SerialControlRegister holding the register
+        key       : Register to trim
+        measure   : Function taking {lane label:code} which returns {lane label:measured value}
+        target    : Value the measurements should reach
+        monotonic : False if the measurement may rise and fall with the code, which searches linearly
+        lanes     : Optional list of lane ids or block labels to trim, defaults to every block holding the register
+        method    : 'bisect' or 'secant'
+        codes     : Optional ordered list of codes, defaults to every value the register can hold
+        tolerance : Optional distance from the target at which a lane stops searching
+        """
+        if method not in METHODS:
+            raise ValueError('Unknown trim method %s, expected one of %s' % (method, ', '.join(METHODS)))
+        self.scr       = scr
+        self.key       = key
+        self.measure   = measure
+        self.target    = target
+        self.method    = method if monotonic else 'linear'
+        self.tolerance = tolerance
+
+        if lanes == None:
+            self.blocks = [block for block in scr if block.has_register(key)]
+        else:
+            self.blocks = [scr.lanes[lane] if isinstance(lane, int) else scr[lane] for lane in lanes]
+        if not self.blocks:
+            raise KeyError('No register %s to trim in %s' % (key, scr))
+        self.codes = list(codes) if codes != None else range(2 ** self.blocks[0][key].width)
+
+        # Iterations as [{lane label:(code, measured value)}, ...]
+        self.history = []
+        # Final code of every lane as {lane label:code}
+        self.result = {}
+
+
+    # Search -----------------------------
+
+
+    def run(self):
+        """Trims every lane, writes the best codes and returns them as {lane label:code}"""
+        lanes = [block.label for block in self.blocks]
+        if self.method == 'linear':
+            for index in range(len(self.codes)):
+                self._iterate(dict([(lane, index) for lane in lanes]))
+        else:
+            self._search(lanes)
+        self.result = dict([(lane, self.best(lane)[0]) for lane in lanes])
+        self._write(self.result)
+        return self.result
+
+    def _search(self, lanes):
+        """Narrows a bracket of code indexes around the target of every lane"""
+        last = len(self.codes) - 1
+        lows  = self._iterate(dict([(lane, 0) for lane in lanes]))
+        highs = self._iterate(dict([(lane, last) for lane in lanes]))
+
+        # Brackets as {lane:[low index, low value, high index, high value]}
+        brackets = {}
+        for lane in lanes:
+            if self._close_enough(lows[lane]) or self._close_enough(highs[lane]):
+                continue
+            if min(lows[lane], highs[lane]) < self.target < max(lows[lane], highs[lane]):
+                brackets[lane] = [0, lows[lane], last, highs[lane]]
+
+        while brackets:
+            probes = {}
+            for lane, (a, value_a, b, value_b) in brackets.items():
+                if b - a <= 1:
+                    del brackets[lane]
+                else:
+                    probes[lane] = self._probe(a, value_a, b, value_b)
+            if not probes:
+                break
+            measured = self._iterate(probes)
+            for lane, index in probes.items():
+                value = measured[lane]
+                bracket = brackets[lane]
+                if self._close_enough(value):
+                    del brackets[lane]
+                elif (value < self.target) == (bracket[1] < self.target):
+                    bracket[0:2] = [index, value]
+                else:
+                    bracket[2:4] = [index, value]
+
+    def _probe(self, a, value_a, b, value_b):
+        """Returns the next code index to measure within the bracket a to b"""
+        if self.method == 'secant' and value_b != value_a:
+            index = a + int(round((self.target - value_a) * (b - a) / float(value_b - value_a)))
+            return min(max(index, a + 1), b - 1)
+        return (a + b) / 2
+
+    def _close_enough(self, value):
+        return self.tolerance != None and abs(value - self.target) <= self.tolerance
+
+    def _iterate(self, indexes):
+        """Writes the codes at the indexes provided, {lane:index}, measures them and records the iteration"""
+        codes = dict([(lane, self.codes[index]) for lane, index in indexes.items()])
+        self._write(codes)
+        measured = self.measure(dict(codes))
+        self.history.append(dict([(lane, (codes[lane], measured[lane])) for lane in codes]))
+        return dict([(lane, measured[lane]) for lane in codes])
+
+    def _write(self, codes):
+        """Writes the code of every lane provided, {lane:code}, in a single SCR write"""
+        send = list(self.scr.sent) if self.scr.is_sent else list(self.scr.default)
+        for block in self.blocks:
+            if block.label in codes:
+                register = block[self.key]
+                s,e = register.global_extents
+                send[s:e] = list(register.reg_value_as_bin(codes[block.label]))
+        self.scr.connection.set(self.scr.label, self.scr.global_index, ''.join(send))
+
+
+    # Results -----------------------------
+
+
+    @property
+    def iterations(self):
+        """Returns the number of SCR writes and measurements made while searching"""
+        return len(self.history)
+
+    def best(self, lane):
+        """Returns the (code, measured value) of the lane which came closest to the target"""
+        measurements = [iteration[lane] for iteration in self.history if lane in iteration]
+        return min(measurements, key = lambda m: abs(m[1] - self.target))
+
+    def convergence(self, lane):
+        """Returns the (code, measured value) of the lane at every iteration it was searched in"""
+        return [iteration[lane] for iteration in self.history if lane in iteration]
+
+
+if __name__=='__main__' :
+    pass
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+"""
+Watch
+
+    Monitors registers, by default every output register, from a background
+    thread and calls back with the registers which changed. Every interval the
+    watched SCRs are captured and only the spans of bits holding the watched
+    registers are read back. The bits of every watched register are compared
+    with the previous capture as one string, so an unchanged capture costs a
+    single comparison, and only the registers which changed are decoded.
+
+    The watcher shares the connection with the foreground through a
+    ThreadedAdapter. It holds the adapter's lock while it reads, so its reads
+    never interleave with the commands the foreground has queued.
+
+    callback is called on the watch thread with {(scr label, block label,
+    register label):(old value, new value)}. An exception raised while
+    watching stops the watch and is kept in Watch.error.
+
+    Example
+        dut.connect(ThreadedAdapter(FPGASerialAdapter()))
+        def changed(deltas):
+            for key, (old, new) in deltas.items():
+                print '%s.%s.%s : %s => %s' % (key + (old, new))
+        watch = dut.watch(['STATUS', 'LOCK'], 0.05, changed)
+        ...
+        watch.stop()
+"""
+
+import threading
+
+from common.base import *
+
+# Registers closer together than this many bits are read back as one span
+SPAN_GAP_BITS = 8
+
+class Watch(object):
+    """Background monitor of the registers of a package"""
+
+    def __init__(self, package, keys = None, interval = 0.1, callback = None):
+        """
+        package  : Connected Package, whose connection must be a ThreadedAdapter
+        keys     : Optional list of register keys or Registers, defaults to every output register
+        interval : Seconds between captures
+        callback : Function called with the deltas of every capture which changed
+        """
+        connection = package.connection
+        if not hasattr(connection, 'lock') or not hasattr(connection, 'adapter'):
+            raise ValueError('Watching needs the package to be connected through a ThreadedAdapter, not %s' % connection.type)
+        self.package  = package
+        self.interval = interval
+        self.callback = callback
+        self.error    = None
+        self.captures = 0
+        self.changes  = 0
+        self._connection = connection
+
+        # Watched registers of every SCR as {scr label:[(key, start, end), ...]}, and the spans read back
+        self.registers = {}
+        self.spans     = {}
+        for scr in package:
+            for block in scr:
+                for register in block:
+                    if self._watched(register, keys):
+                        s,e = register.global_extents
+                        self.registers.setdefault(scr.label, []).append(((scr.label, block.label, register.label), s, e))
+        if not self.registers:
+            raise KeyError('No registers to watch matching %s' % keys)
+        for label, registers in self.registers.items():
+            registers.sort(key = lambda r: r[1])
+            self.spans[label] = self._spans([(s, e) for key, s, e in registers])
+
+        self._previous = None
+        self._stop     = threading.Event()
+        self._thread   = None
+
+    def _watched(self, register, keys):
+        if keys == None:
+            return register.direction == 'O'
+        for key in keys:
+            if register is key or (isinstance(key, basestring) and register.label == key.upper()):
+                return True
+        return False
+
+    def _spans(self, extents):
+        """Merges extents, sorted by their start, which are close together into spans"""
+        spans = []
+        for s,e in extents:
+            if spans and s - spans[-1][1] <= SPAN_GAP_BITS:
+                spans[-1] = (spans[-1][0], max(spans[-1][1], e))
+            else:
+                spans.append((s, e))
+        return spans
+
+
+    # Start and Stop -----------------------------
+
+
+    def start(self):
+        """Starts the watch thread, taking a first capture to compare with"""
+        if self.running:
+            return
+        self.error = None
+        self._stop.clear()
+        self._previous = self.capture()
+        self._thread = threading.Thread(target = self._run, name = 'Watch')
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def stop(self, timeout = None):
+        """Stops the watch thread and waits for it to finish"""
+        self._stop.set()
+        if self._thread != None and self._thread is not threading.currentThread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        """Whether or not the watch thread is running"""
+        return self._thread != None and self._thread.isAlive()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+    # Capture -----------------------------
+
+
+    def capture(self):
+        """Captures the watched SCRs and returns the bits of the watched registers as {scr label:string}"""
+        adapter = self._connection.adapter
+        bits = {}
+        self._connection.lock.acquire()
+        try:
+            for label, spans in self.spans.items():
+                adapter.refresh(label, False, True)
+                for span in spans:
+                    adapter.inspect(label, span)
+                retrieved = adapter[label].retrieved
+                bits[label] = ''.join([''.join([bit or 'x' for bit in retrieved[s:e]]) for key, s, e in self.registers[label]])
+        finally:
+            self._connection.lock.release()
+        self.captures += 1
+        return bits
+
+    def poll(self):
+        """Captures the watched SCRs and returns the deltas since the previous capture"""
+        current = self.capture()
+        deltas = {}
+        if self._previous != None:
+            for label, bits in current.items():
+                previous = self._previous[label]
+                if bits == previous:
+                    continue
+                offset = 0
+                for key, s, e in self.registers[label]:
+                    old, new = previous[offset:offset + e - s], bits[offset:offset + e - s]
+                    if old != new:
+                        deltas[key] = (self._decode(old), self._decode(new))
+                    offset += e - s
+        self._previous = current
+        if deltas:
+            self.changes += 1
+        return deltas
+
+    def _decode(self, bits):
+        """Returns the value of the register's bits, which are stored LSB first, or None if unknown"""
+        if 'x' in bits:
+            return None
+        return int(bits[::-1], 2)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                deltas = self.poll()
+                if deltas and self.callback != None:
+                    self.callback(deltas)
+        except Exception, e:
+            self.error = e
+            logging.getLogger('root').exception('Watch stopped by an exception')
+
+
+if __name__=='__main__' :
+    pass
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+Shmoo
+
+    Pass / fail over a bench environment variable, such as vddcore, and a
+    register code. Levels are set through the station's environment variables
+    and codes through Package.set, then a pass / fail callback is evaluated.
+
+    Along a row of codes the part is expected to change between pass and fail
+    once, so rather than measuring every point a row is searched for its edge:
+        exhaustive   Measures every point
+        bisect       Measures both ends of every row and bisects between them
+        trace        Bisects rows until one changes between pass and fail, then
+                     starts each following row at the edge of the row before and
+                     walks to its edge from there, which usually costs two or
+                     three measurements a row
+    Points which are not measured are inferred from the edge of their row.
+
+    Levels are checked against the limits of the DES before anything is set, and
+    the variable is returned to the level of the DES when the shmoo finishes.
+
+    Example
+        def passes(point):
+            return bert.error_rate() < 1e-12
+        shmoo = Shmoo(station, station.dut, 'vddcore', [0.9, 0.95, 1.0, 1.05], 'TX_AMP', range(32), passes)
+        shmoo.run()
+        print shmoo.grid()
+        shmoo.save('tx_amp_vddcore.csv')
+"""
+
+import csv
+
+from common.base import *
+
+METHODS = ['trace', 'bisect', 'exhaustive']
+
+class Shmoo(object):
+    """Pass / fail of a device over a bench level and a register code"""
+
+    def __init__(self, station, dut, variable, levels, key, codes, passes):
+        """
+        station  : StationManager, or anything with _set_env_variable(variable, value)
+        dut      : Package the codes are set on
+        variable : Environment variable stepped along the rows, e.g. 'vddcore'
+        levels   : Levels of the variable, one row each
+        key      : Register stepped along the columns
+        codes    : Register codes, in the order the part is expected to change between pass and fail
+        passes   : Function taking the point {variable:level, key:code} which returns True on a pass
+        """
+        self.station  = station
+        self.dut      = dut
+        self.variable = variable
+        self.levels   = list(levels)
+        self.key      = key
+        self.codes    = list(codes)
+        self.passes   = passes
+
+        # Results as {(level, code):(passed, measured)}
+        self.results = {}
+        self._level  = None
+
+        # Result below the edge, taken from the first row which changes between pass and fail
+        self._low = None
+
+    def __len__(self):
+        """Returns the number of points in the shmoo"""
+        return len(self.levels) * len(self.codes)
+
+    @property
+    def measurements(self):
+        """Returns the number of points measured"""
+        return len([r for r in self.results.values() if r[1]])
+
+
+    # Measurement -----------------------------
+
+
+    def check_limits(self):
+        """Raises a ValueError if a level is beyond the limit the DES gives the variable"""
+        limit = self.dut.limits.get(self.variable)
+        if limit == None:
+            return
+        limit = val_to_type_unit(limit)[0]
+        for level in self.levels:
+            if val_to_type_unit(level)[0] > limit:
+                raise ValueError('%s level %s is beyond its limit of %s' % (self.variable, level, limit))
+
+    def measure(self, row, column):
+        """Sets the point up, evaluates it and returns whether it passed"""
+        level, code = self.levels[row], self.codes[column]
+        result = self.results.get((level, code))
+        if result != None and result[1]:
+            return result[0]
+        if self._level != level:
+            self.station._set_env_variable(self.variable, level)
+            self._level = level
+        self.dut.set(self.key, code)
+        passed = bool(self.passes({self.variable:level, self.key:code}))
+        self.results[(level, code)] = (passed, True)
+        return passed
+
+    def run(self, method = 'trace'):
+        """Measures the shmoo with the method provided and returns the results"""
+        if method not in METHODS:
+            raise ValueError('Unknown shmoo method %s, expected one of %s' % (method, ', '.join(METHODS)))
+        self.check_limits()
+        try:
+            edge = None
+            for row in range(len(self.levels)):
+                if method == 'exhaustive':
+                    for column in range(len(self.codes)):
+                        self.measure(row, column)
+                elif method == 'trace' and self._low != None:
+                    edge = self._trace_row(row, edge)
+                else:
+                    edge = self._bisect_row(row)
+        finally:
+            self._restore()
+        return self.results
+
+    def _bisect_row(self, row):
+        """Finds the edge of the row by bisection and returns it"""
+        last = len(self.codes) - 1
+        low, high = self.measure(row, 0), self.measure(row, last)
+        if low == high:
+            edge = 0 if self._low != None and low != self._low else last + 1
+            self._fill(row, edge, not low if edge == 0 else low)
+            return edge
+        if self._low == None:
+            self._low = low
+        a, b = 0, last
+        while b - a > 1:
+            middle = (a + b) / 2
+            if self.measure(row, middle) == low:
+                a = middle
+            else:
+                b = middle
+        self._fill(row, b, low)
+        return b
+
+    def _trace_row(self, row, edge):
+        """Finds the edge of the row by walking from the edge of the row before and returns it"""
+        last  = len(self.codes) - 1
+        start = min(max(edge, 1), last)
+        below, above = self.measure(row, start - 1), self.measure(row, start)
+        if below != above:
+            if below != self._low:
+                # The row is the other way round to the first, so search it from scratch
+                return self._bisect_row(row)
+            edge = start
+        elif below == self._low:
+            # The edge has moved up the row
+            edge = start + 1
+            while edge <= last and self.measure(row, edge) == self._low:
+                edge += 1
+        else:
+            # The edge has moved down the row
+            edge = start - 1
+            while edge > 0 and self.measure(row, edge - 1) != self._low:
+                edge -= 1
+        self._fill(row, edge, self._low)
+        return edge
+
+    def _fill(self, row, edge, low):
+        """Infers the points of the row not measured, low below the edge and not low from it on"""
+        level = self.levels[row]
+        for column, code in enumerate(self.codes):
+            if not (level, code) in self.results:
+                self.results[(level, code)] = (low if column < edge else not low, False)
+
+    def _restore(self):
+        """Returns the variable to the level of the DES"""
+        if self._level != None and self.variable in self.dut.levels:
+            self.station._set_env_variable(self.variable, self.dut.levels[self.variable])
+        self._level = None
+
+
+    # Results -----------------------------
+
+
+    def passed(self, level, code):
+        """Returns whether the point passed, measured or inferred"""
+        return self.results[(level, code)][0]
+
+    def grid(self, measured_only = False):
+        """
+        Returns the shmoo as text, a row per level and a column per code:
+            *  measured pass    +  inferred pass
+            #  measured fail    .  inferred fail
+        """
+        width = max([len(str(level)) for level in self.levels] + [len(self.variable)])
+        lines = ['%*s  %s = %s .. %s' % (width, self.variable, self.key, self.codes[0], self.codes[-1])]
+        for level in reversed(self.levels):
+            cells = []
+            for code in self.codes:
+                result = self.results.get((level, code))
+                if result == None or (measured_only and not result[1]):
+                    cells.append(' ')
+                elif result[1]:
+                    cells.append('*' if result[0] else '#')
+                else:
+                    cells.append('+' if result[0] else '.')
+            lines.append('%*s  %s' % (width, level, ''.join(cells)))
+        lines.append('%d of %d points measured' % (self.measurements, len(self)))
+        return '\n'.join(lines)
+
+    def save(self, filepath):
+        """Writes the results to a CSV file with a level, code, passed, measured row per point"""
+        f = open(filepath, 'wb')
+        try:
+            writer = csv.writer(f)
+            writer.writerow([self.variable, self.key, 'passed', 'measured'])
+            for level in self.levels:
+                for code in self.codes:
+                    result = self.results.get((level, code))
+                    if result != None:
+                        writer.writerow([level, code, int(result[0]), int(result[1])])
+        finally:
+            f.close()
+
+
+if __name__=='__main__' :
+    pass
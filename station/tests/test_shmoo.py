@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+Tests Shmoo
+"""
+
+import tempfile
+
+from common.tests.pyunit_helpers import *
+from unittest import TestCase, main
+
+from station.shmoo import *
+from product.connection_adapters.mock_adapter import MockAdapter
+from product.connection_adapters.tests.helpers import mixed_width_package
+
+LEVELS = [0.8 + 0.025 * i for i in range(17)]
+
+class RecordingStation(object):
+    """Station whose environment variables are only recorded"""
+
+    def __init__(self):
+        self.env = {}
+        self.history = []
+
+    def _set_env_variable(self, var, value):
+        self.env[var] = value
+        self.history.append((var, value))
+
+
+class ShmooTests(TestCase):
+    """Tests of the Shmoo class"""
+
+    def setUp(self):
+        self.station = RecordingStation()
+        self.dut = mixed_width_package()
+        self.dut._limits = {'vddcore':'1.25'}
+        self.dut._levels = {'vddcore':'1.0'}
+        self.dut.connect(MockAdapter())
+
+    def passes(self, point):
+        # TX_AMP passes up to a code which rises with the supply, read back from the bench and the part
+        level = self.station.env['vddcore']
+        code  = self.dut.bottom.get('TX_AMP')['lane_1']
+        return code <= int(round((level - 0.85) * 80))
+
+    def shmoo(self, levels = LEVELS):
+        return Shmoo(self.station, self.dut, 'vddcore', levels, 'TX_AMP', range(32), self.passes)
+
+    def test_methods_agree(self):
+        """Searched shmoos match the exhaustive one with a fraction of the measurements"""
+        exhaustive = self.shmoo()
+        exhaustive.run('exhaustive')
+        self.assertEqual(exhaustive.measurements, len(exhaustive))
+        for method in ['bisect', 'trace']:
+            shmoo = self.shmoo()
+            shmoo.run(method)
+            self.assertEqual(len(shmoo.results), len(exhaustive))
+            for point, result in exhaustive.results.items():
+                self.assertEqual(shmoo.results[point][0], result[0])
+            self.assertTrue(shmoo.measurements * 5 <= len(shmoo), '%s measured %d points' % (method, shmoo.measurements))
+
+    def test_edge_moving_down(self):
+        """Tracing follows an edge which falls from row to row"""
+        exhaustive = self.shmoo(list(reversed(LEVELS)))
+        exhaustive.run('exhaustive')
+        shmoo = self.shmoo(list(reversed(LEVELS)))
+        shmoo.run('trace')
+        for point, result in exhaustive.results.items():
+            self.assertEqual(shmoo.passed(*point), result[0])
+
+    def test_bench(self):
+        """Each level is set once and the DES level is restored"""
+        shmoo = self.shmoo(LEVELS[:3])
+        shmoo.run()
+        self.assertEqual(self.station.history, [('vddcore', level) for level in LEVELS[:3]] + [('vddcore', '1.0')])
+
+    def test_limits(self):
+        """Levels beyond the DES limits are refused before anything is set"""
+        shmoo = self.shmoo([1.2, 1.3])
+        self.assertRaises(ValueError, shmoo.run)
+        self.assertEqual(self.station.history, [])
+        self.assertRaises(ValueError, self.shmoo().run, 'spiral')
+
+    def test_grid(self):
+        """The grid marks measured and inferred points and the results are saved"""
+        shmoo = self.shmoo()
+        shmoo.run()
+        lines = shmoo.grid().splitlines()
+        self.assertEqual(len(lines), len(LEVELS) + 2)
+        for mark in '+*#.':
+            self.assertTrue(mark in lines[1])
+        self.assertTrue(lines[-1].startswith('%d of %d' % (shmoo.measurements, len(shmoo))))
+
+        f = tempfile.NamedTemporaryFile(suffix = '.csv', delete = False)
+        f.close()
+        try:
+            shmoo.save(f.name)
+            rows = open(f.name).read().splitlines()
+            self.assertEqual(rows[0], 'vddcore,TX_AMP,passed,measured')
+            self.assertEqual(len(rows), len(shmoo) + 1)
+        finally:
+            os.remove(f.name)
+
+
+if __name__ == '__main__':
+    main()